@@ -37,13 +37,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
     'user',
+    'recipe',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +54,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db.routing.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -74,19 +78,93 @@ TEMPLATES = [
 WSGI_APPLICATION = 'app.wsgi.application'
 
 
+# Caches
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+# Number of server processes, gunicorn reads its worker count from the
+# same variable. The per process 'local' BACKEND of the caches below is
+# refused when there are several, processes would not see each other's
+# invalidations.
+
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# MEMCACHED_LOCATION (host:port) backs the default alias with memcached,
+# shared by every process. The 'shared' BACKEND of the caches below uses
+# that alias and is their default once it is configured.
+
+MEMCACHED_LOCATION = os.environ.get('MEMCACHED_LOCATION', '')
+
+CACHES = {
+    'default': {
+        'BACKEND': (
+            'django.core.cache.backends.memcached.MemcachedCache'
+            if MEMCACHED_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': MEMCACHED_LOCATION,
+    }
+}
+DEFAULT_CACHE_BACKEND = 'shared' if MEMCACHED_LOCATION else 'local'
+
+
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# DB_POOL_SIZE > 0 switches to the pooled backend, which hands out
+# connections from a per process pool instead of connecting per request
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'core.db.backends.postgresql_pool' if DB_POOL_SIZE
+            else 'django.db.backends.postgresql'
+        ),
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'IDLE_TIMEOUT': float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'PRE_PING': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        },
     }
 }
 
+# Read replicas of the default database, DB_REPLICA_HOSTS is a comma
+# separated list of hosts. Reads of list/retrieve requests are spread
+# over them, a user who wrote reads from the primary for
+# DB_REPLICA_STICKY_SECONDS so they see their own changes. The sticky
+# mark is a signed cookie, with a 'shared' BACKEND (the CACHES alias)
+# also a cache entry covering clients that ignore cookies.
+
+DB_REPLICA_HOSTS = [
+    host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host
+]
+for index, host in enumerate(DB_REPLICA_HOSTS, 1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.db.routing.ReplicaRouter']
+
+REPLICA_ROUTING = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'STICKY_SECONDS': int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 5)),
+    'BACKEND': os.environ.get(
+        'DB_REPLICA_STICKY_BACKEND',
+        'shared' if MEMCACHED_LOCATION else 'none',
+    ),
+    'ALIAS': os.environ.get('DB_REPLICA_STICKY_ALIAS', 'default'),
+    'MAX_ENTRIES': int(os.environ.get('DB_REPLICA_STICKY_MAX_ENTRIES', 10000)),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -131,3 +209,108 @@ MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
 AUTH_USER_MODEL = 'core.User'
+
+
+# Recipe API
+# Page size of list endpoints and the cap clients can raise it to
+
+RECIPE_API_PAGE_SIZE = int(os.environ.get('RECIPE_API_PAGE_SIZE', 100))
+RECIPE_API_MAX_PAGE_SIZE = int(
+    os.environ.get('RECIPE_API_MAX_PAGE_SIZE', 1000)
+)
+
+# Largest list accepted by the bulk endpoint and rows per INSERT
+
+RECIPE_API_MAX_BULK_SIZE = int(
+    os.environ.get('RECIPE_API_MAX_BULK_SIZE', 1000)
+)
+RECIPE_API_BULK_BATCH_SIZE = 500
+
+# Recipes fetched per server side cursor round trip of an export
+
+RECIPE_API_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('RECIPE_API_EXPORT_CHUNK_SIZE', 2000)
+)
+
+# Serialize list pages from values() rows rather than model instances
+
+RECIPE_API_VALUES_SERIALIZERS = \
+    os.environ.get('RECIPE_API_VALUES_SERIALIZERS', '1') == '1'
+
+# Cache of serialized list responses, BACKEND is one of
+# 'local' (per process LRU), 'shared' (the CACHES alias) or 'none'.
+# Its versions also make the ETags, which are left out when several
+# processes run without a shared cache.
+
+RECIPE_API_CACHE = {
+    'BACKEND': os.environ.get(
+        'RECIPE_API_CACHE_BACKEND', DEFAULT_CACHE_BACKEND,
+    ),
+    'ALIAS': os.environ.get('RECIPE_API_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('RECIPE_API_CACHE_TIMEOUT', 60)),
+    'MAX_ENTRIES': int(os.environ.get('RECIPE_API_CACHE_MAX_ENTRIES', 10000)),
+}
+
+# Cache of token -> user lookups made by CachedTokenAuthentication,
+# BACKEND is one of 'local', 'shared' or 'none'
+
+TOKEN_AUTH_CACHE = {
+    'BACKEND': os.environ.get(
+        'TOKEN_AUTH_CACHE_BACKEND', DEFAULT_CACHE_BACKEND,
+    ),
+    'ALIAS': os.environ.get('TOKEN_AUTH_CACHE_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('TOKEN_AUTH_CACHE_TIMEOUT', 300)),
+    'MAX_ENTRIES': int(os.environ.get('TOKEN_AUTH_CACHE_MAX_ENTRIES', 10000)),
+}
+
+# In-memory tag/ingredient sets of the recipes of the RECIPE_SIMILARITY
+# MAX_USERS most recently queried users per process, answering
+# /recipes/{id}/similar/. Processes learn about changes made by others
+# through versions kept in a 'local' or 'shared' (the CACHES alias)
+# BACKEND, 'shared' by default when MEMCACHED_LOCATION is set.
+
+RECIPE_SIMILARITY = {
+    'BACKEND': os.environ.get(
+        'RECIPE_SIMILARITY_BACKEND', DEFAULT_CACHE_BACKEND,
+    ),
+    'ALIAS': os.environ.get('RECIPE_SIMILARITY_ALIAS', 'default'),
+    'TIMEOUT': int(os.environ.get('RECIPE_SIMILARITY_TIMEOUT', 600)),
+    'MAX_ENTRIES': 10000,
+    'MAX_USERS': int(os.environ.get('RECIPE_SIMILARITY_MAX_USERS', 100)),
+    'LIMIT': int(os.environ.get('RECIPE_SIMILARITY_LIMIT', 10)),
+}
+
+# Resizing of uploaded recipe images, RECIPE_IMAGE_PROCESSING is
+# 'async' (process pool of RECIPE_IMAGE_WORKERS, as many threads storing
+# the results, started with the server) or 'sync' (inline)
+
+RECIPE_IMAGE_PROCESSING = os.environ.get('RECIPE_IMAGE_PROCESSING', 'async')
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+
+# Recipe images are stored once per content, collect_images deletes the
+# ones no recipe used for RECIPE_IMAGE_GC_GRACE_SECONDS. Their urls never
+# change content and are served with MEDIA_IMMUTABLE_CACHE_CONTROL, only
+# to their owners so shared caches must not keep them.
+
+RECIPE_IMAGE_GC_GRACE_SECONDS = int(
+    os.environ.get('RECIPE_IMAGE_GC_GRACE_SECONDS', 3600)
+)
+MEDIA_IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+# How /media/ files are sent once their owner is checked: 'accel' hands
+# them to nginx with X-Accel-Redirect to the internal MEDIA_ACCEL_LOCATION
+# aliasing MEDIA_ROOT, 'sendfile' to Apache/lighttpd with X-Sendfile and
+# 'django' streams them from the worker with Range support.
+
+MEDIA_SERVE = os.environ.get('MEDIA_SERVE', 'django')
+MEDIA_ACCEL_LOCATION = os.environ.get(
+    'MEDIA_ACCEL_LOCATION', '/protected-media/'
+)
+
+# Request metrics exposed at /metrics/ in the Prometheus text format,
+# scrapers must send "Authorization: Bearer <METRICS_TOKEN>". Without a
+# token /metrics/ is only served in DEBUG. Series are labelled with the
+# pid of the worker when WEB_CONCURRENCY is above 1.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
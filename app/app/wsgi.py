@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# Imported by each server process, unless a preloading server forks
+# workers off it, then call these in the worker instead
+from core.db.pool import fill_pools  # noqa: E402
+from recipe.images import start_workers  # noqa: E402
+
+fill_pools()
+start_workers()
@@ -0,0 +1,283 @@
+import io
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+
+from core.models import ImageBlob, Tag, Ingredient, Recipe, \
+    recipe_image_file_path
+from core.storage import image_storage
+
+# Users created by seed_users, formatted with their index
+USER_EMAIL = 'benchmark.user{}@example.com'
+USER_PASSWORD = 'benchmark'
+
+CUISINES = (
+    'Thai', 'Punjabi', 'Italian', 'Mexican', 'Kolhapuri', 'Greek',
+    'Japanese', 'Lebanese', 'Bengali', 'French', 'Korean', 'Goan',
+)
+DISHES = (
+    'curry', 'soup', 'salad', 'biryani', 'noodles', 'tacos', 'stew',
+    'pasta', 'kebab', 'dal', 'risotto', 'pancakes', 'pie', 'rice',
+)
+STYLES = (
+    'Spicy', 'Creamy', 'Smoky', 'Quick', 'Classic', 'Crispy', 'Tangy',
+    'Grilled', 'Roasted', 'Sweet', 'Vegan', 'Homestyle',
+)
+INGREDIENTS = (
+    'Paneer', 'Chicken', 'Coconut milk', 'Tomato', 'Onion', 'Garlic',
+    'Ginger', 'Basil', 'Lemon', 'Rice', 'Lentils', 'Chickpeas', 'Tofu',
+    'Potato', 'Spinach', 'Mushroom', 'Cumin', 'Yogurt', 'Cheese', 'Egg',
+    'Almonds', 'Jaggery', 'Mango', 'Prawns', 'Lamb', 'Chilli', 'Butter',
+)
+
+
+def seed_library(user, recipes, tags=30, ingredients=120,
+                 tags_per_recipe=3, ingredients_per_recipe=6,
+                 batch_size=2000, rng=None):
+    """Bulk create a recipe library with realistic tag/ingredient fan-out"""
+    rng = rng or random.Random()
+    # Names are unique per user, continue numbering after earlier seeds
+    offset = Tag.objects.filter(user=user).count()
+    tag_objs = Tag.objects.bulk_create(
+        Tag(user=user, name=_name(rng, STYLES + CUISINES, offset + i))
+        for i in range(tags)
+    )
+    offset = Ingredient.objects.filter(user=user).count()
+    ingredient_objs = Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=_name(rng, INGREDIENTS, offset + i))
+        for i in range(ingredients)
+    )
+    tag_ids = [tag.id for tag in tag_objs]
+    ingredient_ids = [ingredient.id for ingredient in ingredient_objs]
+
+    for start in range(0, recipes, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, recipes)):
+            title = ' '.join((
+                rng.choice(STYLES), rng.choice(CUISINES), rng.choice(DISHES)
+            ))
+            batch.append(Recipe(
+                user=user,
+                title=title,
+                time_minutes=rng.randint(5, 180),
+                price=round(rng.uniform(1, 99), 2),
+                link=f'https://recipes.example.com/{i}',
+                tag_ids=sorted(rng.sample(
+                    tag_ids, min(tags_per_recipe, len(tag_ids))
+                )),
+                ingredient_ids=sorted(rng.sample(
+                    ingredient_ids,
+                    min(ingredients_per_recipe, len(ingredient_ids)),
+                )),
+            ))
+        Recipe.objects.bulk_create(batch)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe in batch for tag_id in recipe.tag_ids
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe_id=recipe.id,
+                ingredient_id=ingredient_id,
+            )
+            for recipe in batch for ingredient_id in recipe.ingredient_ids
+        )
+        Tag.objects.add_recipe_counts(Counter(
+            tag_id for recipe in batch for tag_id in recipe.tag_ids
+        ))
+        Ingredient.objects.add_recipe_counts(Counter(
+            ingredient_id for recipe in batch
+            for ingredient_id in recipe.ingredient_ids
+        ))
+        # The search documents are built with subqueries on the links,
+        # planned as if the tables were still as small as before the load
+        with connection.cursor() as cursor:
+            for model in (Tag, Ingredient, Recipe.tags.through,
+                          Recipe.ingredients.through):
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+        Recipe.objects.filter(
+            pk__in=[recipe.id for recipe in batch],
+        ).update_search_vector()
+
+    return tag_objs, ingredient_objs
+
+
+def seed_users(users, recipes, images=0, rng=None, **library):
+    """Create users each owning a recipe library, replacing earlier ones
+
+    images recipes of every user get a stored JPEG image.
+    """
+    rng = rng or random.Random()
+    get_user_model().objects.filter(
+        email__in=[USER_EMAIL.format(i) for i in range(users)],
+    ).delete()
+
+    created = []
+    for i in range(users):
+        user = get_user_model().objects.create_user(
+            USER_EMAIL.format(i), USER_PASSWORD, name=f'Benchmark user {i}',
+        )
+        seed_library(user, recipes, rng=rng, **library)
+        seed_images(user, images, rng=rng)
+        created.append(user)
+
+    return created
+
+
+def seed_images(user, count, rng=None):
+    """Store an image for count random recipes of user"""
+    rng = rng or random.Random()
+    recipe_ids = list(
+        Recipe.objects.filter(user=user).values_list('id', flat=True)
+    )
+    for recipe_id in rng.sample(recipe_ids, min(count, len(recipe_ids))):
+        name = image_storage.save(
+            recipe_image_file_path(None, 'seed.jpg'),
+            ContentFile(sample_image_data(rng)),
+        )
+        Recipe.objects.filter(pk=recipe_id).update(image=name)
+        ImageBlob.objects.retain(name)
+
+
+def sample_image_data(rng, size=(1200, 800)):
+    """Return JPEG encoded photo sized noise"""
+    image = Image.effect_noise(size, rng.randint(20, 80)).convert('RGB')
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=85)
+    return out.getvalue()
+
+
+def _name(rng, words, i):
+    """Return a readable name, unique for distinct i"""
+    return f'{rng.choice(words)} {i}'
+
+
+def measure(func, repeat):
+    """Call func repeat times returning the latency of each call"""
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    return samples
+
+
+def percentile(samples, pct):
+    """Return the pct percentile of samples (nearest rank)"""
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(samples):
+    """Return latency percentiles of samples in milliseconds"""
+    return {
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+class QueryCounter:
+    """Database execute wrapper counting executed statements"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_concurrent(make_session, request, total, concurrency, warmup=1,
+                   prepare=None):
+    """Send total requests from concurrency threads, return raw results
+
+    make_session(worker) builds per thread state, request(session)
+    sends one request and returns its response. prepare(session), if
+    given, runs untimed before every request. Each thread uses its own
+    database connection.
+    """
+    prepare = prepare or (lambda session: None)
+    lock = threading.Lock()
+    latencies, queries, errors, failures = [], [], [], []
+    remaining = [total]
+
+    def claim():
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def work(worker):
+        counter = QueryCounter()
+        try:
+            session = make_session(worker)
+            for i in range(warmup):
+                prepare(session)
+                request(session)
+            with connection.execute_wrapper(counter):
+                while claim():
+                    prepare(session)
+                    counter.count = 0
+                    start = time.perf_counter()
+                    try:
+                        error = request(session).status_code >= 400
+                    except Exception:
+                        error = True
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        latencies.append(elapsed)
+                        queries.append(counter.count)
+                        errors.append(error)
+        except Exception as exc:
+            failures.append(exc)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=work, args=(worker,))
+        for worker in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    if failures:
+        raise failures[0]
+
+    return latencies, queries, errors, wall
+
+
+def report(latencies, queries, errors, wall):
+    """Return JSON friendly summary of a run_concurrent result"""
+    if not latencies:
+        return {'requests': 0, 'errors': 0}
+    stats = {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+    }
+    stats.update(summarize(latencies))
+    stats['queries_per_request'] = round(sum(queries) / len(queries), 2)
+
+    return stats
+
+
+def unique_name(prefix):
+    """Return a name that does not collide between benchmark runs"""
+    return f'{prefix} {uuid.uuid4().hex[:12]}'
@@ -0,0 +1,171 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+# Django cache backends whose entries other processes cannot see
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+class LRUCache:
+    """Thread safe in-process cache with LRU eviction and a TTL"""
+
+    def __init__(self, max_entries=1000, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return cached value for key or default if missing or expired"""
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store value under key evicting least recently used entries"""
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def add(self, key, value, timeout=None):
+        """Store value only if key is not cached yet, return if stored"""
+        with self._lock:
+            if key in self._data:
+                return False
+        self.set(key, value, timeout)
+        return True
+
+    def incr(self, key, delta=1):
+        """Increment integer stored under key, raise ValueError if missing"""
+        with self._lock:
+            if key not in self._data:
+                raise ValueError(f'Key {key!r} not found')
+            expires, value = self._data[key]
+            self._data[key] = (expires, value + delta)
+            return value + delta
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache:
+    """LRUCache compatible wrapper around a configured Django cache"""
+
+    def __init__(self, alias='default', timeout=60):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        self.cache.set(key, value, timeout or None)
+
+    def add(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        return self.cache.add(key, value, timeout or None)
+
+    def incr(self, key, delta=1):
+        return self.cache.incr(key, delta)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class VersionCounter:
+    """Versions of cached data kept in a cache backend
+
+    A missing version starts from the clock so a forgotten one never
+    comes back. Versions expire like other entries of the backend do,
+    this bounds how long a process-local version misses changes made
+    by other processes.
+    """
+
+    def __init__(self, backend, prefix):
+        self.backend = backend
+        self.prefix = prefix
+
+    def key(self, *parts):
+        return ':'.join([self.prefix, *(str(part) for part in parts)])
+
+    def get(self, *parts):
+        """Return current version of the data identified by parts"""
+        key = self.key(*parts)
+        version = self.backend.get(key)
+        if version is None:
+            self.backend.add(key, time.time_ns())
+            version = self.backend.get(key)
+
+        return version
+
+    def bump(self, *parts):
+        """Increment the version, return it or None if it restarted"""
+        key = self.key(*parts)
+        try:
+            return self.backend.incr(key)
+        except ValueError:
+            self.backend.set(key, time.time_ns())
+            return None
+
+
+def build_cache(config):
+    """Return cache backend described by a settings dictionary
+
+    Raise ImproperlyConfigured when other server processes would not
+    see the entries, so invalidations made by one process would be
+    missed by the others.
+    """
+    backend = config.get('BACKEND', 'local')
+    if backend == 'shared':
+        alias = config.get('ALIAS', 'default')
+        if isinstance(caches[alias], PROCESS_LOCAL_CACHES):
+            raise ImproperlyConfigured(
+                f"The 'shared' cache backend needs a cache every process "
+                f"sees, CACHES[{alias!r}] is {type(caches[alias]).__name__}"
+            )
+        return SharedCache(alias=alias, timeout=config.get('TIMEOUT', 60))
+    if backend == 'local' and settings.WEB_CONCURRENCY > 1:
+        raise ImproperlyConfigured(
+            f"The 'local' cache backend is per process, use 'shared' with "
+            f"WEB_CONCURRENCY={settings.WEB_CONCURRENCY} processes"
+        )
+
+    return LRUCache(
+        max_entries=config.get('MAX_ENTRIES', 1000),
+        timeout=config.get('TIMEOUT', 60),
+    )
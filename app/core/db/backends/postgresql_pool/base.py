@@ -0,0 +1,102 @@
+"""PostgreSQL backend reusing connections from a per process pool
+
+Configured with a POOL dictionary next to the usual settings:
+SIZE, TIMEOUT (seconds to wait for a free connection), MAX_LIFETIME,
+IDLE_TIMEOUT (seconds) and PRE_PING (check connections on checkout).
+Closing the Django connection returns it to the pool, so keep
+CONN_MAX_AGE at 0 to give connections back after every request.
+"""
+import weakref
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as \
+    BaseDatabaseCreation
+from psycopg2 import extensions
+
+from core.db.pool import close_pools, get_pool
+
+Database = base.Database
+
+
+class DatabaseCreation(BaseDatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        """Close pooled sessions, a database in use can not be dropped"""
+        close_pools(lambda key: key[0] == test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    pool_entry = None
+    _finalizer = None
+
+    @property
+    def pool(self):
+        options = {
+            key.lower(): value
+            for key, value in self.settings_dict.get('POOL', {}).items()
+        }
+        conn_params = self.get_connection_params()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        key = (
+            conn_params['database'],
+            self.alias,
+            repr(sorted(conn_params.items())),
+        )
+
+        return get_pool(
+            key,
+            self.alias,
+            lambda: _connect(conn_params, isolation_level),
+            **options,
+        )
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        entry = pool.acquire()
+        self.pool_entry = entry
+        self.isolation_level = entry.isolation_level
+        # Give the connection back if the thread ends without closing it
+        self._finalizer = weakref.finalize(self, pool.discard, entry)
+        return entry.connection
+
+    def _close(self):
+        entry, self.pool_entry = self.pool_entry, None
+        if self.connection is None or entry is None:
+            return super()._close()
+        self._finalizer.detach()
+
+        connection = self.connection
+        reusable = (
+            not self.in_atomic_block and
+            not self.errors_occurred and
+            not connection.closed
+        )
+        if reusable:
+            try:
+                if connection.status != extensions.STATUS_READY:
+                    connection.rollback()
+                if not connection.autocommit:
+                    connection.autocommit = True
+            except Database.Error:
+                reusable = False
+
+        if reusable:
+            self.pool.release(entry)
+        else:
+            self.pool.discard(entry)
+
+
+def _connect(conn_params, isolation_level):
+    """Open a connection like the PostgreSQL backend does"""
+    connection = Database.connect(**conn_params)
+    if isolation_level is None:
+        isolation_level = connection.isolation_level
+    elif isolation_level != connection.isolation_level:
+        connection.set_session(isolation_level=isolation_level)
+    # Idle pooled connections never hold a transaction open
+    connection.autocommit = True
+
+    return connection, isolation_level
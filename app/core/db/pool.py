@@ -0,0 +1,253 @@
+import logging
+import os
+import threading
+import time
+
+from django.db import connections
+from django.db.utils import OperationalError
+
+from core.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(OperationalError):
+    """No pooled connection became free in time"""
+
+
+class PooledConnection:
+    """A DB-API connection owned by a pool and its bookkeeping"""
+    __slots__ = ('connection', 'created', 'released', 'isolation_level')
+
+    def __init__(self, connection, isolation_level):
+        self.connection = connection
+        self.isolation_level = isolation_level
+        self.created = self.released = time.monotonic()
+
+
+class ConnectionPool:
+    """Thread safe pool of at most size open connections
+
+    connect() must return (connection, isolation_level). Idle
+    connections are reused most recently released first so surplus
+    ones stay idle long enough to be evicted.
+    """
+
+    def __init__(self, name, connect, size=10, timeout=10,
+                 max_lifetime=1800, idle_timeout=300, pre_ping=True):
+        self.name = name
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.pid = os.getpid()
+        self._idle = []
+        self._opened = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Return a healthy PooledConnection, waiting while all are in use"""
+        registry.pool_events.inc(self.name, 'checkout')
+        deadline = start = None
+        while True:
+            stale = []
+            with self._condition:
+                entry = None
+                while entry is None:
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if self._expired(candidate):
+                            stale.append(candidate)
+                            self._opened -= 1
+                        else:
+                            entry = candidate
+                            break
+                    if entry is not None or self._opened < self.size:
+                        break
+                    if deadline is None:
+                        start = time.monotonic()
+                        deadline = start + self.timeout
+                        registry.pool_events.inc(self.name, 'wait')
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        registry.pool_events.inc(self.name, 'timeout')
+                        self._discard(stale)
+                        raise PoolTimeout(
+                            f'No connection of pool {self.name!r} became '
+                            f'free within {self.timeout} seconds'
+                        )
+                    self._condition.wait(remaining)
+                if entry is None:
+                    self._opened += 1
+                self._report()
+            self._discard(stale)
+            if start is not None:
+                registry.pool_wait.observe(
+                    time.monotonic() - start, self.name,
+                )
+
+            if entry is None:
+                return self._open()
+            if not self.pre_ping or self._ping(entry):
+                return entry
+            self._forget(entry)
+
+    def release(self, entry):
+        """Return a connection in a clean state, idle in autocommit"""
+        now = time.monotonic()
+        entry.released = now
+        if now - entry.created >= self.max_lifetime:
+            self._forget(entry)
+            return
+        with self._condition:
+            self._idle.append(entry)
+            evicted = self._evict_idle(now)
+            self._report()
+            self._condition.notify()
+        self._discard(evicted)
+
+    def discard(self, entry):
+        """Close a checked out connection instead of returning it"""
+        self._forget(entry)
+
+    def fill(self, count=None):
+        """Open connections until count (default size) are pooled"""
+        count = self.size if count is None else min(count, self.size)
+        entries = []
+        try:
+            while self._opened < count:
+                with self._condition:
+                    if self._opened >= count:
+                        break
+                    self._opened += 1
+                entries.append(self._open())
+        finally:
+            for entry in entries:
+                self.release(entry)
+
+    def close(self):
+        """Close every idle connection"""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._report()
+        self._discard(idle)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'size': self.size,
+                'opened': self._opened,
+                'idle': len(self._idle),
+            }
+
+    def _open(self):
+        try:
+            connection, isolation_level = self.connect()
+        except Exception:
+            with self._condition:
+                self._opened -= 1
+                self._report()
+                self._condition.notify()
+            raise
+        registry.pool_events.inc(self.name, 'opened')
+        return PooledConnection(connection, isolation_level)
+
+    def _ping(self, entry):
+        try:
+            with entry.connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            registry.pool_events.inc(self.name, 'ping_failed')
+            return False
+
+    def _expired(self, entry):
+        now = time.monotonic()
+        return (
+            now - entry.created >= self.max_lifetime or
+            now - entry.released >= self.idle_timeout or
+            entry.connection.closed
+        )
+
+    def _evict_idle(self, now):
+        """Remove idle connections unused for idle_timeout, hold the lock"""
+        keep = [
+            entry for entry in self._idle
+            if now - entry.released < self.idle_timeout
+        ]
+        evicted = [entry for entry in self._idle if entry not in keep]
+        self._idle = keep
+        self._opened -= len(evicted)
+        return evicted
+
+    def _forget(self, entry):
+        with self._condition:
+            self._opened -= 1
+            self._report()
+            self._condition.notify()
+        self._discard([entry])
+
+    def _discard(self, entries):
+        for entry in entries:
+            registry.pool_events.inc(self.name, 'closed')
+            try:
+                entry.connection.close()
+            except Exception:
+                pass
+
+    def _report(self):
+        """Publish connection gauges, hold the lock"""
+        idle = len(self._idle)
+        registry.pool_connections.set(idle, self.name, 'idle')
+        registry.pool_connections.set(self._opened - idle, self.name, 'used')
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+# Pools created before a fork, kept referenced so the child never
+# closes (and so terminates) sessions of its parent
+_inherited = []
+
+
+def get_pool(key, name, connect, **options):
+    """Return the process wide pool for key, creating it on first use"""
+    pid = os.getpid()
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is not None and pool.pid != pid:
+            _inherited.append(pool)
+            pool = None
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(name, connect, **options)
+        return pool
+
+
+def close_pools(match=lambda key: True):
+    """Close idle connections of the pools whose key matches"""
+    with _pools_lock:
+        pools = [pool for key, pool in _pools.items() if match(key)]
+    for pool in pools:
+        pool.close()
+
+
+def fill_pools():
+    """Open the connections of this process's database pools
+
+    Called where a server process starts, so its first requests do not
+    wait for connections. Pools are per process, filling them in any
+    other process, like a management command, leaves the server ones
+    empty.
+    """
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is None:
+            continue
+        try:
+            pool.fill()
+        except OperationalError:
+            # Connections are opened on demand once the database is up
+            logger.exception('Could not fill pool %s', pool.name)
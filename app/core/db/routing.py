@@ -0,0 +1,151 @@
+import itertools
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject, empty
+
+from core.cache import build_cache
+
+# Only safe methods of views setting read_from_replica = True, run on
+# behalf of an authenticated user, read from a replica
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = threading.local()
+_counter = itertools.count()
+
+
+# Signed cookie marking the user who wrote to read from the primary
+STICKY_COOKIE = 'replica_pin'
+
+
+def _build_sticky_cache():
+    config = settings.REPLICA_ROUTING
+    if config.get('BACKEND', 'none') == 'none':
+        return None
+    return build_cache(config)
+
+
+sticky_cache = _build_sticky_cache()
+
+
+def _sticky_key(user_id):
+    return f'replica:primary-until:{user_id}'
+
+
+def pin_to_primary(user_id, response):
+    """Read from the primary for the user during the sticky window
+
+    The mark is a signed cookie on the response, seen by whichever
+    process serves the client next, and an entry of the sticky cache
+    when there is one, which also covers clients ignoring cookies.
+    """
+    timeout = settings.REPLICA_ROUTING.get('STICKY_SECONDS', 5)
+    if not timeout:
+        return
+    response.set_signed_cookie(
+        STICKY_COOKIE, str(user_id), salt=STICKY_COOKIE, max_age=timeout,
+        httponly=True,
+    )
+    if sticky_cache is not None:
+        sticky_cache.set(_sticky_key(user_id), True, timeout=timeout)
+
+
+def is_pinned(user_id, request):
+    timeout = settings.REPLICA_ROUTING.get('STICKY_SECONDS', 5)
+    pinned_user = request.get_signed_cookie(
+        STICKY_COOKIE, default=None, salt=STICKY_COOKIE, max_age=timeout,
+    )
+    if pinned_user == str(user_id):
+        return True
+    return sticky_cache is not None and \
+        sticky_cache.get(_sticky_key(user_id)) is not None
+
+
+def _request_user_id(request):
+    """Return id of the authenticated user without authenticating"""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        # Evaluating the lazy session user would itself query the database
+        return None
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+class ReplicaRouter:
+    """Balance reads of replica safe requests over the replica aliases
+
+    Reads go to the primary outside such requests, once the request has
+    written and while its user is pinned after an earlier write. Writes
+    always go to the primary, even for objects read from a replica.
+    """
+
+    def _replicas(self):
+        return settings.REPLICA_ROUTING.get('ALIASES', ())
+
+    def _use_replica(self):
+        if not getattr(_state, 'replica_allowed', False) or _state.wrote:
+            return False
+        if _state.pinned is None:
+            user_id = _request_user_id(_state.request)
+            if user_id is None:
+                # Authentication itself must see freshly issued tokens
+                return False
+            _state.pinned = is_pinned(user_id, _state.request)
+
+        return not _state.pinned
+
+    def db_for_read(self, model, **hints):
+        replicas = self._replicas()
+        if not replicas or not self._use_replica():
+            return DEFAULT_DB_ALIAS
+
+        return replicas[next(_counter) % len(replicas)]
+
+    def db_for_write(self, model, **hints):
+        if getattr(_state, 'request', None) is not None:
+            _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *self._replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in self._replicas():
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Mark requests whose reads may go to a replica, pin writers"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.request = request
+        _state.replica_allowed = False
+        _state.wrote = False
+        _state.pinned = None
+        try:
+            response = self.get_response(request)
+            if _state.wrote and settings.REPLICA_ROUTING.get('ALIASES'):
+                user_id = _request_user_id(request)
+                if user_id is not None:
+                    pin_to_primary(user_id, response)
+        finally:
+            _state.request = None
+            _state.replica_allowed = False
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        cls = getattr(view_func, 'cls', None)
+        _state.replica_allowed = (
+            request.method in SAFE_METHODS and
+            getattr(cls, 'read_from_replica', False)
+        )
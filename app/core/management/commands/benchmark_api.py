@@ -0,0 +1,348 @@
+import json
+import random
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.benchmark import USER_PASSWORD, report, run_concurrent, \
+    sample_image_data, unique_name
+from core.models import Tag, Ingredient, Recipe
+from recipe.images import start_workers
+
+# Prefix of names and emails of objects created while benchmarking
+CREATED_PREFIX = 'Load'
+CREATED_EMAIL = 'benchmark.load.{}@example.com'
+ADMIN_EMAIL = 'benchmark.admin@example.com'
+
+
+class Session:
+    """State of one benchmark thread acting as one seeded user"""
+
+    def __init__(self, user, rng):
+        self.user = user
+        self.rng = rng
+        self.client = APIClient()
+        token, created = Token.objects.get_or_create(user=user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.scraper = APIClient()
+        self.recipe_ids = list(
+            Recipe.objects.filter(user=user).values_list('id', flat=True)
+        )
+        self.tags = dict(
+            Tag.objects.filter(user=user).values_list('id', 'name')
+        )
+        self.ingredients = dict(
+            Ingredient.objects.filter(user=user).values_list('id', 'name')
+        )
+        self.images = list(Recipe.objects.filter(user=user).exclude(
+            image='',
+        ).values_list('image', flat=True))
+        self.etags = {}
+        self.target = None
+
+    def recipe_url(self, name='recipe-detail', recipe_id=None):
+        recipe_id = recipe_id or self.rng.choice(self.recipe_ids)
+        return reverse(f'recipe:{name}', args=[recipe_id])
+
+    def media_url(self):
+        return reverse('media', args=[self.rng.choice(self.images)])
+
+    def sample(self, ids, k):
+        return self.rng.sample(list(ids), min(k, len(ids)))
+
+    def recipe_payload(self):
+        return {
+            'title': unique_name(CREATED_PREFIX),
+            'time_minutes': self.rng.randint(5, 120),
+            'price': f'{self.rng.uniform(1, 50):.2f}',
+            'tags': self.sample(self.tags, 3),
+            'ingredients': self.sample(self.ingredients, 6),
+        }
+
+
+def _ids(ids):
+    return ','.join(str(pk) for pk in ids)
+
+
+def _conditional_get(session, url):
+    response = session.client.get(
+        url, HTTP_IF_NONE_MATCH=session.etags.get(url, ''),
+    )
+    if 'ETag' in response:
+        session.etags[url] = response['ETag']
+    return response
+
+
+def _stream(response):
+    """Read a streamed body so its generation is part of the timing"""
+    if response.streaming:
+        for chunk in response.streaming_content:
+            pass
+    return response
+
+
+def _scrape(session):
+    token = settings.METRICS_TOKEN
+    return session.scraper.get(
+        reverse('metrics'),
+        HTTP_AUTHORIZATION=f'Bearer {token}' if token else '',
+    )
+
+
+def _create_target(session):
+    """Untimed: create a recipe the timed request deletes"""
+    session.target = Recipe.objects.create(
+        user=session.user, title=unique_name(CREATED_PREFIX),
+        time_minutes=10, price=5,
+    ).pk
+
+
+def _ensure_target(session):
+    """Untimed: create once a recipe the timed requests change
+
+    Seeded recipes are left alone so every run measures the same data.
+    """
+    if session.target is None:
+        _create_target(session)
+
+
+# Route name -> (request sending function, untimed preparation or None)
+ROUTES = OrderedDict((
+    ('tags.list', (
+        lambda s: s.client.get(reverse('recipe:tag-list')), None,
+    )),
+    ('tags.list_assigned_counts', (
+        lambda s: s.client.get(
+            reverse('recipe:tag-list'),
+            {'assigned_only': 1, 'with_counts': 1},
+        ), None,
+    )),
+    ('tags.list_not_modified', (
+        lambda s: _conditional_get(s, reverse('recipe:tag-list')), None,
+    )),
+    ('tags.create', (
+        lambda s: s.client.post(
+            reverse('recipe:tag-list'),
+            {'name': unique_name(CREATED_PREFIX)},
+        ), None,
+    )),
+    ('tags.bulk', (
+        lambda s: s.client.post(reverse('recipe:tag-bulk'), {
+            'names': [s.tags[pk] for pk in s.sample(s.tags, 5)] +
+            [unique_name(CREATED_PREFIX) for i in range(5)],
+        }, format='json'), None,
+    )),
+    ('ingredients.list', (
+        lambda s: s.client.get(reverse('recipe:ingredient-list')), None,
+    )),
+    ('ingredients.create', (
+        lambda s: s.client.post(
+            reverse('recipe:ingredient-list'),
+            {'name': unique_name(CREATED_PREFIX)},
+        ), None,
+    )),
+    ('ingredients.bulk', (
+        lambda s: s.client.post(reverse('recipe:ingredient-bulk'), {
+            'names': [
+                s.ingredients[pk] for pk in s.sample(s.ingredients, 10)
+            ] + [unique_name(CREATED_PREFIX) for i in range(10)],
+        }, format='json'), None,
+    )),
+    ('recipes.list', (
+        lambda s: s.client.get(reverse('recipe:recipe-list')), None,
+    )),
+    ('recipes.list_filtered', (
+        lambda s: s.client.get(reverse('recipe:recipe-list'), {
+            'tags': _ids(s.sample(s.tags, 1)),
+            'ingredients': _ids(s.sample(s.ingredients, 2)),
+        }), None,
+    )),
+    ('recipes.search', (
+        lambda s: s.client.get(reverse('recipe:recipe-list'), {
+            'search': s.rng.choice(list(s.ingredients.values())).split()[0],
+        }), None,
+    )),
+    ('recipes.list_not_modified', (
+        lambda s: _conditional_get(s, reverse('recipe:recipe-list')), None,
+    )),
+    ('recipes.detail', (lambda s: s.client.get(s.recipe_url()), None)),
+    ('recipes.similar', (
+        lambda s: s.client.get(s.recipe_url('recipe-similar')), None,
+    )),
+    ('recipes.create', (
+        lambda s: s.client.post(
+            reverse('recipe:recipe-list'), s.recipe_payload(),
+            format='json',
+        ), None,
+    )),
+    ('recipes.update', (
+        lambda s: s.client.patch(s.recipe_url(recipe_id=s.target), {
+            'time_minutes': s.rng.randint(5, 120),
+            'tags': s.sample(s.tags, 3),
+        }, format='json'), _ensure_target,
+    )),
+    ('recipes.delete', (
+        lambda s: s.client.delete(s.recipe_url(recipe_id=s.target)),
+        _create_target,
+    )),
+    ('recipes.upload_image', (
+        lambda s: s.client.post(
+            s.recipe_url('recipe-upload-image', recipe_id=s.target), {
+                'image': SimpleUploadedFile(
+                    'photo.jpg', sample_image_data(s.rng), 'image/jpeg',
+                ),
+            }, format='multipart',
+        ), _ensure_target,
+    )),
+    ('recipes.bulk', (
+        lambda s: s.client.post(
+            reverse('recipe:recipe-bulk'),
+            [s.recipe_payload() for i in range(20)],
+            format='json',
+        ), None,
+    )),
+    ('recipes.export', (
+        lambda s: _stream(s.client.get(reverse('recipe:recipe-export'))),
+        None,
+    )),
+    ('recipes.export_csv', (
+        lambda s: _stream(s.client.get(reverse('recipe:recipe-export'), {
+            'export_format': 'csv',
+        })), None,
+    )),
+    ('media.image', (lambda s: _stream(s.client.get(s.media_url())), None)),
+    ('media.image_range', (
+        lambda s: _stream(s.client.get(
+            s.media_url(), HTTP_RANGE='bytes=0-65535',
+        )), None,
+    )),
+    ('cache_stats', (
+        lambda s: s.client.get(reverse('recipe:cache-stats')), None,
+    )),
+    ('user.create', (
+        lambda s: s.client.post(reverse('user:create'), {
+            'email': CREATED_EMAIL.format(uuid.uuid4().hex),
+            'password': USER_PASSWORD,
+            'name': CREATED_PREFIX,
+        }), None,
+    )),
+    ('user.token', (
+        lambda s: s.client.post(reverse('user:token'), {
+            'email': s.user.email, 'password': USER_PASSWORD,
+        }), None,
+    )),
+    ('metrics', (_scrape, None)),
+    ('user.me', (lambda s: s.client.get(reverse('user:me')), None)),
+    ('user.me_update', (
+        lambda s: s.client.patch(
+            reverse('user:me'), {'name': s.user.name},
+        ), None,
+    )),
+))
+ADMIN_ROUTES = ('cache_stats',)
+# Routes changing data, run after all others so reads see seeded data
+WRITE_ROUTES = (
+    'tags.create', 'tags.bulk', 'ingredients.create', 'ingredients.bulk',
+    'recipes.create', 'recipes.update', 'recipes.delete',
+    'recipes.upload_image', 'recipes.bulk', 'user.create', 'user.me_update',
+)
+MEDIA_ROUTES = ('media.image', 'media.image_range')
+
+
+class Command(BaseCommand):
+    """Django command load testing every API route in process"""
+    help = 'Benchmark API routes against seed_data users, prints JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Number of timed requests per route',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--routes', default=','.join(ROUTES),
+            help='Comma separated routes to run',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON to this file')
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        routes = [route.strip() for route in options['routes'].split(',')]
+        unknown = set(routes) - set(ROUTES)
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(sorted(unknown))}')
+
+        users = list(get_user_model().objects.filter(
+            email__regex=r'^benchmark\.user[0-9]+@example\.com$',
+        ).order_by('id'))
+        if not users:
+            raise CommandError('No benchmark users, run seed_data first')
+        if set(routes) & set(MEDIA_ROUTES) and Recipe.objects.filter(
+            user__in=users,
+        ).exclude(image='').values('user').distinct().count() < len(users):
+            raise CommandError(
+                'Benchmark users lack images, run seed_data with --images'
+            )
+        admin, created = get_user_model().objects.get_or_create(
+            email=ADMIN_EMAIL, defaults={'is_staff': True},
+        )
+        if 'recipes.upload_image' in routes:
+            # Like a server, before any benchmark thread exists
+            start_workers()
+
+        # Reported in the requested order, run with writes last
+        results = OrderedDict((name, None) for name in routes)
+        try:
+            for name in sorted(routes, key=WRITE_ROUTES.__contains__):
+                request, prepare = ROUTES[name]
+                owners = [admin] if name in ADMIN_ROUTES else users
+
+                def make_session(worker):
+                    return Session(
+                        owners[worker % len(owners)],
+                        random.Random(f'{options["seed"]}:{name}:{worker}'),
+                    )
+
+                results[name] = report(*run_concurrent(
+                    make_session, request, options['requests'],
+                    options['concurrency'], prepare=prepare,
+                ))
+        finally:
+            self._cleanup(users)
+
+        output = json.dumps(OrderedDict((
+            ('config', OrderedDict((
+                ('requests', options['requests']),
+                ('concurrency', options['concurrency']),
+                ('users', len(users)),
+                ('recipes', Recipe.objects.filter(user__in=users).count()),
+            ))),
+            ('routes', results),
+        )), indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as out:
+                out.write(output + '\n')
+        self.stdout.write(output)
+
+    def _cleanup(self, users):
+        """Delete what the write routes created"""
+        prefix = f'{CREATED_PREFIX} '
+        Recipe.objects.filter(
+            user__in=users, title__startswith=prefix,
+        ).delete()
+        Tag.objects.filter(user__in=users, name__startswith=prefix).delete()
+        Ingredient.objects.filter(
+            user__in=users, name__startswith=prefix,
+        ).delete()
+        get_user_model().objects.filter(
+            email__regex=r'^benchmark\.load\.[0-9a-f]+@example\.com$',
+        ).delete()
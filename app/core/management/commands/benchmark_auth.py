@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.benchmark import measure, summarize
+from core.models import Tag
+from recipe.views import TagViewSet
+from user.authentication import CachedTokenAuthentication, token_cache
+
+
+class Command(BaseCommand):
+    """Django command comparing plain and cached token authentication"""
+    help = 'Benchmark GET /api/recipe/tags/ per authentication class'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Number of timed requests per authentication class',
+        )
+        parser.add_argument('--tags', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        url = reverse('recipe:tag-list')
+        self.stdout.write(f'{"authentication":<28} {"queries":>8} '
+                          f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                'benchmark.auth@example.com', None,
+            )
+            Tag.objects.bulk_create(
+                Tag(user=user, name=f'Tag {i}')
+                for i in range(options['tags'])
+            )
+            token = Token.objects.create(user=user)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+            for auth_class in (TokenAuthentication,
+                               CachedTokenAuthentication):
+                token_cache.delete(token.key)
+                with patch.object(TagViewSet, 'authentication_classes',
+                                  (auth_class,)):
+                    client.get(url)
+                    reset_queries()
+                    with CaptureQueriesContext(connection) as queries:
+                        client.get(url)
+                    query_count = len(queries.captured_queries)
+                    stats = summarize(measure(
+                        lambda: client.get(url), options['requests'],
+                    ))
+                self.stdout.write(
+                    f'{auth_class.__name__:<28} '
+                    f'{query_count:>8} '
+                    f'{stats["p50_ms"]:>8} {stats["p95_ms"]:>8} '
+                    f'{stats["p99_ms"]:>8}'
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from django.views import static
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.benchmark import measure, summarize
+from core.models import Recipe
+from core.storage import image_storage
+
+
+def _read(response):
+    """Return bytes the worker writes itself for the response"""
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+class Command(BaseCommand):
+    """Django command comparing worker time of the media serving modes"""
+    help = (
+        'Benchmark worker time per image for static.serve and the '
+        'MEDIA_SERVE modes of /media/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Number of timed requests per mode and image size',
+        )
+        parser.add_argument(
+            '--sizes', default='64,512,4096',
+            help='Comma separated image sizes in KiB',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        self.stdout.write(f'{"mode":<14} {"KiB":>6} {"relayed KiB":>12} '
+                          f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root), \
+                transaction.atomic():
+            user = get_user_model().objects.create_user(
+                'benchmark.media@example.com', None,
+            )
+            token = Token.objects.create(user=user)
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            factory = RequestFactory()
+
+            for size in sizes:
+                name = image_storage.save(
+                    'uploads/recipe/benchmark.jpg',
+                    ContentFile(os.urandom(size * 1024)),
+                )
+                Recipe.objects.create(
+                    user=user, title=f'Benchmark {size}', time_minutes=1,
+                    price=1, image=name,
+                )
+
+                def serve_static():
+                    # The unauthenticated view /media/ used before
+                    return static.serve(
+                        factory.get(f'/media/{name}'), name,
+                        document_root=settings.MEDIA_ROOT,
+                    )
+
+                modes = [('static.serve', serve_static)] + [
+                    (mode, lambda: client.get(f'/media/{name}'))
+                    for mode in ('django', 'sendfile', 'accel')
+                ]
+                for mode, get in modes:
+                    with override_settings(MEDIA_SERVE=mode):
+                        relayed = _read(get())
+                        stats = summarize(measure(
+                            lambda: _read(get()), options['requests'],
+                        ))
+                    self.stdout.write(
+                        f'{mode:<14} {size:>6} {relayed // 1024:>12} '
+                        f'{stats["p50_ms"]:>8} {stats["p95_ms"]:>8} '
+                        f'{stats["p99_ms"]:>8}'
+                    )
+            transaction.set_rollback(True)
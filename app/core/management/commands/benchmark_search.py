@@ -0,0 +1,56 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.benchmark import CUISINES, DISHES, INGREDIENTS, measure, \
+    seed_library, summarize
+from core.models import Recipe
+
+
+class Command(BaseCommand):
+    """Django command measuring recipe search latency as the corpus grows"""
+    help = 'Benchmark ?search= on growing recipe libraries (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000',
+            help='Comma separated library sizes to measure',
+        )
+        parser.add_argument(
+            '--queries', type=int, default=50,
+            help='Number of timed searches per size',
+        )
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+        terms = [word.lower() for word in CUISINES + DISHES + INGREDIENTS]
+
+        self.stdout.write(f'{"recipes":>10} {"p50 ms":>10} {"p95 ms":>10} '
+                          f'{"p99 ms":>10}')
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                'benchmark.search@example.com', None,
+            )
+            seeded = 0
+            for size in sizes:
+                seed_library(user, size - seeded, rng=rng)
+                seeded = size
+
+                def search():
+                    queryset = Recipe.objects.filter(user=user).search(
+                        rng.choice(terms)
+                    ).order_by('-rank', 'id')
+                    list(queryset[:options['page_size']])
+
+                stats = summarize(measure(search, options['queries']))
+                self.stdout.write(
+                    f'{size:>10} {stats["p50_ms"]:>10} '
+                    f'{stats["p95_ms"]:>10} {stats["p99_ms"]:>10}'
+                )
+            transaction.set_rollback(True)
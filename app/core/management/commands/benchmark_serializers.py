@@ -0,0 +1,115 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.test import RequestFactory
+
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmark import measure, seed_library, summarize
+from core.models import Tag, Ingredient, Recipe
+from recipe import serializers
+from recipe.values import ValuesSerializer
+from recipe.views import RecipeViewset
+
+
+def _recipes(user):
+    return Recipe.objects.filter(user=user).order_by('id').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.only('id').order_by('id')),
+        Prefetch(
+            'ingredients',
+            queryset=Ingredient.objects.only('id').order_by('id'),
+        ),
+    )
+
+
+# Serialized list -> (serializer class, queryset of the user's rows,
+# serializer fields answered by id array columns)
+KINDS = (
+    ('recipes', serializers.RecipeSerializer, _recipes,
+     RecipeViewset.array_sources),
+    ('tags', serializers.TagSerializer,
+     lambda user: Tag.objects.filter(user=user).order_by('-name', '-id'),
+     {}),
+    ('ingredients', serializers.IngredientSerializer,
+     lambda user: Ingredient.objects.filter(user=user).order_by(
+         '-name', '-id',
+     ), {}),
+)
+
+
+class Command(BaseCommand):
+    """Django command comparing serializer and values() list rendering"""
+    help = (
+        'Benchmark rendering list responses through the serializers and '
+        'through values() rows (rolled back)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000',
+            help='Comma separated numbers of rows to render',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Number of timed renders per size and path',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+        context = {'request': RequestFactory().get('/api/recipe/')}
+        renderer = JSONRenderer()
+
+        self.stdout.write(
+            f'{"list":<12} {"rows":>7} {"serializer ms":>14} '
+            f'{"values ms":>10} {"speedup":>8}'
+        )
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                'benchmark.serializers@example.com', None,
+            )
+            seeded = 0
+            for size in sizes:
+                seed_library(
+                    user, size - seeded, tags=size - seeded,
+                    ingredients=size - seeded, rng=rng,
+                )
+                seeded = size
+
+                for name, serializer_class, rows, arrays in KINDS:
+                    queryset = rows(user)
+
+                    def serializer_path():
+                        return renderer.render(serializer_class(
+                            queryset.all(), many=True, context=context,
+                        ).data)
+
+                    def values_path():
+                        compiled = ValuesSerializer.compile(
+                            serializer_class(context=context), queryset,
+                            arrays,
+                        )
+                        return renderer.render(compiled.serialize(
+                            queryset.prefetch_related(None).values(
+                                *compiled.columns
+                            )
+                        ))
+
+                    if serializer_path() != values_path():
+                        raise CommandError(f'{name} output differs')
+                    before = summarize(
+                        measure(serializer_path, options['repeat'])
+                    )['p50_ms']
+                    after = summarize(
+                        measure(values_path, options['repeat'])
+                    )['p50_ms']
+                    self.stdout.write(
+                        f'{name:<12} {size:>7} {before:>14} {after:>10} '
+                        f'{before / after:>7.1f}x'
+                    )
+            transaction.set_rollback(True)
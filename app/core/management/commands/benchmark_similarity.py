@@ -0,0 +1,132 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.benchmark import measure, seed_library, summarize
+from core.models import Recipe
+from recipe.similarity import RecipeSets, similarity_index
+
+# The same ranking computed by joining the link tables per request
+SIMILAR_SQL = """
+    WITH links AS (
+        SELECT recipe_id, tag_id * 2 AS feature FROM core_recipe_tags
+        UNION ALL
+        SELECT recipe_id, ingredient_id * 2 + 1
+        FROM core_recipe_ingredients
+    ), shared AS (
+        SELECT other.recipe_id, COUNT(*) AS common
+        FROM links mine JOIN links other ON other.feature = mine.feature
+        WHERE mine.recipe_id = %(id)s AND other.recipe_id <> %(id)s
+        GROUP BY other.recipe_id
+    )
+    SELECT shared.recipe_id, shared.common::float / (
+        (SELECT COUNT(*) FROM links WHERE recipe_id = %(id)s)
+        + cardinality(r.tag_ids) + cardinality(r.ingredient_ids)
+        - shared.common
+    ) AS similarity
+    FROM shared JOIN core_recipe r ON r.id = shared.recipe_id
+    ORDER BY similarity DESC, shared.recipe_id
+    LIMIT %(limit)s
+"""
+
+
+class Command(BaseCommand):
+    """Django command timing similar recipe lookups"""
+    help = (
+        'Benchmark similar recipes of the in-memory index and, with --api, '
+        'of the endpoint and of joining the link tables'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--ingredients', type=int, default=120)
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Number of timed lookups per method',
+        )
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument(
+            '--api', action='store_true',
+            help='Also seed the database, rolled back afterwards',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        rng = random.Random(0)
+        recipes, limit = options['recipes'], options['limit']
+        tags, ingredients = options['tags'], options['ingredients']
+        rows = [
+            (i, rng.sample(range(tags), min(3, tags)),
+             rng.sample(range(ingredients), min(6, ingredients)))
+            for i in range(1, recipes + 1)
+        ]
+        start = time.perf_counter()
+        sets = RecipeSets(rows)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        self.stdout.write(f'Built sets of {recipes} recipes in '
+                          f'{build_ms:.0f} ms')
+        self.stdout.write(f'{"method":<10} {"p50 ms":>8} {"p95 ms":>8} '
+                          f'{"p99 ms":>8}')
+        self._report('index', lambda: sets.similar(
+            rng.randint(1, recipes), limit,
+        ), options['requests'])
+        if options['api']:
+            self._benchmark_api(rng, options)
+
+    def _report(self, method, func, requests):
+        stats = summarize(measure(func, requests))
+        self.stdout.write(
+            f'{method:<10} {stats["p50_ms"]:>8} {stats["p95_ms"]:>8} '
+            f'{stats["p99_ms"]:>8}'
+        )
+
+    def _benchmark_api(self, rng, options):
+        limit = options['limit']
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                'benchmark.similarity@example.com', None,
+            )
+            seed_library(
+                user, options['recipes'], tags=options['tags'],
+                ingredients=options['ingredients'], rng=rng,
+            )
+            ids = list(
+                Recipe.objects.filter(user=user).values_list('id', flat=True)
+            )
+            # Fetching the listed recipes is planned like on a small table
+            # until the bulk loaded one is analyzed
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Recipe._meta.db_table}')
+            client = APIClient()
+            client.force_authenticate(user)
+            # Load the sets before timing, as a warm process has them
+            start = time.perf_counter()
+            similarity_index.similar(user.pk, ids[0], limit)
+            self.stdout.write(
+                f'Loaded sets from the database in '
+                f'{(time.perf_counter() - start) * 1000:.0f} ms'
+            )
+
+            self._report('api', lambda: client.get(
+                reverse('recipe:recipe-similar', args=[rng.choice(ids)]),
+                {'limit': limit},
+            ), options['requests'])
+
+            def query():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        SIMILAR_SQL, {'id': rng.choice(ids), 'limit': limit},
+                    )
+                    return cursor.fetchall()
+
+            self._report('sql', query, options['requests'])
+            similarity_index._sets.pop(user.pk, None)
+            transaction.set_rollback(True)
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe.images import collect_images
+
+
+class Command(BaseCommand):
+    """Django command deleting recipe images no recipe uses anymore"""
+    help = (
+        'Delete stored recipe images and their variants that have been '
+        'unreferenced for the grace period, run it periodically'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int,
+            default=settings.RECIPE_IMAGE_GC_GRACE_SECONDS,
+            help='Seconds an image must have been unused for',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        deleted = collect_images(options['grace'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} unreferenced images'
+        ))
@@ -0,0 +1,219 @@
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.cache import SharedCache
+from recipe.cache import SCOPES, response_cache
+from recipe.importer import FORMATS, METHODS, import_batch, read_records
+from recipe.similarity import similarity_index
+
+
+class Checkpoint:
+    """Append only list of the batches of an import that committed
+
+    The first line describes the import so a checkpoint is never
+    resumed with a different batch layout, every further line holds
+    the number of a committed batch.
+    """
+
+    def __init__(self, path, header, restart=False):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path) and not restart:
+            with open(path) as file:
+                lines = file.read().splitlines()
+            if lines and json.loads(lines[0]) != header:
+                raise CommandError(
+                    f'Checkpoint {path} belongs to another import, '
+                    f'pass --restart to discard it'
+                )
+            self.done = {int(line) for line in lines[1:] if line}
+            self.file = open(path, 'a')
+        else:
+            self.file = open(path, 'w')
+            self.file.write(json.dumps(header) + '\n')
+            self.file.flush()
+
+    def mark(self, number):
+        """Record a committed batch, durable before the next one counts"""
+        self.file.write(f'{number}\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class Command(BaseCommand):
+    """Django command loading recipe files exported by the API"""
+    help = (
+        'Import recipes from an NDJSON or CSV file in batches, resuming '
+        'from a checkpoint of the batches already imported'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--user', required=True,
+            help='Email of the user owning the imported recipes',
+        )
+        parser.add_argument(
+            '--format', dest='file_format', choices=FORMATS,
+            help='Format of the file, defaults to its extension',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--method', choices=METHODS, default='copy',
+            help='Load rows with COPY or with bulk_create batches',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Processes importing batches in parallel',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file, defaults to PATH.checkpoint',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Discard an existing checkpoint and import everything',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        path = options['path']
+        file_format = options['file_format'] or \
+            os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(
+                f'Unknown format {file_format!r}, pass --format'
+            )
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'User {options["user"]} does not exist')
+
+        batch_size = options['batch_size']
+        checkpoint = Checkpoint(
+            options['checkpoint'] or f'{path}.checkpoint',
+            {
+                'path': os.path.abspath(path),
+                'user': user.email,
+                'format': file_format,
+                'batch_size': batch_size,
+            },
+            restart=options['restart'],
+        )
+        self.totals = {'recipes': 0, 'links': 0, 'skipped': 0}
+        self.start = time.monotonic()
+        try:
+            with open(path, newline='', encoding='utf-8') as file:
+                records = read_records(file, file_format)
+                batches = (
+                    (user, number, batch, file_format, options['method'])
+                    for number, batch in _batches(records, batch_size)
+                    if number not in checkpoint.done
+                )
+                if options['workers'] > 1:
+                    self._import_parallel(
+                        batches, options['workers'], checkpoint, batch_size,
+                    )
+                else:
+                    for args in batches:
+                        self._done(*import_batch(*args),
+                                   checkpoint, batch_size)
+        finally:
+            checkpoint.close()
+            if self.totals['recipes']:
+                response_cache.invalidate(user.pk, SCOPES)
+                similarity_index.changed(user.pk)
+                if not all(
+                    isinstance(backend, SharedCache) for backend in (
+                        response_cache.backend,
+                        similarity_index.versions.backend,
+                    )
+                ):
+                    self.stderr.write(self.style.WARNING(
+                        'Caches are per process, running servers serve '
+                        'lists, ETags and similar recipes without the '
+                        'imported recipes until their entries expire. '
+                        'Use the shared cache backends.'
+                    ))
+
+        elapsed = time.monotonic() - self.start
+        rows = self.totals['recipes'] + self.totals['links']
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.totals["recipes"]} recipes and '
+            f'{self.totals["links"]} links in {elapsed:.1f} seconds '
+            f'({rows / max(elapsed, 1e-9):.0f} rows/s), skipped '
+            f'{self.totals["skipped"]} invalid records'
+        ))
+
+    def _import_parallel(self, batches, workers, checkpoint, batch_size):
+        """Import batches on a process pool, at most 2 queued per worker"""
+        # Forked workers must open their own connections
+        connections.close_all()
+        failure = None
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            pending = set()
+            for args in batches:
+                pending.add(executor.submit(import_batch, *args))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    failure = self._collect(done, checkpoint, batch_size)
+                    if failure is not None:
+                        break
+            # Batches in flight still commit, record them before failing
+            done, pending = wait(pending)
+            failure = self._collect(done, checkpoint, batch_size) or failure
+
+        if failure is not None:
+            raise failure
+
+    def _collect(self, futures, checkpoint, batch_size):
+        """Record finished batches, return the first exception raised"""
+        failure = None
+        for future in futures:
+            try:
+                number, result = future.result()
+            except Exception as exc:
+                failure = failure or exc
+            else:
+                self._done(number, result, checkpoint, batch_size)
+        return failure
+
+    def _done(self, number, result, checkpoint, batch_size):
+        checkpoint.mark(number)
+        for index, errors in sorted(result['errors'].items()):
+            self.stderr.write(
+                f'Skipped record {number * batch_size + index + 1}: '
+                f'{json.dumps(errors)}'
+            )
+        self.totals['recipes'] += result['recipes']
+        self.totals['links'] += result['links']
+        self.totals['skipped'] += len(result['errors'])
+
+        elapsed = time.monotonic() - self.start
+        rows = self.totals['recipes'] + self.totals['links']
+        self.stdout.write(
+            f'Batch {number}: {result["recipes"]} recipes, '
+            f'{rows / max(elapsed, 1e-9):.0f} rows/s overall'
+        )
+
+
+def _batches(records, size):
+    """Yield (number, list of records) of consecutive batches"""
+    records = iter(records)
+    for number in itertools.count():
+        batch = list(itertools.islice(records, size))
+        if not batch:
+            return
+        yield number, batch
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+
+from core.cache import SharedCache
+from core.models import Tag, Ingredient
+from recipe.cache import response_cache
+
+# Model -> cached list endpoint showing its recipe counts
+CACHED_LISTS = ((Tag, 'tags'), (Ingredient, 'ingredients'))
+
+
+class Command(BaseCommand):
+    """Django command repairing recipe counts of tags and ingredients"""
+    help = (
+        'Recompute the stored recipe_count of tags and ingredients from '
+        'the recipe links and report the rows that were wrong'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows locked and recounted per transaction',
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        batch_size = options['batch_size']
+        stale = False
+        for model, scope in CACHED_LISTS:
+            ids = list(
+                model.objects.order_by('pk').values_list('pk', flat=True)
+            )
+            corrected = 0
+            user_ids = set()
+            for start in range(0, len(ids), batch_size):
+                batch = model.objects.filter(
+                    pk__in=ids[start:start + batch_size],
+                )
+                fixed = batch.recount_recipes()
+                if fixed:
+                    corrected += fixed
+                    user_ids.update(batch.values_list('user_id', flat=True))
+            for user_id in user_ids:
+                response_cache.bump(user_id, scope)
+            stale = stale or bool(user_ids)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural.capitalize()}: '
+                f'{len(ids)} checked, {corrected} corrected'
+            )
+
+        if stale and not isinstance(response_cache.backend, SharedCache):
+            self.stderr.write(self.style.WARNING(
+                'Caches are per process, running servers serve the old '
+                'counts until their entries expire. Use the shared cache '
+                'backends.'
+            ))
@@ -0,0 +1,46 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.benchmark import USER_EMAIL, USER_PASSWORD, seed_users
+
+
+class Command(BaseCommand):
+    """Django command filling the database with benchmark users"""
+    help = 'Seed users with recipe libraries for benchmark_api'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Number of recipes per user',
+        )
+        parser.add_argument('--tags', type=int, default=30)
+        parser.add_argument('--ingredients', type=int, default=120)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument(
+            '--images', type=int, default=10,
+            help='Number of recipes per user with an uploaded image',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        with transaction.atomic():
+            users = seed_users(
+                options['users'],
+                options['recipes'],
+                images=options['images'],
+                rng=random.Random(options['seed']),
+                tags=options['tags'],
+                ingredients=options['ingredients'],
+                tags_per_recipe=options['tags_per_recipe'],
+                ingredients_per_recipe=options['ingredients_per_recipe'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users ({USER_EMAIL.format("N")}, '
+            f'password {USER_PASSWORD!r}) with {options["recipes"]} '
+            f'recipes each'
+        ))
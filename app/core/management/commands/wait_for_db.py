@@ -1,23 +1,53 @@
 import time
 
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """Django command to pause execution until db is available"""
+    help = 'Wait until the database accepts queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to keep retrying before failing',
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Longest pause between two attempts in seconds',
+        )
 
     def handle(self, *args, **options):
         """Handle the command"""
         self.stdout.write('Waiting for database')
-        db_conn = None
-        while not db_conn:
+        connection = connections[options['database']]
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.1
+        while True:
             try:
-                db_conn = connections['default']
-            except OperationalError:
-                self.stdout.write('Database unavailable, waiting for 1 \
-                    seconds')
-                time.sleep(1)
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                break
+            except OperationalError as exc:
+                self._close(connection)
+                if time.monotonic() + delay > deadline:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]} '
+                        f'seconds: {exc}'
+                    )
+                self.stdout.write(
+                    f'Database unavailable, waiting {delay:.1f} seconds'
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
 
+        self._close(connection)
         self.stdout.write(self.style.SUCCESS('Database available'))
+
+    def _close(self, connection):
+        """Drop the probe connection unless a caller's transaction uses it"""
+        if not connection.in_atomic_block:
+            connection.close()
@@ -0,0 +1,381 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Other methods are recorded as 'other' to bound the label values
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+class Histogram:
+    """Cumulative histogram per label values in Prometheus style"""
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0, 0,
+                ]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self, const=()):
+        """Return exposition lines of every series
+
+        const are (name, value) pairs of labels added to every series.
+        """
+        with self._lock:
+            series = [
+                (label_values, list(counts), total, count)
+                for label_values, (counts, total, count)
+                in self._series.items()
+            ]
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} histogram',
+        ]
+        names = tuple(name for name, value in const) + self.labels
+        values = tuple(value for name, value in const)
+        bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+        for label_values, counts, total, count in sorted(series):
+            labels = _format_labels(names, values + label_values)
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = _format_labels(
+                    names + ('le',), values + label_values + (bound,),
+                )
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    """Monotonic counter per label values"""
+    type = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = (
+                self._series.get(label_values, 0) + amount
+            )
+
+    def collect(self, const=()):
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        names = tuple(name for name, value in const) + self.labels
+        values = tuple(value for name, value in const)
+        for label_values, value in series:
+            labels = _format_labels(names, values + label_values)
+            lines.append(f'{self.name}{labels} {_format_value(value)}')
+
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Gauge(Counter):
+    """Current value per label values"""
+    type = 'gauge'
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._series[label_values] = value
+
+
+class Registry:
+    """Metrics recorded for every request handled by the process"""
+
+    def __init__(self):
+        view = ('view', 'method')
+        self.requests = Counter(
+            'http_requests_total', 'Handled requests.', view + ('status',),
+        )
+        self.latency = Histogram(
+            'http_request_duration_seconds',
+            'Time spent handling a request.', view, LATENCY_BUCKETS,
+        )
+        self.queries = Histogram(
+            'http_request_db_queries',
+            'SQL statements executed per request.', view, QUERY_BUCKETS,
+        )
+        self.db_time = Histogram(
+            'http_request_db_duration_seconds',
+            'Time spent in SQL statements per request.',
+            view, LATENCY_BUCKETS,
+        )
+        self.serialize_time = Histogram(
+            'http_response_serialize_duration_seconds',
+            'Time spent building serializer data, without SQL.',
+            view, LATENCY_BUCKETS,
+        )
+        self.render_time = Histogram(
+            'http_response_render_duration_seconds',
+            'Time spent rendering the response body.',
+            view, LATENCY_BUCKETS,
+        )
+        self.size = Histogram(
+            'http_response_size_bytes',
+            'Size of response bodies.', view, SIZE_BUCKETS,
+        )
+        self.pool_wait = Histogram(
+            'db_pool_wait_seconds',
+            'Time spent waiting for a free pooled connection.',
+            ('alias',), LATENCY_BUCKETS,
+        )
+        self.pool_events = Counter(
+            'db_pool_events_total',
+            'Pool checkouts, waits, timeouts, opened and closed connections.',
+            ('alias', 'event'),
+        )
+        self.pool_connections = Gauge(
+            'db_pool_connections',
+            'Pooled connections by state.', ('alias', 'state'),
+        )
+
+    @property
+    def metrics(self):
+        return (
+            self.requests, self.latency, self.queries, self.db_time,
+            self.serialize_time, self.render_time, self.size,
+            self.pool_wait, self.pool_events, self.pool_connections,
+        )
+
+    def render(self):
+        """Return metrics in the Prometheus text exposition format
+
+        With several worker processes each scrape reaches one of them,
+        so the series are labelled with its pid to keep them apart.
+        """
+        const = ()
+        if settings.WEB_CONCURRENCY > 1:
+            const = (('pid', str(os.getpid())),)
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect(const))
+
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """Measurements of one request, also the database execute wrapper"""
+    __slots__ = ('view', 'queries', 'db_time', 'serialize_time',
+                 'render_time')
+
+    def __init__(self):
+        self.view = '<unresolved>'
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = None
+        self.render_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """Record latency, SQL and response metrics per view and action
+
+    Should be the first middleware so the latency covers the others.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request._metrics = RequestMetrics()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        method = request.method if request.method in METHODS else 'other'
+        labels = (metrics.view, method)
+        registry.requests.inc(*labels, str(response.status_code))
+        registry.latency.observe(elapsed, *labels)
+        registry.queries.observe(metrics.queries, *labels)
+        registry.db_time.observe(metrics.db_time, *labels)
+        if metrics.serialize_time is not None:
+            registry.serialize_time.observe(metrics.serialize_time, *labels)
+        if metrics.render_time is not None:
+            registry.render_time.observe(metrics.render_time, *labels)
+        if not response.streaming:
+            registry.size.observe(len(response.content), *labels)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics.view = view_name(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        metrics = request._metrics
+        start = time.perf_counter()
+
+        def rendered(response):
+            metrics.render_time = time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+@contextmanager
+def serializing(request):
+    """Record the time spent in the block as serialization time
+
+    SQL run meanwhile, like relations fetched lazily, is left out as it
+    is recorded as DB time already.
+    """
+    metrics = getattr(request, '_metrics', None)
+    if metrics is None:
+        yield
+        return
+    db_time = metrics.db_time
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - (metrics.db_time - db_time)
+        metrics.serialize_time = (metrics.serialize_time or 0.0) + elapsed
+
+
+class TimedDataMixin:
+    """Serializer recording the time spent building its data"""
+
+    @property
+    def data(self):
+        with serializing(self.context.get('request')):
+            return super().data
+
+
+_timed_classes = {}
+
+
+def _timed_class(cls):
+    timed = _timed_classes.get(cls)
+    if timed is None:
+        timed = _timed_classes[cls] = type(
+            cls.__name__, (TimedDataMixin, cls), {},
+        )
+    return timed
+
+
+class SerializationMetricsMixin:
+    """Generic view mixin timing serializer.data of its serializers
+
+    Serializers build their data inside the view, so this is where the
+    serialization time is measured, the renderer only encodes it.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        # Also covers the ListSerializer created for many=True
+        serializer.__class__ = _timed_class(type(serializer))
+        return serializer
+
+
+def view_name(view_func, method):
+    """Return metric label of a view, viewsets include the action"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower())
+    if action:
+        return f'{cls.__name__}.{action}'
+
+    return cls.__name__
+
+
+def metrics_view(request):
+    """Expose the metrics of this process for scraping
+
+    Without a METRICS_TOKEN scraping is only open in DEBUG.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            raise PermissionDenied
+    elif not constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}',
+    ):
+        raise PermissionDenied
+
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+def _format_labels(names, values):
+    pairs = ','.join(
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+    return f'{{{pairs}}}'
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
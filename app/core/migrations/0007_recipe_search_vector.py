@@ -0,0 +1,52 @@
+# Generated by Django 2.1.15 on 2026-10-18 03:59
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_related_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE core_recipe SET search_vector =
+                setweight(to_tsvector(
+                    'english'::regconfig, COALESCE(title, '')
+                ), 'A') ||
+                setweight(to_tsvector(
+                    'english'::regconfig,
+                    COALESCE(ARRAY_TO_STRING(ARRAY(
+                        SELECT t.name FROM core_tag t
+                        JOIN core_recipe_tags rt ON rt.tag_id = t.id
+                        WHERE rt.recipe_id = core_recipe.id
+                        ORDER BY t.name
+                    ), ' '), '') || ' ' ||
+                    COALESCE(ARRAY_TO_STRING(ARRAY(
+                        SELECT i.name FROM core_ingredient i
+                        JOIN core_recipe_ingredients ri
+                            ON ri.ingredient_id = i.id
+                        WHERE ri.recipe_id = core_recipe.id
+                        ORDER BY i.name
+                    ), ' '), '')
+                ), 'B') ||
+                setweight(to_tsvector(
+                    'english'::regconfig, COALESCE(link, '')
+                ), 'C')
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search_gin'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 2.1.15 on 2026-10-18 04:10
+
+from django.db import migrations
+from django.db.models import Min
+
+
+def merge_duplicates(model, through, field, array_field, Recipe):
+    """Fold rows sharing (user, name) into the one with the lowest id"""
+    groups = (
+        model.objects.values('user_id', 'name')
+        .annotate(keeper=Min('id'))
+        .order_by()
+    )
+    replacements = {}
+    for group in groups:
+        duplicates = model.objects.filter(
+            user_id=group['user_id'], name=group['name'],
+        ).exclude(id=group['keeper']).values_list('id', flat=True)
+        for duplicate in duplicates:
+            replacements[duplicate] = group['keeper']
+    if not replacements:
+        return
+
+    links = through.objects.filter(**{f'{field}_id__in': replacements})
+    recipe_ids = set(links.values_list('recipe_id', flat=True))
+    existing = set(
+        through.objects.filter(recipe_id__in=recipe_ids)
+        .exclude(**{f'{field}_id__in': replacements})
+        .values_list('recipe_id', f'{field}_id')
+    )
+    moved = set()
+    for recipe_id, old_id in links.values_list('recipe_id', f'{field}_id'):
+        pair = (recipe_id, replacements[old_id])
+        if pair not in existing:
+            moved.add(pair)
+    links.delete()
+    through.objects.bulk_create(
+        through(**{'recipe_id': recipe_id, f'{field}_id': new_id})
+        for recipe_id, new_id in moved
+    )
+    model.objects.filter(id__in=replacements).delete()
+
+    for recipe in Recipe.objects.filter(id__in=recipe_ids):
+        ids = sorted(
+            through.objects.filter(recipe_id=recipe.id)
+            .values_list(f'{field}_id', flat=True)
+        )
+        Recipe.objects.filter(id=recipe.id).update(**{array_field: ids})
+
+
+def merge_names(apps, schema_editor):
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field, array_field in (
+        ('Tag', 'tag', 'tag_ids'),
+        ('Ingredient', 'ingredient', 'ingredient_ids'),
+    ):
+        model = apps.get_model('core', model_name)
+        through = Recipe._meta.get_field(f'{field}s').remote_field.through
+        merge_duplicates(model, through, field, array_field, Recipe)
+    # Run deferred foreign key checks before the tables are altered
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_names, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('user', 'name')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='tag',
+            unique_together={('user', 'name')},
+        ),
+    ]
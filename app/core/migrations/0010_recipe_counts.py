@@ -0,0 +1,35 @@
+# Generated by Django 2.1.15 on 2026-10-18 05:03
+
+from django.db import migrations, models
+
+COUNT_SQL = """
+    UPDATE core_{model} SET recipe_count = (
+        SELECT COUNT(*) FROM core_recipe_{model}s
+        WHERE core_recipe_{model}s.{model}_id = core_{model}.id
+    )
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_unique_tag_ingredient_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            COUNT_SQL.format(model='tag'), migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            COUNT_SQL.format(model='ingredient'), migrations.RunSQL.noop,
+        ),
+    ]
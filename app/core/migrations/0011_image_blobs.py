@@ -0,0 +1,45 @@
+# Generated by Django 2.1.15 on 2026-10-18 05:10
+
+import core.models
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def register_images(apps, schema_editor):
+    """Create blobs referenced by the images recipes already have"""
+    Recipe = apps.get_model('core', 'Recipe')
+    ImageBlob = apps.get_model('core', 'ImageBlob')
+    counts = (
+        Recipe.objects.exclude(image__isnull=True).exclude(image='')
+        .values('image').annotate(count=Count('id')).order_by()
+    )
+    ImageBlob.objects.bulk_create(
+        ImageBlob(name=row['image'], ref_count=row['count'])
+        for row in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('released_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.RunPython(register_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 2.1.15 on 2026-10-18 05:22
+
+from django.db import migrations, models
+
+# The through tables are created by Django with a (recipe_id, <field>_id)
+# unique index, these serve the lookups of the recipes of a tag or an
+# ingredient (assigned_only, recipe counts) from the index alone
+THROUGH_INDEXES = (
+    ('core_recipe_tags', 'tag_id'),
+    ('core_recipe_ingredients', 'ingredient_id'),
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_price_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name', 'id'], name='core_ingr_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'id'], name='core_recipe_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name', 'id'], name='core_tag_user_name_idx'),
+        ),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX {table}_reverse_idx ON {table} '
+            f'({column}, recipe_id)',
+            f'DROP INDEX {table}_reverse_idx',
+        )
+        for table, column in THROUGH_INDEXES
+    ]
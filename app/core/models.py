@@ -1,17 +1,25 @@
-import uuid
 import os
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models.functions import Cast
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, \
                                 PermissionsMixin
+from django.contrib.postgres.fields import ArrayField, JSONField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+                                SearchVector, SearchVectorField
 from django.conf import settings
 
+from core.storage import image_storage
+
+# Text search configuration used to build and query Recipe.search_vector
+SEARCH_CONFIG = 'english'
+
 
 def recipe_image_file_path(instance, filename):
-    """Genrate file path for recipe image"""
-    ext = filename.split('.')[-1]
-    filename = f'{uuid.uuid4()}.{ext}'
+    """Genrate file path for recipe image, the storage names it by content"""
+    ext = filename.split('.')[-1].lower()
 
-    return os.path.join('uploads/recipe/', filename)
+    return os.path.join('uploads/recipe/', f'upload.{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -48,6 +56,117 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class RecipeAttrQuerySet(models.QuerySet):
+
+    def _recipe_links(self):
+        """Return rows of the recipe through table linking outer rows"""
+        through = self.model.recipe_set.through
+        field = self.model._meta.model_name
+        return through.objects.filter(**{field: models.OuterRef('pk')})
+
+    def assigned(self):
+        """Filter rows linked to at least one recipe
+
+        Uses a semi join instead of joining every link and collapsing
+        the duplicates with DISTINCT.
+        """
+        return self.annotate(
+            is_assigned=models.Exists(self._recipe_links()),
+        ).filter(is_assigned=True)
+
+    def _recipe_link_count(self):
+        """Return the number of recipes linking the outer row"""
+        counts = self._recipe_links().order_by().annotate(
+            count=models.Func(models.F('pk'), function='COUNT'),
+        ).values('count')
+        return models.Subquery(counts, output_field=models.IntegerField())
+
+    def add_recipe_counts(self, deltas):
+        """Add {pk: delta} to the stored recipe_count of rows
+
+        Increments are applied by the database so concurrent writers
+        do not overwrite each other. Rows are locked in pk order first,
+        writers adjusting overlapping rows then queue instead of
+        deadlocking.
+        """
+        ids = sorted(pk for pk, delta in deltas.items() if delta)
+        if not ids:
+            return 0
+
+        table = self.model._meta.db_table
+        db = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=db, savepoint=False), \
+                connections[db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT id FROM {table} WHERE id = ANY(%s) '
+                f'ORDER BY id FOR NO KEY UPDATE',
+                [ids],
+            )
+            cursor.execute(f"""
+                UPDATE {table}
+                SET recipe_count = {table}.recipe_count + delta.value
+                FROM unnest(%s::integer[], %s::integer[])
+                    AS delta (id, value)
+                WHERE {table}.id = delta.id
+            """, [ids, [deltas[pk] for pk in ids]])
+            return cursor.rowcount
+
+    def recount_recipes(self):
+        """Recompute recipe_count of the rows, return how many were wrong
+
+        The rows are locked first, which also blocks links to them from
+        being added, so no concurrently committed link is missed.
+        """
+        db = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=db):
+            ids = list(
+                self.using(db).select_for_update().order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            count = self._recipe_link_count()
+            return self.model.objects.using(db).filter(pk__in=ids).exclude(
+                recipe_count=count,
+            ).update(recipe_count=count)
+
+    def get_or_create_names(self, user, names, retries=3):
+        """Return {name: (id, created)} creating missing names of user
+
+        Inserts and lookups happen in a single statement relying on the
+        (user, name) unique index. A name committed by a concurrent
+        caller after the statement started is invisible to it, such
+        names are looked up again.
+        """
+        table = self.model._meta.db_table
+        sql = f"""
+            WITH input AS (
+                SELECT DISTINCT unnest(%s::varchar[]) AS name
+            ), inserted AS (
+                INSERT INTO {table} (user_id, name, recipe_count)
+                SELECT %s, name, 0 FROM input
+                ON CONFLICT (user_id, name) DO NOTHING
+                RETURNING id, name
+            )
+            SELECT id, name, true FROM inserted
+            UNION ALL
+            SELECT existing.id, existing.name, false
+            FROM {table} existing JOIN input USING (name)
+            WHERE existing.user_id = %s
+        """
+        result = {}
+        missing = list(dict.fromkeys(names))
+        db = self._db or router.db_for_write(self.model)
+        with connections[db].cursor() as cursor:
+            for attempt in range(retries):
+                cursor.execute(sql, [missing, user.pk, user.pk])
+                for pk, name, created in cursor.fetchall():
+                    result[name] = (pk, created)
+                missing = [name for name in missing if name not in result]
+                if not missing:
+                    break
+
+        return result
+
+
 class Tag(models.Model):
     """Tag to be userd for recipe"""
     name = models.CharField(max_length=255)
@@ -55,6 +174,25 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # Number of recipes linking the row, kept in step by core.signals
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        unique_together = (('user', 'name'),)
+        indexes = [
+            # Keyset pages of ?ordering=name/-name, read in index order
+            models.Index(
+                fields=['user', 'name', 'id'],
+                name='core_tag_user_name_idx',
+            ),
+            # And of ?ordering=recipe_count/-recipe_count
+            models.Index(
+                fields=['user', 'recipe_count', 'id'],
+                name='core_tag_user_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -67,6 +205,147 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # Number of recipes linking the row, kept in step by core.signals
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    objects = RecipeAttrQuerySet.as_manager()
+
+    class Meta:
+        unique_together = (('user', 'name'),)
+        indexes = [
+            # Keyset pages of ?ordering=name/-name, read in index order
+            models.Index(
+                fields=['user', 'name', 'id'],
+                name='core_ingr_user_name_idx',
+            ),
+            # And of ?ordering=recipe_count/-recipe_count
+            models.Index(
+                fields=['user', 'recipe_count', 'id'],
+                name='core_ingr_user_count_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+def _related_ids(through, field):
+    """Return ARRAY() of related ids of the outer recipe"""
+    ids = through.objects.filter(
+        recipe_id=models.OuterRef('pk'),
+    ).order_by(field).values(field)
+
+    return models.Func(
+        models.Subquery(ids),
+        template='ARRAY%(expressions)s',
+        output_field=ArrayField(models.IntegerField()),
+    )
+
+
+def _related_names(model):
+    """Return space separated names of tags/ingredients of outer recipe"""
+    names = model.objects.filter(
+        recipe=models.OuterRef('pk'),
+    ).order_by('name').values('name')
+
+    return models.Func(
+        models.Subquery(names),
+        template="ARRAY_TO_STRING(ARRAY%(expressions)s, ' ')",
+        output_field=models.TextField(),
+    )
+
+
+def _search_document():
+    """Return weighted search vector of the recipe and its related names"""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+        SearchVector(
+            _related_names(Tag),
+            _related_names(Ingredient),
+            weight='B',
+            config=SEARCH_CONFIG,
+        ) +
+        SearchVector('link', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def sync_related(self):
+        """Refresh denormalized copies of tag and ingredient data"""
+        return self.update(
+            tag_ids=_related_ids(Recipe.tags.through, 'tag_id'),
+            ingredient_ids=_related_ids(
+                Recipe.ingredients.through,
+                'ingredient_id',
+            ),
+            search_vector=_search_document(),
+        )
+
+    def update_search_vector(self):
+        """Rebuild the stored search vector"""
+        return self.update(search_vector=_search_document())
+
+    def search(self, text):
+        """Return recipes matching text annotated with their rank"""
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        rank = Cast(
+            SearchRank(models.F('search_vector'), query),
+            models.FloatField(),
+        )
+
+        return self.filter(search_vector=query).annotate(rank=rank)
+
+
+class ImageBlobQuerySet(models.QuerySet):
+
+    def touch(self, name):
+        """Register a stored file, restarting the grace period if unused"""
+        self._upsert(name, """
+            INSERT INTO {table} (name, ref_count, released_at)
+            VALUES (%s, 0, now())
+            ON CONFLICT (name) DO UPDATE SET released_at = CASE
+                WHEN {table}.ref_count = 0 THEN now()
+                ELSE {table}.released_at
+            END
+        """)
+
+    def retain(self, name):
+        """Add a reference to a stored file"""
+        self._upsert(name, """
+            INSERT INTO {table} (name, ref_count, released_at)
+            VALUES (%s, 1, NULL)
+            ON CONFLICT (name) DO UPDATE SET
+                ref_count = {table}.ref_count + 1, released_at = NULL
+        """)
+
+    def release(self, name):
+        """Drop a reference, marking the time the last one went away"""
+        return self.filter(name=name, ref_count__gt=0).update(
+            ref_count=models.F('ref_count') - 1,
+            released_at=models.Case(
+                models.When(ref_count=1, then=models.Func(function='now')),
+                default=models.F('released_at'),
+            ),
+        )
+
+    def _upsert(self, name, sql):
+        db = self._db or router.db_for_write(self.model)
+        with connections[db].cursor() as cursor:
+            cursor.execute(
+                sql.format(table=self.model._meta.db_table), [name],
+            )
+
+
+class ImageBlob(models.Model):
+    """Stored content addressed file and the number of its users"""
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    # When ref_count last dropped to 0, or the file was stored again
+    # while unused, blobs unused for long enough are collected
+    released_at = models.DateTimeField(null=True)
+
+    objects = ImageBlobQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -74,6 +353,15 @@ class Ingredient(models.Model):
 
 class Recipe(models.Model):
     """Recipe object"""
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = (
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -84,7 +372,72 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('Ingredient')
     tags = models.ManyToManyField('Tag')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=image_storage,
+    )
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUS_CHOICES,
+        blank=True,
+        editable=False,
+    )
+    # Storage paths of resized copies of image, keyed by variant name
+    image_variants = JSONField(default=dict, editable=False)
+    # Copies of the m2m links kept in sync by core.signals so that
+    # tag/ingredient filters are answered from a GIN index
+    tag_ids = ArrayField(models.IntegerField(), default=list, editable=False)
+    ingredient_ids = ArrayField(
+        models.IntegerField(),
+        default=list,
+        editable=False,
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['tag_ids'], name='core_recipe_tag_ids_gin'),
+            GinIndex(
+                fields=['ingredient_ids'],
+                name='core_recipe_ingr_ids_gin',
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='core_recipe_search_gin',
+            ),
+            # Keyset pages of the default id ordering
+            models.Index(
+                fields=['user', 'id'],
+                name='core_recipe_user_id_idx',
+            ),
+            # Range filters and keyset pages of ?ordering=price/time
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='core_recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='core_recipe_user_time_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Image name as loaded, core.signals moves the blob references
+        # when a save changes it
+        image = instance.__dict__.get('image', models.DEFERRED)
+        instance._stored_image = image if image is models.DEFERRED \
+            else image or ''
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using, fields)
+        if fields is None or 'image' in fields:
+            self._stored_image = self.image.name or ''
@@ -0,0 +1,170 @@
+from collections import Counter
+
+from django.db.models import DEFERRED
+from django.db.models.signals import m2m_changed, post_delete, \
+    post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import ImageBlob, Tag, Ingredient, Recipe
+
+# Through model of a recipe relation -> (counted model, its column)
+COUNTED_LINKS = {
+    Recipe.tags.through: (Tag, 'tag_id'),
+    Recipe.ingredients.through: (Ingredient, 'ingredient_id'),
+}
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(sender, instance, raw=False, **kwargs):
+    """Index title and link of a saved recipe for full text search"""
+    if not raw:
+        Recipe.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Tag)
+def update_tagged_recipes(sender, instance, created, raw=False, **kwargs):
+    """Reindex recipes carrying a renamed tag"""
+    if not created and not raw:
+        Recipe.objects.filter(tag_ids__contains=[instance.pk]).sync_related()
+
+
+@receiver(post_save, sender=Ingredient)
+def update_recipes_with_ingredient(sender, instance, created, raw=False,
+                                   **kwargs):
+    """Reindex recipes using a renamed ingredient"""
+    if not created and not raw:
+        Recipe.objects.filter(
+            ingredient_ids__contains=[instance.pk],
+        ).sync_related()
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def sync_recipe_related_ids(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    """Keep denormalized tag and ingredient data in step with links"""
+    if action == 'pre_clear' and reverse:
+        instance._cleared_recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = instance.__dict__.pop('_cleared_recipe_ids', [])
+    else:
+        recipe_ids = pk_set
+
+    Recipe.objects.filter(pk__in=recipe_ids).sync_related()
+
+
+@receiver(post_delete, sender=Tag)
+def remove_deleted_tag_id(sender, instance, **kwargs):
+    """Drop id of a deleted tag from recipes that referenced it"""
+    Recipe.objects.filter(tag_ids__contains=[instance.pk]).sync_related()
+
+
+@receiver(post_delete, sender=Ingredient)
+def remove_deleted_ingredient_id(sender, instance, **kwargs):
+    """Drop id of a deleted ingredient from recipes that referenced it"""
+    Recipe.objects.filter(
+        ingredient_ids__contains=[instance.pk],
+    ).sync_related()
+
+
+def _lock_links(through, instance, reverse, pk_set, using):
+    """Lock and return counted ids of links of instance to be removed
+
+    Locking the instance row blocks new links to it, their foreign key
+    checks share lock it, and locking the links waits for concurrent
+    removals. The links returned are then exactly the ones deleted.
+    """
+    model, column = COUNTED_LINKS[through]
+    type(instance).objects.using(using).select_for_update().filter(
+        pk=instance.pk,
+    ).exists()
+    own, other = (column, 'recipe_id') if reverse else ('recipe_id', column)
+    links = through.objects.using(using).select_for_update().filter(
+        **{own: instance.pk}
+    )
+    if pk_set is not None:
+        links = links.filter(**{f'{other}__in': pk_set})
+
+    return list(links.values_list(column, flat=True))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts(sender, instance, action, reverse, pk_set, using,
+                         **kwargs):
+    """Keep recipe counts of tags and ingredients in step with links"""
+    if action in ('pre_remove', 'pre_clear'):
+        instance._removed_links = _lock_links(
+            sender, instance, reverse, pk_set, using,
+        )
+        return
+    if action == 'post_add':
+        delta = 1
+        links = list(pk_set) if not reverse else [instance.pk] * len(pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        delta = -1
+        links = instance.__dict__.pop('_removed_links', [])
+    else:
+        return
+
+    model, column = COUNTED_LINKS[sender]
+    model.objects.using(using).add_recipe_counts({
+        pk: delta * count for pk, count in Counter(links).items()
+    })
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_deleted_recipe(sender, instance, using, **kwargs):
+    """Decrement counts of tags and ingredients of a deleted recipe"""
+    for through, (model, column) in COUNTED_LINKS.items():
+        links = _lock_links(through, instance, False, None, using)
+        model.objects.using(using).add_recipe_counts(
+            {pk: -1 for pk in links}
+        )
+
+
+@receiver(pre_save, sender=Recipe)
+def load_stored_image(sender, instance, raw=False, **kwargs):
+    """Look up the stored image name of a recipe loaded without it"""
+    stored = getattr(instance, '_stored_image', '')
+    if stored is DEFERRED and 'image' in instance.__dict__:
+        instance._stored_image = Recipe.objects.filter(
+            pk=instance.pk,
+        ).values_list('image', flat=True).first() or ''
+
+
+@receiver(post_save, sender=Recipe)
+def move_image_reference(sender, instance, raw=False, update_fields=None,
+                         **kwargs):
+    """Reference the saved image blob instead of the replaced one"""
+    if raw or 'image' not in instance.__dict__:
+        return
+    if update_fields is not None and 'image' not in update_fields:
+        return
+
+    stored = getattr(instance, '_stored_image', '')
+    name = instance.image.name or ''
+    if name != stored:
+        if name:
+            ImageBlob.objects.retain(name)
+        if stored:
+            ImageBlob.objects.release(stored)
+    instance._stored_image = name
+
+
+@receiver(pre_delete, sender=Recipe)
+def release_deleted_image(sender, instance, **kwargs):
+    """Drop the image blob reference of a deleted recipe"""
+    stored = getattr(instance, '_stored_image', DEFERRED)
+    if stored is DEFERRED:
+        stored = instance.image.name
+    if stored:
+        ImageBlob.objects.release(stored)
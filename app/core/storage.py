@@ -0,0 +1,61 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+# Files named after a SHA-256, originals and their "<digest>_<variant>"
+# resized copies, never change so their urls can be cached forever
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)[0-9a-f]{64}(_[a-z]+)?\.\w+$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after the SHA-256 of their content
+
+    Uploads are hashed while they are streamed to a staging file, which
+    then becomes "<directory>/<digest[:2]>/<digest>.<ext>" unless that
+    file already exists, so identical uploads are stored once. Every
+    stored name is registered as an ImageBlob, whose reference counts
+    decide when the garbage collector may delete it.
+    """
+
+    def _save(self, name, content):
+        from core.models import ImageBlob
+
+        directory, filename = os.path.split(name)
+        os.makedirs(self.path(directory), exist_ok=True)
+        fd, staged = tempfile.mkstemp(
+            dir=self.path(directory), prefix='.upload-',
+        )
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(fd, 'wb') as staged_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    staged_file.write(chunk)
+
+            digest = digest.hexdigest()
+            ext = os.path.splitext(filename)[1].lower()
+            name = os.path.join(directory, digest[:2], digest + ext)
+            # Registered before the file is checked: the collector
+            # deletes blobs while holding their row lock, so either it
+            # is done and the file is written again, or it skips it
+            ImageBlob.objects.touch(name)
+
+            path = self.path(name)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(staged, self.file_permissions_mode or 0o644)
+                os.replace(staged, path)
+                staged = None
+        finally:
+            if staged is not None:
+                os.remove(staged)
+
+        return name.replace('\\', '/')
+
+
+image_storage = ContentAddressedStorage()
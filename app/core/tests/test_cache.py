@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import LRUCache, SharedCache, VersionCounter, build_cache
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Test the in-process LRU cache"""
+
+    def test_get_and_set(self):
+        """Test stored values are returned until deleted"""
+        cache = LRUCache(max_entries=10)
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+
+    def test_least_recently_used_evicted(self):
+        """Test the least recently read entry is evicted first"""
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.evictions, 1)
+
+    @patch('core.cache.time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test entries are dropped after their timeout"""
+        monotonic.return_value = 100
+        cache = LRUCache(timeout=10)
+        cache.set('a', 1)
+        cache.set('forever', 2, timeout=0)
+
+        monotonic.return_value = 111
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('forever'), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_add_and_incr(self):
+        """Test add keeps existing values and incr requires a value"""
+        cache = LRUCache()
+        self.assertTrue(cache.add('a', 1))
+        self.assertFalse(cache.add('a', 5))
+
+        self.assertEqual(cache.incr('a'), 2)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+
+
+class VersionCounterTests(SimpleTestCase):
+    """Test versions kept in a cache backend"""
+
+    @patch('core.cache.time.time_ns', return_value=1000)
+    def test_get_and_bump(self, time_ns):
+        """Test versions start from the clock and restart when evicted"""
+        backend = LRUCache()
+        versions = VersionCounter(backend, 'test:version')
+
+        self.assertEqual(versions.get(7, 'tags'), 1000)
+        self.assertEqual(versions.bump(7, 'tags'), 1001)
+        self.assertEqual(backend.get('test:version:7:tags'), 1001)
+
+        backend.clear()
+        time_ns.return_value = 2000
+        self.assertIsNone(versions.bump(7, 'tags'))
+        self.assertEqual(versions.get(7, 'tags'), 2000)
+
+
+SHARED_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache',
+    },
+}
+
+
+class BuildCacheTests(SimpleTestCase):
+    """Test caches are only built when every process sees them"""
+
+    def test_local(self):
+        """Test local caches are refused with several processes"""
+        self.assertIsInstance(build_cache({'BACKEND': 'local'}), LRUCache)
+
+        with override_settings(WEB_CONCURRENCY=4):
+            with self.assertRaises(ImproperlyConfigured):
+                build_cache({'BACKEND': 'local'})
+            self.assertIsInstance(build_cache({'BACKEND': 'none'}), LRUCache)
+
+    def test_shared(self):
+        """Test shared caches are refused over a process local alias"""
+        with self.assertRaises(ImproperlyConfigured):
+            build_cache({'BACKEND': 'shared'})
+
+        with override_settings(CACHES=SHARED_CACHES, WEB_CONCURRENCY=4):
+            cache = build_cache({'BACKEND': 'shared', 'TIMEOUT': 5})
+
+        self.assertIsInstance(cache, SharedCache)
+        self.assertEqual(cache.timeout, 5)
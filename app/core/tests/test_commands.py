@@ -1,23 +1,489 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.db.utils import OperationalError
 from django.core.management import call_command
-from django.test import TestCase
+from django.core.management.base import CommandError
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.benchmark import run_concurrent
+from core.management.commands.benchmark_api import ROUTES
+from core.models import ImageBlob, Ingredient, Recipe, Tag
+from recipe.cache import response_cache
+from recipe.export import RecipeExporter
+
+ENSURE_CONNECTION = \
+    'django.db.backends.base.base.BaseDatabaseWrapper.ensure_connection'
+BENCHMARK_RUN = 'core.management.commands.benchmark_api.run_concurrent'
 
 
 class CommandTestCase(TestCase):
 
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is ready"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        with patch(ENSURE_CONNECTION) as ec:
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(ec.call_count, 1)
 
     @patch('time.sleep', return_value=None)
     def test_wait_for_db(self, ts):
         """Test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        with patch(ENSURE_CONNECTION) as ec:
+            ec.side_effect = [OperationalError] * 5 + [None]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(ec.call_count, 6)
+        # Pauses back off exponentially
+        self.assertEqual(
+            [round(c[0][0], 1) for c in ts.call_args_list],
+            [0.1, 0.2, 0.4, 0.8, 1.6],
+        )
+
+    @patch('time.sleep', return_value=None)
+    def test_wait_for_db_deadline(self, ts):
+        """Test waiting gives up once the deadline passes"""
+        with patch(ENSURE_CONNECTION, side_effect=OperationalError):
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=0.5, stdout=StringIO())
+
+        # 0.1, 0.2 and 0.4 fit, the 0.8 second pause would overrun
+        self.assertEqual(len(ts.call_args_list), 3)
+
+    def test_benchmark_search(self):
+        """Test search benchmark reports each size and leaves no data"""
+        out = StringIO()
+        call_command(
+            'benchmark_search',
+            sizes='20,40',
+            queries=3,
+            stdout=out,
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[2].split()[0], '40')
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_auth(self):
+        """Test auth benchmark reports both authentication classes"""
+        out = StringIO()
+        call_command('benchmark_auth', requests=3, tags=2, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[1].split()[:2], ['TokenAuthentication', '1'])
+        self.assertEqual(
+            lines[2].split()[:2],
+            ['CachedTokenAuthentication', '0'],
+        )
+
+    def test_benchmark_similarity(self):
+        """Test similarity benchmark reports each method, leaves no data"""
+        out = StringIO()
+        call_command(
+            'benchmark_similarity', recipes=50, requests=3, api=True,
+            stdout=out,
+        )
+
+        methods = [line.split()[0] for line in out.getvalue().splitlines()]
+        self.assertEqual(methods[2:], ['index', 'Loaded', 'api', 'sql'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_media(self):
+        """Test media benchmark reports bytes relayed by each mode"""
+        out = StringIO()
+        call_command('benchmark_media', requests=2, sizes='4', stdout=out)
+
+        rows = [line.split()[:3] for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual(rows, [
+            ['static.serve', '4', '4'],
+            ['django', '4', '4'],
+            ['sendfile', '4', '0'],
+            ['accel', '4', '0'],
+        ])
+        self.assertFalse(Recipe.objects.exists())
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    RECIPE_IMAGE_PROCESSING='sync',
+)
+class BenchmarkApiCommandTests(TransactionTestCase):
+    """Test seeding and load testing against committed data"""
+
+    def test_seed_data(self):
+        """Test seeding creates users with libraries and images"""
+        call_command(
+            'seed_data', users=2, recipes=10, images=2, stdout=StringIO(),
+        )
+
+        users = get_user_model().objects.filter(
+            email__startswith='benchmark.user',
+        )
+        self.assertEqual(users.count(), 2)
+        for user in users:
+            recipes = Recipe.objects.filter(user=user)
+            self.assertEqual(recipes.count(), 10)
+            self.assertEqual(recipes.exclude(image='').count(), 2)
+            self.assertEqual(len(recipes.first().tag_ids), 3)
+
+    def test_benchmark_api_report(self):
+        """Test routes are driven concurrently and reported as JSON"""
+        call_command('seed_data', users=2, recipes=5, images=0,
+                     stdout=StringIO())
+        out = StringIO()
+
+        call_command(
+            'benchmark_api',
+            routes='recipes.list,recipes.similar,recipes.delete,'
+                   'tags.create,user.create',
+            requests=4,
+            concurrency=2,
+            stdout=out,
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(list(report['routes']), [
+            'recipes.list', 'recipes.similar', 'recipes.delete',
+            'tags.create', 'user.create',
+        ])
+        for stats in report['routes'].values():
+            self.assertEqual(stats['requests'], 4)
+            self.assertEqual(stats['errors'], 0)
+            for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms',
+                        'queries_per_request'):
+                self.assertIn(key, stats)
+        # Objects written by the benchmark are removed, seeded ones kept
+        self.assertEqual(Recipe.objects.count(), 10)
+        self.assertFalse(Tag.objects.filter(name__startswith='Load').exists())
+        self.assertFalse(get_user_model().objects.filter(
+            email__startswith='benchmark.load',
+        ).exists())
+
+    def test_benchmark_api_keeps_seeded_data(self):
+        """Test write routes run last and leave seeded recipes alone"""
+        call_command('seed_data', users=2, recipes=5, images=1,
+                     stdout=StringIO())
+        seeded = list(Recipe.objects.order_by('id').values_list(
+            'id', 'time_minutes', 'tag_ids', 'image',
+        ))
+        counts = list(Tag.objects.order_by('id').values_list(
+            'id', 'recipe_count',
+        ))
+        out = StringIO()
+
+        with patch(BENCHMARK_RUN, wraps=run_concurrent) as run:
+            call_command(
+                'benchmark_api',
+                routes='recipes.update,recipes.upload_image,recipes.list',
+                requests=4,
+                concurrency=2,
+                stdout=out,
+            )
+
+        report = json.loads(out.getvalue())
+        for stats in report['routes'].values():
+            self.assertEqual(stats['errors'], 0)
+
+        self.assertEqual([call[0][1] for call in run.call_args_list], [
+            ROUTES[name][0] for name in (
+                'recipes.list', 'recipes.update', 'recipes.upload_image',
+            )
+        ])
+        self.assertEqual(list(Recipe.objects.order_by('id').values_list(
+            'id', 'time_minutes', 'tag_ids', 'image',
+        )), seeded)
+        self.assertEqual(list(Tag.objects.order_by('id').values_list(
+            'id', 'recipe_count',
+        )), counts)
+
+    def test_benchmark_api_media(self):
+        """Test media routes serve seeded images to their owners"""
+        call_command('seed_data', users=2, recipes=5, images=1,
+                     stdout=StringIO())
+        out = StringIO()
+
+        call_command(
+            'benchmark_api', routes='media.image,media.image_range',
+            requests=4, concurrency=2, stdout=out,
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            list(report['routes']), ['media.image', 'media.image_range'],
+        )
+        for stats in report['routes'].values():
+            self.assertEqual(stats['requests'], 4)
+            self.assertEqual(stats['errors'], 0)
+
+    def test_benchmark_api_media_requires_images(self):
+        """Test media routes fail clearly without seeded images"""
+        call_command('seed_data', users=1, recipes=2, images=0,
+                     stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'benchmark_api', routes='media.image', stdout=StringIO(),
+            )
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_benchmark_api_metrics(self):
+        """Test the metrics route scrapes with the configured token"""
+        call_command('seed_data', users=1, recipes=2, images=0,
+                     stdout=StringIO())
+        out = StringIO()
+
+        call_command(
+            'benchmark_api', routes='metrics', requests=4, concurrency=2,
+            stdout=out,
+        )
+
+        stats = json.loads(out.getvalue())['routes']['metrics']
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['errors'], 0)
+
+    def test_benchmark_api_requires_seed(self):
+        """Test running without seeded users fails clearly"""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_api', stdout=StringIO())
+
+
+def write_import_file(directory, name, content):
+    """Write content to a file in directory and return its path"""
+    path = os.path.join(directory, name)
+    with open(path, 'w') as file:
+        file.write(content)
+    return path
+
+
+def ndjson(records):
+    return ''.join(json.dumps(record) + '\n' for record in records)
+
+
+class RecountRecipesCommandTests(TestCase):
+    """Test repairing stored recipe counts"""
+
+    def test_recount_recipes(self):
+        """Test drifted counts are corrected and reported"""
+        user = get_user_model().objects.create_user(
+            'shubham.recount@gmail.com', 'shubham',
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        Tag.objects.create(user=user, name='Thai')
+        recipe = Recipe.objects.create(
+            user=user, title='Curry', time_minutes=10, price=5,
+        )
+        recipe.tags.add(tag)
+        Tag.objects.filter(pk=tag.pk).update(recipe_count=0)
+        version = response_cache.get_version(user.pk, 'tags')
+        out, err = StringIO(), StringIO()
+
+        call_command('recount_recipes', batch_size=1, stdout=out,
+                     stderr=err)
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertIn('Tags: 2 checked, 1 corrected', out.getvalue())
+        self.assertIn('Ingredients: 0 checked, 0 corrected', out.getvalue())
+        # Cached tag lists show the corrected count, in this process only
+        self.assertNotEqual(
+            response_cache.get_version(user.pk, 'tags'), version,
+        )
+        self.assertIn('Caches are per process', err.getvalue())
+
+
+class CollectImagesCommandTests(TestCase):
+    """Test deleting unreferenced recipe images"""
+
+    def test_collect_images(self):
+        """Test only images unused for the grace period are deleted"""
+        ImageBlob.objects.touch('uploads/recipe/unused.jpg')
+        ImageBlob.objects.retain('uploads/recipe/used.jpg')
+        out = StringIO()
+
+        call_command('collect_images', stdout=out)
+        self.assertIn('Deleted 0 unreferenced images', out.getvalue())
+
+        call_command('collect_images', grace=0, stdout=out)
+        self.assertIn('Deleted 1 unreferenced images', out.getvalue())
+        self.assertEqual(
+            list(ImageBlob.objects.values_list('name', flat=True)),
+            ['uploads/recipe/used.jpg'],
+        )
+
+
+class ImportRecipesCommandTests(TestCase):
+    """Test loading recipe files"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='shubham.import@gmail.com',
+            password='shubham',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_recipes', path, user=self.user.email,
+            stdout=out, stderr=err, **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_import_ndjson_with_copy(self):
+        """Test recipes, names and links are loaded, bad records skipped"""
+        path = write_import_file(self.directory, 'recipes.ndjson', ndjson([
+            {'title': 'Green curry', 'time_minutes': 30, 'price': '7.50',
+             'tags': [{'id': 999, 'name': 'Vegan'}, 'Spicy'],
+             'ingredients': ['Coconut milk', 'Chef\'s "secret" \\ paste']},
+            {'title': 'Toast', 'time_minutes': 'soon', 'price': '1.00'},
+            {'title': 'Porridge', 'time_minutes': 5, 'price': '1.25',
+             'link': None, 'tags': ['Vegan']},
+        ]))
+
+        out, err = self._import(path)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(
+            [r.title for r in recipes], ['Green curry', 'Porridge'],
+        )
+        curry, porridge = recipes
+        spicy = Tag.objects.get(user=self.user, name='Spicy')
+        self.assertEqual(
+            set(curry.tags.all()), {self.tag, spicy},
+        )
+        self.assertEqual(curry.tag_ids, sorted([self.tag.id, spicy.id]))
+        self.assertEqual(
+            sorted(i.name for i in curry.ingredients.all()),
+            ['Chef\'s "secret" \\ paste', 'Coconut milk'],
+        )
+        self.assertEqual(porridge.link, '')
+        self.tag.refresh_from_db()
+        self.assertEqual((self.tag.recipe_count, spicy.recipe_count), (2, 1))
+        self.assertEqual(
+            list(Recipe.objects.search('coconut')), [curry],
+        )
+        # The vector built while loading equals the one signals maintain
+        vectors = dict(recipes.values_list('id', 'search_vector'))
+        recipes.update_search_vector()
+        self.assertEqual(
+            dict(recipes.values_list('id', 'search_vector')), vectors,
+        )
+        self.assertIn('Skipped record 2', err)
+        self.assertIn('time_minutes', err)
+        # Only this process dropped its cached lists
+        self.assertIn('Caches are per process', err)
+        self.assertIn('Imported 2 recipes and 5 links', out)
+
+    def test_import_csv_with_bulk_create(self):
+        """Test CSV exports load with the bulk_create fallback"""
+        path = write_import_file(
+            self.directory, 'recipes.csv',
+            'id,title,time_minutes,price,link,tags,ingredients\n'
+            '7,"Curry, hot",10,5.00,,Vegan;Quick,Rice\n',
+        )
+
+        self._import(path, method='bulk')
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, 'Curry, hot')
+        self.assertEqual(
+            sorted(t.name for t in recipe.tags.all()), ['Quick', 'Vegan'],
+        )
+        self.assertEqual(len(recipe.ingredient_ids), 1)
+
+    def test_csv_export_round_trip(self):
+        """Test names holding the separator or quotes survive CSV"""
+        names = ['Salt; pepper', 'Chef\'s "secret" paste', 'Rice']
+        recipe = Recipe.objects.create(
+            user=self.user, title='Dal', time_minutes=20, price=3,
+        )
+        recipe.ingredients.add(*(
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in names
+        ))
+        recipe.tags.add(self.tag)
+        export = b''.join(RecipeExporter(
+            Recipe.objects.filter(user=self.user),
+        ).stream('csv')).decode()
+        path = write_import_file(self.directory, 'recipes.csv', export)
+        Recipe.objects.all().delete()
+        Ingredient.objects.all().delete()
+
+        self._import(path)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(
+            sorted(i.name for i in recipe.ingredients.all()), sorted(names),
+        )
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+
+    def test_resume_from_checkpoint(self):
+        """Test batches recorded in the checkpoint are not imported again"""
+        records = [
+            {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '1.00'}
+            for i in range(5)
+        ]
+        path = write_import_file(
+            self.directory, 'recipes.ndjson', ndjson(records),
+        )
+        self._import(path, batch_size=2)
+        with open(f'{path}.checkpoint') as file:
+            self.assertEqual(file.read().splitlines()[1:], ['0', '1', '2'])
+
+        # Pretend the last batch never committed
+        Recipe.objects.filter(title='Recipe 4').delete()
+        with open(f'{path}.checkpoint') as file:
+            lines = file.read().splitlines()
+        with open(f'{path}.checkpoint', 'w') as file:
+            file.write('\n'.join(lines[:-1]) + '\n')
+        self._import(path, batch_size=2)
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        with self.assertRaises(CommandError):
+            self._import(path, batch_size=3)
+        self._import(path, batch_size=3, restart=True)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 10)
+
+    def test_unknown_user(self):
+        """Test importing for a missing user fails"""
+        path = write_import_file(self.directory, 'recipes.ndjson', '')
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='nobody@gmail.com')
+
+
+class ParallelImportCommandTests(TransactionTestCase):
+    """Test importing batches in worker processes"""
+
+    def test_import_with_workers(self):
+        """Test workers share created names and every batch commits"""
+        user = get_user_model().objects.create_user(
+            email='shubham.parallel@gmail.com',
+            password='shubham',
+        )
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = write_import_file(directory, 'recipes.ndjson', ndjson([
+            {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '1.00',
+             'tags': ['Quick', f'Tag {i % 3}']}
+            for i in range(12)
+        ]))
+
+        call_command(
+            'import_recipes', path, user=user.email, workers=3,
+            batch_size=2, stdout=StringIO(),
+        )
+
+        self.assertEqual(Recipe.objects.filter(user=user).count(), 12)
+        self.assertEqual(Tag.objects.filter(user=user).count(), 4)
+        with open(f'{path}.checkpoint') as file:
+            self.assertEqual(
+                sorted(file.read().splitlines()[1:], key=int),
+                [str(number) for number in range(6)],
+            )
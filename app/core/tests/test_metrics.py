@@ -0,0 +1,194 @@
+import os
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.metrics import Histogram, MetricsMiddleware, RequestMetrics, \
+    registry, serializing
+from core.models import Recipe, Tag
+from recipe.cache import response_cache
+
+METRICS_URL = reverse('metrics')
+
+
+class HistogramTests(TestCase):
+    """Test the Prometheus histogram exposition"""
+
+    def test_buckets_are_cumulative(self):
+        """Test each bucket counts the observations up to its bound"""
+        histogram = Histogram('size', 'Sizes.', ('view',), (1, 10))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value, 'home')
+
+        self.assertEqual(histogram.collect(), [
+            '# HELP size Sizes.',
+            '# TYPE size histogram',
+            'size_bucket{view="home",le="1"} 2',
+            'size_bucket{view="home",le="10"} 3',
+            'size_bucket{view="home",le="+Inf"} 4',
+            'size_sum{view="home"} 56.5',
+            'size_count{view="home"} 4',
+        ])
+
+
+@override_settings(METRICS_TOKEN='scrape')
+class MetricsMiddlewareTests(TestCase):
+    """Test requests are recorded per view and action"""
+
+    def setUp(self):
+        registry.clear()
+        response_cache.backend.clear()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.metrics@gmail.com',
+            password='shubham',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _metrics(self):
+        res = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer scrape',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.content.decode('utf-8').splitlines()
+
+    def test_viewset_action_recorded(self):
+        """Test list requests are labelled with the viewset action"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        self.client.get(reverse('recipe:tag-list'))
+        lines = self._metrics()
+
+        labels = '{view="TagViewSet.list",method="GET"'
+        self.assertIn(
+            'http_requests_total' + labels + ',status="200"} 1', lines,
+        )
+        self.assertIn('http_request_duration_seconds_count' + labels + '} 1',
+                      lines)
+        self.assertIn('http_response_render_duration_seconds_count' +
+                      labels + '} 1', lines)
+        self.assertIn('http_response_size_bytes_count' + labels + '} 1',
+                      lines)
+
+    def test_serialize_time_recorded(self):
+        """Test time spent building serializer data is recorded"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Dal', time_minutes=10, price=2,
+        )
+
+        self.client.get(reverse('recipe:recipe-detail', args=[recipe.id]))
+        self.client.get(reverse('recipe:recipe-list'))
+        self.client.get(reverse('user:me'))
+        lines = self._metrics()
+
+        for view in ('RecipeViewset.retrieve', 'RecipeViewset.list',
+                     'ManageUserAPIView'):
+            self.assertIn(
+                f'http_response_serialize_duration_seconds_count'
+                f'{{view="{view}",method="GET"}} 1', lines,
+            )
+
+    @patch('core.metrics.time.perf_counter', side_effect=[10, 15])
+    def test_serializing_excludes_sql(self, perf_counter):
+        """Test SQL run while serializing is not serialization time"""
+        request = RequestFactory().get('/')
+        metrics = request._metrics = RequestMetrics()
+
+        with serializing(request):
+            metrics.db_time += 3
+
+        self.assertEqual(metrics.serialize_time, 2)
+
+    def test_query_count_recorded(self):
+        """Test the SQL statements of the request are counted"""
+        self.client.get(reverse('recipe:ingredient-list'))
+
+        lines = self._metrics()
+
+        labels = '{view="IngredientViewset.list",method="GET"}'
+        # Paginated page of an empty list is a single query
+        self.assertIn(f'http_request_db_queries_sum{labels} 1', lines)
+
+    def test_api_view_recorded(self):
+        """Test plain API views are labelled with their class"""
+        self.client.post(reverse('user:token'), {
+            'email': 'shubham.metrics@gmail.com',
+            'password': 'shubham',
+        })
+
+        lines = self._metrics()
+
+        self.assertIn(
+            'http_requests_total{view="CreateTokenView",method="POST",'
+            'status="200"} 1',
+            lines,
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """Test scraping requires the bearer token when configured"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_need_token_outside_debug(self):
+        """Test scraping without a token is only open in DEBUG"""
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(DEBUG=True):
+            res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_series_labelled_with_pid(self):
+        """Test series of several workers are told apart by their pid"""
+        self.client.get(reverse('recipe:tag-list'))
+
+        lines = self._metrics()
+
+        self.assertIn(
+            f'http_requests_total{{pid="{os.getpid()}",'
+            f'view="TagViewSet.list",method="GET",status="200"}} 1',
+            lines,
+        )
+
+    def test_request_instrumentation_calls(self):
+        """Test a request costs two clock reads and an observation each"""
+        request = RequestFactory().get('/api/recipe/tags/')
+        instrumented = MetricsMiddleware(lambda request: HttpResponse(b'x'))
+
+        with patch('core.metrics.time.perf_counter',
+                   wraps=time.perf_counter) as perf_counter, \
+                patch.object(Histogram, 'observe',
+                             autospec=True) as observe:
+            instrumented(request)
+
+        self.assertEqual(perf_counter.call_count, 2)
+        # Latency, queries, DB time and size, nothing rendered
+        self.assertEqual(observe.call_count, 4)
+
+    def test_query_wrapper_calls(self):
+        """Test timing an SQL statement reads the clock twice"""
+        wrapper = RequestMetrics()
+
+        with patch('core.metrics.time.perf_counter',
+                   wraps=time.perf_counter) as perf_counter:
+            with connection.execute_wrapper(wrapper):
+                with connection.cursor() as cursor:
+                    for i in range(500):
+                        cursor.execute('SELECT 1')
+
+        self.assertEqual(wrapper.queries, 500)
+        self.assertEqual(perf_counter.call_count, 1000)
@@ -1,5 +1,6 @@
-from unittest.mock import patch
-from django.test import TestCase
+import threading
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 
 from core import models
@@ -78,13 +79,38 @@ class ModelTest(TestCase):
 
         self.assertEqual(str(recipe), recipe.title)
 
-    @patch('uuid.uuid4')
-    def test_recipe_filename_with_uuid(self, mock_uuid):
+    def test_recipe_filename_keeps_extension(self):
         """Test that image is saved in correct location"""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-
-        file_path = models.recipe_image_file_path(None, 'my_image.jpg')
-        exp_path = f'uploads/recipe/{uuid}.jpg'
-
-        self.assertEqual(file_path, exp_path)
+        file_path = models.recipe_image_file_path(None, 'my_image.JPG')
+
+        self.assertEqual(file_path, 'uploads/recipe/upload.jpg')
+
+
+class GetOrCreateNamesTests(TransactionTestCase):
+    """Test get_or_create_names against concurrent writers"""
+
+    def test_name_committed_concurrently(self):
+        """Test a name inserted by another transaction is returned"""
+        user = sample_user()
+        results = {}
+
+        def get_or_create():
+            try:
+                results.update(models.Tag.objects.get_or_create_names(
+                    user, ['Thai', 'Vegan'],
+                ))
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            tag = models.Tag.objects.create(user=user, name='Thai')
+            worker = threading.Thread(target=get_or_create)
+            worker.start()
+            # The worker blocks on the uncommitted row until we commit
+            worker.join(timeout=0.5)
+            self.assertTrue(worker.is_alive())
+        worker.join()
+
+        self.assertEqual(results['Thai'], (tag.id, False))
+        self.assertTrue(results['Vegan'][1])
+        self.assertEqual(models.Tag.objects.filter(user=user).count(), 2)
@@ -0,0 +1,192 @@
+import threading
+from unittest.mock import Mock, patch
+
+from django.db import connection, connections, transaction
+from django.test import TestCase
+
+from core.db.backends.postgresql_pool.base import DatabaseWrapper
+from core.db.pool import ConnectionPool, PoolTimeout, fill_pools
+from core.metrics import registry
+
+
+class FakeConnection:
+
+    def __init__(self, healthy=True):
+        self.closed = False
+        self.healthy = healthy
+
+    def cursor(self):
+        if not self.healthy:
+            raise OSError('server closed the connection')
+        return FakeCursor()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql):
+        pass
+
+
+def fake_pool(**options):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1], None
+
+    pool = ConnectionPool('fake', connect, **options)
+    return pool, opened
+
+
+class ConnectionPoolTests(TestCase):
+    """Test checking connections in and out of the pool"""
+
+    def setUp(self):
+        registry.clear()
+
+    def test_connection_reused(self):
+        """Test a released connection is handed out again"""
+        pool, opened = fake_pool(size=2)
+
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+
+        self.assertIs(first, second)
+        self.assertEqual(len(opened), 1)
+
+    def test_size_limit_times_out(self):
+        """Test checkout fails once size connections are in use"""
+        pool, opened = fake_pool(size=1, timeout=0.05)
+        pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        self.assertEqual(len(opened), 1)
+        self.assertIn(
+            'db_pool_events_total{alias="fake",event="timeout"} 1',
+            registry.render().splitlines(),
+        )
+
+    def test_waiter_gets_released_connection(self):
+        """Test a waiting checkout continues once a connection is freed"""
+        pool, opened = fake_pool(size=1, timeout=5)
+        entry = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(pool.acquire()),
+        )
+        waiter.start()
+        waiter.join(timeout=0.1)
+        self.assertTrue(waiter.is_alive())
+
+        pool.release(entry)
+        waiter.join()
+
+        self.assertEqual(acquired, [entry])
+        self.assertIn(
+            'db_pool_wait_seconds_count{alias="fake"} 1',
+            registry.render().splitlines(),
+        )
+
+    def test_max_lifetime(self):
+        """Test connections older than max_lifetime are closed"""
+        pool, opened = fake_pool(max_lifetime=60)
+        entry = pool.acquire()
+
+        with patch('time.monotonic', return_value=entry.created + 61):
+            pool.release(entry)
+
+        self.assertTrue(opened[0].closed)
+        self.assertEqual(pool.stats()['opened'], 0)
+
+    def test_idle_timeout(self):
+        """Test connections idle longer than idle_timeout are evicted"""
+        pool, opened = fake_pool(idle_timeout=30)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+
+        with patch('time.monotonic', return_value=first.released + 31):
+            pool.release(second)
+
+        self.assertTrue(opened[0].closed)
+        self.assertFalse(opened[1].closed)
+        self.assertEqual(pool.stats(), {'size': 10, 'opened': 1, 'idle': 1})
+
+    def test_pre_ping_replaces_dead_connection(self):
+        """Test a connection failing the health check is replaced"""
+        pool, opened = fake_pool()
+        entry = pool.acquire()
+        pool.release(entry)
+        opened[0].healthy = False
+
+        replacement = pool.acquire()
+
+        self.assertIsNot(replacement, entry)
+        self.assertTrue(opened[0].closed)
+        self.assertEqual(pool.stats()['opened'], 1)
+
+    def test_fill(self):
+        """Test fill opens connections up to the pool size"""
+        pool, opened = fake_pool(size=3)
+
+        pool.fill()
+
+        self.assertEqual(len(opened), 3)
+        self.assertEqual(pool.stats(), {'size': 3, 'opened': 3, 'idle': 3})
+
+
+class PooledBackendTests(TestCase):
+    """Test the pooled backend against the test database"""
+
+    def setUp(self):
+        self.wrapper = DatabaseWrapper(
+            {**connection.settings_dict, 'POOL': {'SIZE': 2}},
+            alias='pooled',
+        )
+        self.addCleanup(self.wrapper.pool.close)
+        self.addCleanup(self.wrapper.close)
+        # Make the wrapper the thread's 'pooled' connection for atomic()
+        setattr(connections._connections, 'pooled', self.wrapper)
+        self.addCleanup(delattr, connections._connections, 'pooled')
+
+    def _backend_pid(self):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_close_returns_session(self):
+        """Test closing and reconnecting reuses the server session"""
+        pid = self._backend_pid()
+        self.wrapper.close()
+
+        self.assertEqual(self._backend_pid(), pid)
+        self.assertEqual(self.wrapper.pool.stats()['opened'], 1)
+
+    def test_fill_pools(self):
+        """Test the pools of pooled databases of the process are filled"""
+        unpooled = Mock(spec=[])
+        with patch('core.db.pool.connections') as mocked:
+            mocked.all.return_value = [unpooled, self.wrapper]
+            fill_pools()
+
+        self.assertEqual(self.wrapper.pool.stats()['idle'], 2)
+
+    def test_session_closed_in_transaction_discarded(self):
+        """Test a connection closed inside atomic is not reused"""
+        pid = self._backend_pid()
+        with transaction.atomic(using='pooled'):
+            self.wrapper.close()
+        self.wrapper.close()
+
+        self.assertNotEqual(self._backend_pid(), pid)
@@ -0,0 +1,182 @@
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.cache import LRUCache
+from core.db.routing import STICKY_COOKIE, ReplicaRouter
+from core.models import Recipe, Tag
+from recipe.cache import response_cache
+
+REPLICAS = ('replica1', 'replica2')
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample_recipe(user, **params):
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(REPLICA_ROUTING={'ALIASES': REPLICAS, 'STICKY_SECONDS': 5})
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test reads of list/retrieve requests go to the replica aliases
+
+    Both replicas mirror the test database over their own connections,
+    so only committed rows are visible to them.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for alias in REPLICAS:
+            connections.databases[alias] = {
+                **connections.databases[DEFAULT_DB_ALIAS],
+                'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+            }
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in REPLICAS:
+            connections[alias].close()
+            del connections.databases[alias]
+            delattr(connections._connections, alias)
+        super().tearDownClass()
+
+    def setUp(self):
+        response_cache.backend.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com',
+            'testpass',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        for alias in REPLICAS:
+            connections[alias].close()
+
+    def _queries(self, method, url, data=None):
+        """Send a request, return response and queries per alias"""
+        with ExitStack() as stack:
+            captured = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias])
+                )
+                for alias in (DEFAULT_DB_ALIAS,) + REPLICAS
+            }
+            res = getattr(self.client, method)(url, data)
+
+        return res, {alias: len(queries) for alias, queries in
+                     captured.items()}
+
+    def test_list_reads_from_replicas(self):
+        """Test listing recipes only queries the replicas"""
+        sample_recipe(user=self.user)
+
+        res, queries = self._queries('get', RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(queries[DEFAULT_DB_ALIAS], 0)
+        self.assertGreater(queries['replica1'] + queries['replica2'], 0)
+
+    def test_reads_balanced_over_replicas(self):
+        """Test consecutive reads use every replica"""
+        recipe = sample_recipe(user=self.user)
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+        used = {alias: 0 for alias in REPLICAS}
+        for _ in range(4):
+            res, queries = self._queries('get', url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            for alias in REPLICAS:
+                used[alias] += queries[alias]
+
+        self.assertGreater(used['replica1'], 0)
+        self.assertGreater(used['replica2'], 0)
+
+    def test_write_goes_to_primary_and_pins_user(self):
+        """Test the writer reads own changes from the primary"""
+        res, queries = self._queries('post', TAGS_URL, {'name': 'Vegan'})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(queries['replica1'] + queries['replica2'], 0)
+        # Seen by any process serving the next request
+        self.assertEqual(res.cookies[STICKY_COOKIE]['max-age'], 5)
+
+        res, queries = self._queries('get', TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['name'], 'Vegan')
+        self.assertGreater(queries[DEFAULT_DB_ALIAS], 0)
+        self.assertEqual(queries['replica1'] + queries['replica2'], 0)
+
+    def test_pin_shared_without_cookie(self):
+        """Test the sticky cache pins clients that drop the cookie"""
+        with patch('core.db.routing.sticky_cache', LRUCache()):
+            self._queries('post', TAGS_URL, {'name': 'Vegan'})
+            self.client.cookies.clear()
+
+            res, queries = self._queries('get', TAGS_URL)
+
+        self.assertEqual(res.data['results'][0]['name'], 'Vegan')
+        self.assertEqual(queries['replica1'] + queries['replica2'], 0)
+
+    def test_forged_cookie_ignored(self):
+        """Test an unsigned sticky cookie does not pin the user"""
+        self.client.cookies[STICKY_COOKIE] = str(self.user.id)
+
+        res, queries = self._queries('get', TAGS_URL)
+
+        self.assertEqual(queries[DEFAULT_DB_ALIAS], 0)
+
+    def test_pin_limited_to_user_and_window(self):
+        """Test other users and later requests read from the replicas"""
+        self._queries('post', TAGS_URL, {'name': 'Vegan'})
+        other = get_user_model().objects.create_user(
+            'other@londonappdev.com',
+            'testpass',
+        )
+        Tag.objects.create(user=other, name='Fruity')
+
+        self.client.force_authenticate(other)
+        res, queries = self._queries('get', TAGS_URL)
+        self.assertEqual(queries[DEFAULT_DB_ALIAS], 0)
+
+        self.client.force_authenticate(self.user)
+        with patch('time.time', return_value=time.time() + 6):
+            res, queries = self._queries('get', TAGS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries[DEFAULT_DB_ALIAS], 0)
+
+    def test_other_views_use_primary(self):
+        """Test views without read_from_replica never query a replica"""
+        self.user.is_staff = True
+        self.user.save()
+
+        res, queries = self._queries('get', reverse('recipe:cache-stats'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(queries['replica1'] + queries['replica2'], 0)
+
+    def test_router_outside_requests(self):
+        """Test reads outside requests and all writes use the primary"""
+        router = ReplicaRouter()
+        recipe = sample_recipe(user=self.user)
+        recipe._state.db = 'replica1'
+
+        self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+        self.assertEqual(
+            router.db_for_write(Recipe, instance=recipe),
+            DEFAULT_DB_ALIAS,
+        )
+        self.assertFalse(router.allow_migrate('replica1', 'core'))
+        self.assertIsNone(router.allow_migrate(DEFAULT_DB_ALIAS, 'core'))
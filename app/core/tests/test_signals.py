@@ -0,0 +1,220 @@
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from core import models
+
+
+class RecipeRelatedIdsTests(TestCase):
+    """Test denormalized tag and ingredient ids follow recipe links"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'shubham.signals@gmail.com',
+            'shubham',
+        )
+        self.recipe = models.Recipe.objects.create(
+            user=self.user,
+            title='Paneer tikka',
+            time_minutes=20,
+            price=6.00,
+        )
+        self.tag1 = models.Tag.objects.create(user=self.user, name='Veg')
+        self.tag2 = models.Tag.objects.create(user=self.user, name='Spicy')
+        self.ingredient = models.Ingredient.objects.create(
+            user=self.user,
+            name='Paneer',
+        )
+
+    def _ids(self):
+        """Return the stored arrays of the recipe"""
+        self.recipe.refresh_from_db()
+        return self.recipe.tag_ids, self.recipe.ingredient_ids
+
+    def test_add_and_remove(self):
+        """Test adding and removing links updates the arrays"""
+        self.recipe.tags.add(self.tag2, self.tag1)
+        self.recipe.ingredients.add(self.ingredient)
+        self.assertEqual(
+            self._ids(),
+            (sorted([self.tag1.id, self.tag2.id]), [self.ingredient.id]),
+        )
+
+        self.recipe.tags.remove(self.tag1)
+        self.assertEqual(self._ids(), ([self.tag2.id], [self.ingredient.id]))
+
+    def test_set_and_clear(self):
+        """Test replacing and clearing links updates the arrays"""
+        self.recipe.tags.set([self.tag1])
+        self.assertEqual(self._ids(), ([self.tag1.id], []))
+
+        self.recipe.tags.clear()
+        self.assertEqual(self._ids(), ([], []))
+
+    def test_reverse_add_and_clear(self):
+        """Test changing links from the tag side updates the arrays"""
+        self.tag1.recipe_set.add(self.recipe)
+        self.assertEqual(self._ids(), ([self.tag1.id], []))
+
+        self.tag1.recipe_set.clear()
+        self.assertEqual(self._ids(), ([], []))
+
+    def test_delete_tag_and_ingredient(self):
+        """Test deleting a tag or ingredient removes its id"""
+        self.recipe.tags.add(self.tag1, self.tag2)
+        self.recipe.ingredients.add(self.ingredient)
+
+        self.tag1.delete()
+        self.ingredient.delete()
+
+        self.assertEqual(self._ids(), ([self.tag2.id], []))
+
+
+class RecipeCountsTests(TestCase):
+    """Test recipe counts of tags and ingredients follow recipe links"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'shubham.counts@gmail.com',
+            'shubham',
+        )
+        self.recipes = [
+            models.Recipe.objects.create(
+                user=self.user, title=title, time_minutes=20, price=6.00,
+            )
+            for title in ('Paneer tikka', 'Dal makhani')
+        ]
+        self.tag1 = models.Tag.objects.create(user=self.user, name='Veg')
+        self.tag2 = models.Tag.objects.create(user=self.user, name='Spicy')
+        self.ingredient = models.Ingredient.objects.create(
+            user=self.user,
+            name='Paneer',
+        )
+
+    def _counts(self):
+        """Return the stored counts of both tags and the ingredient"""
+        return tuple(
+            type(row).objects.get(pk=row.pk).recipe_count
+            for row in (self.tag1, self.tag2, self.ingredient)
+        )
+
+    def test_add_remove_and_clear(self):
+        """Test links changed from the recipe side adjust the counts"""
+        for recipe in self.recipes:
+            recipe.tags.add(self.tag1, self.tag2)
+        self.recipes[0].tags.add(self.tag1)
+        self.recipes[0].ingredients.add(self.ingredient)
+        self.assertEqual(self._counts(), (2, 2, 1))
+
+        self.recipes[0].tags.remove(self.tag1, self.tag1.pk)
+        self.recipes[1].tags.set([self.tag1])
+        self.assertEqual(self._counts(), (1, 1, 1))
+
+        self.recipes[0].tags.clear()
+        self.recipes[0].ingredients.clear()
+        self.assertEqual(self._counts(), (1, 0, 0))
+
+    def test_reverse_links(self):
+        """Test links changed from the tag side adjust the counts"""
+        self.tag1.recipe_set.add(*self.recipes)
+        self.assertEqual(self._counts(), (2, 0, 0))
+
+        self.tag1.recipe_set.remove(self.recipes[0])
+        self.tag1.recipe_set.remove(self.recipes[0])
+        self.assertEqual(self._counts(), (1, 0, 0))
+
+        self.tag1.recipe_set.clear()
+        self.assertEqual(self._counts(), (0, 0, 0))
+
+    def test_delete_recipes_and_user(self):
+        """Test deleted recipes no longer count, also those of a user"""
+        other = get_user_model().objects.create_user(
+            'shubham.counts2@gmail.com',
+            'shubham',
+        )
+        recipe = models.Recipe.objects.create(
+            user=other, title='Borrowed', time_minutes=5, price=1.00,
+        )
+        for each in (*self.recipes, recipe):
+            each.tags.add(self.tag1)
+            each.ingredients.add(self.ingredient)
+
+        self.recipes[0].delete()
+        self.assertEqual(self._counts(), (2, 0, 2))
+
+        other.delete()
+        self.assertEqual(self._counts(), (1, 0, 1))
+
+    def test_recount(self):
+        """Test recount repairs drifted counts"""
+        self.recipes[0].tags.add(self.tag1)
+        models.Tag.objects.update(recipe_count=7)
+
+        corrected = models.Tag.objects.filter(
+            user=self.user,
+        ).recount_recipes()
+
+        self.assertEqual(corrected, 2)
+        self.assertEqual(self._counts(), (1, 0, 0))
+
+
+class RecipeCountsConcurrencyTests(TransactionTestCase):
+    """Test recipe counts stay exact with concurrent link writers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'shubham.counts@gmail.com',
+            'shubham',
+        )
+        self.recipe = models.Recipe.objects.create(
+            user=self.user, title='Paneer tikka', time_minutes=20, price=6,
+        )
+        self.tag = models.Tag.objects.create(user=self.user, name='Veg')
+
+    def _run_concurrently(self, write, concurrent_write):
+        """Run concurrent_write in a thread while write is uncommitted"""
+        def run():
+            try:
+                concurrent_write()
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            write()
+            worker = threading.Thread(target=run)
+            worker.start()
+            # The worker blocks on the locks of write until we commit
+            worker.join(timeout=0.5)
+            self.assertTrue(worker.is_alive())
+        worker.join()
+
+    def test_same_link_removed_twice(self):
+        """Test a link removed by two writers is uncounted once"""
+        self.recipe.tags.add(self.tag)
+
+        self._run_concurrently(
+            lambda: self.recipe.tags.remove(self.tag),
+            lambda: self.tag.recipe_set.remove(self.recipe),
+        )
+
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 0)
+
+    def test_link_added_while_clearing(self):
+        """Test a link added during a clear is not uncounted"""
+        other = models.Tag.objects.create(user=self.user, name='Spicy')
+        self.recipe.tags.add(self.tag)
+
+        self._run_concurrently(
+            self.recipe.tags.clear,
+            lambda: self.recipe.tags.add(other),
+        )
+
+        self.assertEqual(
+            list(self.recipe.tags.values_list('name', 'recipe_count')),
+            [('Spicy', 1)],
+        )
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 0)
@@ -0,0 +1,63 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from core.models import ImageBlob
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test files are stored once under the digest of their content"""
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_same_content_stored_once(self):
+        """Test identical uploads share one file named by their digest"""
+        digest = hashlib.sha256(b'photo').hexdigest()
+
+        first = self.storage.save('uploads/a.JPG', ContentFile(b'photo'))
+        second = self.storage.save('uploads/b.jpg', ContentFile(b'photo'))
+        other = self.storage.save('uploads/c.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, f'uploads/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second, first)
+        self.assertNotEqual(other, first)
+        self.assertEqual(self.storage.open(first).read(), b'photo')
+        directory = os.path.join(self.location, 'uploads', digest[:2])
+        self.assertEqual(os.listdir(directory), [f'{digest}.jpg'])
+        # No staging files are left behind
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.location, 'uploads'))),
+            sorted({first.split('/')[1], other.split('/')[1]}),
+        )
+
+    def test_stored_names_registered(self):
+        """Test stored files become unreferenced blobs in grace period"""
+        name = self.storage.save('uploads/a.jpg', ContentFile(b'photo'))
+
+        blob = ImageBlob.objects.get(name=name)
+        self.assertEqual(blob.ref_count, 0)
+        self.assertIsNotNone(blob.released_at)
+
+    def test_references(self):
+        """Test retained blobs are unmarked until the last release"""
+        ImageBlob.objects.touch('a.jpg')
+        ImageBlob.objects.retain('a.jpg')
+        ImageBlob.objects.retain('a.jpg')
+        blob = ImageBlob.objects.get(name='a.jpg')
+        self.assertEqual((blob.ref_count, blob.released_at), (2, None))
+
+        ImageBlob.objects.release('a.jpg')
+        self.assertIsNone(ImageBlob.objects.get(name='a.jpg').released_at)
+        ImageBlob.objects.release('a.jpg')
+        ImageBlob.objects.release('a.jpg')
+        blob = ImageBlob.objects.get(name='a.jpg')
+        self.assertEqual(blob.ref_count, 0)
+        self.assertIsNotNone(blob.released_at)
@@ -0,0 +1,116 @@
+import re
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryCountMixin:
+    """TestCase mixin asserting upper bounds on executed queries"""
+
+    @contextmanager
+    def assertMaxQueries(self, num, using=DEFAULT_DB_ALIAS):
+        """Fail if the block runs more than num queries"""
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+
+        executed = len(context.captured_queries)
+        if executed > num:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}'
+                for i, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(
+                f'{executed} queries executed, at most {num} expected\n'
+                f'Captured queries were:\n{queries}'
+            )
+
+
+class QueryPlanMixin:
+    """TestCase mixin checking the plans of the queries of a request
+
+    Plans depend on table statistics, so seed data and ANALYZE the tables
+    before asserting on them. Test tables are still far smaller than
+    production ones, where reading a whole table or sorting is never
+    cheaper than an index, so plans are made with planner_settings
+    pricing them out. They are still planned when no index can answer.
+    """
+    planner_settings = {'enable_seqscan': 'off', 'enable_sort': 'off'}
+    # Plan nodes meaning every row of a table is read or rows are sorted
+    # after they were fetched instead of read in index order
+    unindexed_nodes = re.compile(
+        r'^(?:\s*->)?\s*(Seq Scan on \w+|(?:Incremental )?Sort(?=  \())',
+        re.M,
+    )
+    # Index condition holding a keyset cursor, a row value comparison or
+    # one on the id alone
+    cursor_condition = re.compile(
+        r'Index Cond: .*(?:ROW\(|\bid [<>] )',
+    )
+
+    @classmethod
+    def analyze(cls, *models, using=DEFAULT_DB_ALIAS):
+        """Refresh the planner statistics of the tables of models"""
+        with connections[using].cursor() as cursor:
+            for model in models:
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+    def explain_request(self, client, url, data=None,
+                        using=DEFAULT_DB_ALIAS):
+        """Return the response of GET url and plans of its SELECTs"""
+        with CaptureQueriesContext(connections[using]) as context:
+            response = client.get(url, data)
+
+        plans = []
+        with connections[using].cursor() as cursor:
+            for name, value in self.planner_settings.items():
+                cursor.execute(f'SET {name} = {value}')
+            try:
+                for query in context.captured_queries:
+                    if query['sql'].startswith('SELECT'):
+                        cursor.execute(f'EXPLAIN {query["sql"]}')
+                        plans.append('\n'.join(row[0] for row in cursor))
+            finally:
+                for name in self.planner_settings:
+                    cursor.execute(f'RESET {name}')
+        return response, plans
+
+    def assertIndexedRequest(self, client, url, data=None,
+                             using=DEFAULT_DB_ALIAS):
+        """Fail if a query of GET url scans a table or sorts, return it"""
+        response, plans = self._explain_indexed(client, url, data, using)
+        return response
+
+    def assertIndexedPages(self, client, url, data=None, pages=4,
+                           using=DEFAULT_DB_ALIAS):
+        """Fail unless the pages of a keyset paginated list are indexed
+
+        Pages after the first must also start their index range at the
+        cursor. Left in a Filter it reads every row before the cursor,
+        making deep pages as slow as offsets.
+        """
+        for page in range(pages):
+            response, plans = self._explain_indexed(client, url, data, using)
+            if page and not self.cursor_condition.search(plans[0]):
+                self.fail(
+                    f'GET {url} does not seek the cursor in the index\n'
+                    f'{plans[0]}'
+                )
+            url, data = response.data['next'], None
+            if url is None and page + 1 < pages:
+                self.fail(f'List ended after {page + 1} of {pages} pages')
+
+    def _explain_indexed(self, client, url, data, using):
+        response, plans = self.explain_request(client, url, data, using)
+        if response.status_code != 200:
+            self.fail(f'GET {url} {data} returned {response.status_code}')
+        if not plans:
+            self.fail(f'GET {url} {data} ran no queries, was it cached?')
+
+        for plan in plans:
+            nodes = self.unindexed_nodes.findall(plan)
+            if nodes:
+                self.fail(
+                    f'GET {url} {data} planned {", ".join(nodes)}\n{plan}'
+                )
+        return response, plans
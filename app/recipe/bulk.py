@@ -0,0 +1,172 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from rest_framework.exceptions import ValidationError
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import SCOPES, response_cache
+from recipe.serializers import RecipeBulkItemSerializer
+from recipe.similarity import similarity_index
+
+# Link field of a bulk item -> (related model, through table column)
+RELATIONS = {
+    'tags': (Tag, 'tag_id'),
+    'ingredients': (Ingredient, 'ingredient_id'),
+}
+
+
+class BulkRecipeWriter:
+    """Validate and write a batch of recipes for a user
+
+    Items carrying an ``id`` update that recipe, the others create new
+    ones. Every referenced recipe, tag and ingredient is resolved with
+    one query per model and the writes are batched in one transaction.
+    ``results`` reports the outcome of each item in request order.
+    """
+
+    def __init__(self, user, items):
+        self.user = user
+        self.items = items
+        self.results = [None] * len(items)
+
+    def save(self):
+        """Write valid items and return per item results"""
+        valid = self._validate()
+        creates = [(i, data) for i, data in valid if 'id' not in data]
+        updates = [(i, data) for i, data in valid if 'id' in data]
+
+        with transaction.atomic():
+            self._create(creates)
+            self._update(updates)
+            touched = [self.results[i]['id'] for i, data in valid]
+            Recipe.objects.filter(pk__in=touched).sync_related()
+
+        if valid:
+            response_cache.invalidate(self.user.pk, SCOPES)
+            similarity_index.changed(self.user.pk, touched)
+        return self.results
+
+    def _error(self, index, errors):
+        self.results[index] = {'status': 'error', 'errors': errors}
+
+    def _validate(self):
+        """Return (index, validated data) of the items that are valid"""
+        # Field setup dominates serializer cost, build it once per kind
+        serializers = {
+            partial: RecipeBulkItemSerializer(partial=partial)
+            for partial in (False, True)
+        }
+        valid = []
+        for index, item in enumerate(self.items):
+            partial = isinstance(item, dict) and 'id' in item
+            try:
+                data = serializers[partial].run_validation(item)
+            except ValidationError as exc:
+                self._error(index, exc.detail)
+            else:
+                valid.append((index, data))
+
+        known = {
+            field: set(model.objects.filter(
+                user=self.user,
+                pk__in={pk for i, data in valid for pk in data.get(field, ())},
+            ).values_list('pk', flat=True))
+            for field, (model, column) in RELATIONS.items()
+        }
+        known['id'] = set(Recipe.objects.filter(
+            user=self.user,
+            pk__in={data['id'] for i, data in valid if 'id' in data},
+        ).values_list('pk', flat=True))
+
+        # Items updating the same recipe would conflict, reject them all
+        repeated = Counter(data['id'] for i, data in valid if 'id' in data)
+
+        checked = []
+        for index, data in valid:
+            errors = {}
+            if 'id' in data and data['id'] not in known['id']:
+                errors['id'] = ['Recipe not found.']
+            elif repeated.get(data.get('id'), 0) > 1:
+                errors['id'] = ['Recipe updated more than once in the batch.']
+            for field in RELATIONS:
+                missing = set(data.get(field, ())) - known[field]
+                if missing:
+                    errors[field] = [
+                        f'Invalid pk "{pk}" - object does not exist.'
+                        for pk in sorted(missing)
+                    ]
+            if errors:
+                self._error(index, errors)
+            else:
+                checked.append((index, data))
+
+        return checked
+
+    def _create(self, creates):
+        recipes = []
+        for index, data in creates:
+            fields = dict(data)
+            links = {field: fields.pop(field, []) for field in RELATIONS}
+            recipes.append(Recipe(
+                user=self.user,
+                tag_ids=sorted(set(links['tags'])),
+                ingredient_ids=sorted(set(links['ingredients'])),
+                **fields
+            ))
+        Recipe.objects.bulk_create(
+            recipes,
+            batch_size=settings.RECIPE_API_BULK_BATCH_SIZE,
+        )
+
+        for (index, data), recipe in zip(creates, recipes):
+            self.results[index] = {'status': 'created', 'id': recipe.pk}
+        self._link(
+            [(recipe.pk, data) for (index, data), recipe
+             in zip(creates, recipes)]
+        )
+
+    def _update(self, updates):
+        for index, data in updates:
+            fields = {
+                name: value for name, value in data.items()
+                if name not in RELATIONS and name != 'id'
+            }
+            if fields:
+                Recipe.objects.filter(pk=data['id']).update(**fields)
+            self.results[index] = {'status': 'updated', 'id': data['id']}
+
+        for field, (model, column) in RELATIONS.items():
+            relinked = [data['id'] for i, data in updates if field in data]
+            if relinked:
+                # Locked so no link is added or removed between counting
+                # the old links and deleting them
+                list(Recipe.objects.select_for_update().filter(
+                    pk__in=relinked,
+                ).order_by('pk').values_list('pk'))
+                links = getattr(Recipe, field).through.objects.filter(
+                    recipe_id__in=relinked,
+                ).select_for_update()
+                old = Counter(links.values_list(column, flat=True))
+                model.objects.add_recipe_counts(
+                    {pk: -count for pk, count in old.items()}
+                )
+                links.delete()
+        self._link([(data['id'], data) for index, data in updates])
+
+    def _link(self, recipes):
+        """Insert through table rows of (recipe id, item data) pairs"""
+        for field, (model, column) in RELATIONS.items():
+            through = getattr(Recipe, field).through
+            links = through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id, **{column: pk})
+                    for recipe_id, data in recipes
+                    for pk in sorted(set(data.get(field, ())))
+                ],
+                batch_size=settings.RECIPE_API_BULK_BATCH_SIZE,
+            )
+            model.objects.add_recipe_counts(
+                Counter(getattr(link, column) for link in links)
+            )
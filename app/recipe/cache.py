@@ -0,0 +1,210 @@
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.http import parse_etags
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import SharedCache, VersionCounter, build_cache
+
+# Cached list endpoints, a write to one of them may change the others
+SCOPES = ('recipes', 'tags', 'ingredients')
+# Query parameters holding comma separated sets where order is irrelevant
+UNORDERED_PARAMS = ('tags', 'ingredients', 'fields', 'exclude')
+
+
+class ResponseCache:
+    """Per user cache of serialized list responses
+
+    Entries are keyed by user, endpoint and normalized query parameters
+    plus a per user/endpoint version. Bumping the version invalidates
+    every cached page of that endpoint for the user at once.
+    """
+
+    def __init__(self, backend, enabled=True, validators=True):
+        self.backend = backend
+        self.versions = VersionCounter(backend, 'recipe-api:version')
+        self.enabled = enabled
+        self.validators = validators
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, event, scope):
+        with self._lock:
+            self.counts[(event, scope)] += 1
+
+    def get_version(self, user_id, scope):
+        """Return current version of the user's endpoint"""
+        return self.versions.get(user_id, scope)
+
+    def bump(self, user_id, scope):
+        """Invalidate every cached response of the user's endpoint"""
+        self.versions.bump(user_id, scope)
+        self._count('invalidations', scope)
+
+    def invalidate(self, user_id, scopes):
+        """Bump versions now and again once the transaction commits
+
+        The second bump drops responses cached by readers that ran
+        between the write and the commit and so still saw old data.
+        Versions are kept even with caching disabled, ETags use them.
+        """
+        for scope in scopes:
+            self.bump(user_id, scope)
+
+        def bump_on_commit():
+            for scope in scopes:
+                self.bump(user_id, scope)
+
+        transaction.on_commit(bump_on_commit)
+
+    def make_key(self, request, scope):
+        """Return cache key of a list request"""
+        params = []
+        for name in sorted(request.query_params):
+            values = request.query_params.getlist(name)
+            if name in UNORDERED_PARAMS:
+                values = sorted(
+                    value.strip()
+                    for value in ','.join(values).split(',')
+                )
+            params.append((name, values))
+        digest = hashlib.sha1(repr((
+            request.scheme, request.get_host(), request.path, params,
+        )).encode('utf-8')).hexdigest()
+        version = self.get_version(request.user.pk, scope)
+
+        return f'recipe-api:{request.user.pk}:{scope}:{version}:{digest}'
+
+    def get(self, key, scope):
+        data = self.backend.get(key)
+        self._count('hits' if data is not None else 'misses', scope)
+        return data
+
+    def set(self, key, data):
+        self.backend.set(key, data)
+
+    def stats(self):
+        """Return counters per endpoint"""
+        with self._lock:
+            counts = dict(self.counts)
+        stats = {
+            scope: {
+                event: counts.get((event, scope), 0)
+                for event in ('hits', 'misses', 'invalidations')
+            }
+            for scope in SCOPES
+        }
+        stats['evictions'] = getattr(self.backend, 'evictions', None)
+        return stats
+
+
+def _build_response_cache():
+    config = settings.RECIPE_API_CACHE
+    enabled = config.get('BACKEND', 'local') != 'none'
+    if not enabled and settings.DEFAULT_CACHE_BACKEND == 'shared':
+        # Responses are not cached but ETags still need the versions
+        config = {**config, 'BACKEND': 'shared'}
+    backend = build_cache(config)
+    # A version bumped by one process must change the ETags of all
+    return ResponseCache(
+        backend,
+        enabled=enabled,
+        validators=(
+            isinstance(backend, SharedCache) or settings.WEB_CONCURRENCY == 1
+        ),
+    )
+
+
+response_cache = _build_response_cache()
+
+
+class ResponseKeyMixin:
+    """Versioned key of the response to the current request"""
+    cache_scope = None
+
+    def get_response_key(self):
+        if getattr(self, '_response_key', None) is None:
+            self._response_key = response_cache.make_key(
+                self.request, self.cache_scope,
+            )
+        return self._response_key
+
+
+class CachedListMixin(ResponseKeyMixin):
+    """Serve list responses of a viewset from the response cache"""
+
+    def list(self, request, *args, **kwargs):
+        if not response_cache.enabled:
+            return super().list(request, *args, **kwargs)
+
+        key = self.get_response_key()
+        data = response_cache.get(key, self.cache_scope)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache.set(key, response.data)
+        return response
+
+
+class ConditionalGetMixin(ResponseKeyMixin):
+    """Answer requests of the viewset actions below with ETags
+
+    The ETag is derived from the versioned response key and the
+    rendered media type, so If-None-Match is checked without touching
+    the database and a 304 skips the queryset and the serializers.
+    Without versions every process sees no ETags are sent, a process
+    missing a write would answer 304 for a changed resource.
+    """
+
+    def get_etag(self):
+        digest = hashlib.sha1(repr((
+            self.get_response_key(), self.request.accepted_media_type,
+        )).encode('utf-8')).hexdigest()
+        return f'"{digest}"'
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        if not response_cache.validators:
+            return handler(request, *args, **kwargs)
+        etag = self.get_etag()
+        if _etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    """Answer list requests with ETags"""
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    """Answer retrieve requests with ETags
+
+    Only for viewsets with a retrieve action, the router routes detail
+    URLs to any viewset having a retrieve attribute.
+    """
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+
+def _etag_matches(etag, if_none_match):
+    """Weak comparison of an ETag against an If-None-Match header"""
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in (
+        tag[2:] if tag.startswith('W/') else tag for tag in etags
+    )
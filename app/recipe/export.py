@@ -0,0 +1,131 @@
+import csv
+import io
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.models import Tag, Ingredient
+
+# Recipe columns of every exported record, tags and ingredients follow
+FIELDS = ('id', 'title', 'time_minutes', 'price', 'link')
+# Separator of the names listed in a CSV cell
+NAME_SEPARATOR = ';'
+
+
+class RecipeExporter:
+    """Stream a recipe queryset as NDJSON or CSV
+
+    Recipes are read through a server side cursor chunk_size rows at a
+    time and the tags and ingredients of a chunk are looked up from
+    its id arrays with one query per model, so memory use is bounded
+    by the chunk size instead of the library size. NDJSON records
+    carry the {id, name} of tags and ingredients, CSV cells list their
+    names with join_names.
+    """
+    content_types = {
+        'ndjson': 'application/x-ndjson',
+        'csv': 'text/csv; charset=utf-8',
+    }
+
+    def __init__(self, queryset, chunk_size=None):
+        self.queryset = queryset.order_by('id')
+        self.chunk_size = chunk_size or settings.RECIPE_API_EXPORT_CHUNK_SIZE
+
+    def stream(self, export_format):
+        """Return iterator over the encoded export, one item per chunk"""
+        return getattr(self, f'_{export_format}')()
+
+    def chunks(self):
+        """Yield lists of export records in id order"""
+        rows = self.queryset.values_list(
+            *FIELDS, 'tag_ids', 'ingredient_ids',
+        ).iterator(chunk_size=self.chunk_size)
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.chunk_size:
+                yield self._records(chunk)
+                chunk = []
+        if chunk:
+            yield self._records(chunk)
+
+    def _records(self, chunk):
+        tags = self._names(Tag, chunk, -2)
+        ingredients = self._names(Ingredient, chunk, -1)
+        records = []
+        for *values, tag_ids, ingredient_ids in chunk:
+            record = dict(zip(FIELDS, values))
+            record['tags'] = self._related(tag_ids, tags)
+            record['ingredients'] = self._related(ingredient_ids, ingredients)
+            records.append(record)
+
+        return records
+
+    def _names(self, model, chunk, column):
+        """Return id -> name of the rows referenced by a chunk column"""
+        ids = {pk for row in chunk for pk in row[column]}
+        if not ids:
+            return {}
+
+        return dict(
+            model.objects.using(self.queryset.db)
+            .filter(id__in=ids)
+            .values_list('id', 'name')
+        )
+
+    def _related(self, ids, names):
+        return [
+            {'id': pk, 'name': names[pk]}
+            for pk in sorted(ids) if pk in names
+        ]
+
+    def _ndjson(self):
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        for records in self.chunks():
+            yield ''.join(
+                encoder.encode(record) + '\n' for record in records
+            ).encode()
+
+    def _csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FIELDS + ('tags', 'ingredients'))
+        # The header goes out before the first query returns
+        yield self._drain(buffer)
+        for records in self.chunks():
+            writer.writerows(
+                [record[field] for field in FIELDS] + [
+                    join_names(item['name'] for item in record['tags']),
+                    join_names(
+                        item['name'] for item in record['ingredients']
+                    ),
+                ]
+                for record in records
+            )
+            yield self._drain(buffer)
+
+    def _drain(self, buffer):
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data.encode()
+
+
+def join_names(names):
+    """Return CSV cell listing names separated by NAME_SEPARATOR
+
+    Names holding the separator or quotes are quoted like CSV fields, so
+    split_names returns them whole.
+    """
+    buffer = io.StringIO()
+    csv.writer(
+        buffer, delimiter=NAME_SEPARATOR, lineterminator='',
+    ).writerow(names)
+    return buffer.getvalue()
+
+
+def split_names(cell):
+    """Return the names listed in a CSV cell by join_names"""
+    if not cell:
+        return []
+    return next(csv.reader([cell], delimiter=NAME_SEPARATOR))
@@ -0,0 +1,105 @@
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework.exceptions import ValidationError
+
+# Query parameters naming serializer fields to keep and to leave out
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+class SparseFieldsetMixin:
+    """Let list and retrieve requests pick fields with ?fields=/?exclude=
+
+    Both parameters take comma separated serializer field names. Fields
+    left out are dropped from the serializer and their columns are
+    deferred with only(), views skip prefetches of omitted relations
+    by checking wants_field().
+    """
+    fieldset_actions = ('list', 'retrieve')
+
+    def get_fieldset(self):
+        """Return names of the requested serializer fields, None for all"""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = self._parse_fieldset()
+        return self._fieldset
+
+    def wants_field(self, name):
+        """Return if the response includes the serializer field"""
+        fieldset = self.get_fieldset()
+        return fieldset is None or name in fieldset
+
+    def _parse_fieldset(self):
+        if self.action not in self.fieldset_actions:
+            return None
+        params = {
+            param: _names(self.request.query_params.get(param))
+            for param in (FIELDS_PARAM, EXCLUDE_PARAM)
+        }
+        if not any(params.values()):
+            return None
+
+        available = list(self._serializer_fields())
+        errors = {
+            param: [f'Unknown field: {name}' for name in names
+                    if name not in available]
+            for param, names in params.items()
+        }
+        errors = {param: messages for param, messages in errors.items()
+                  if messages}
+        if errors:
+            raise ValidationError(errors)
+
+        selected = params[FIELDS_PARAM] or available
+        return tuple(
+            name for name in available
+            if name in selected and name not in params[EXCLUDE_PARAM]
+        )
+
+    def _serializer_fields(self):
+        if not hasattr(self, '_all_serializer_fields'):
+            self._all_serializer_fields = self.get_serializer_class()().fields
+        return self._all_serializer_fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in fieldset:
+                    target.fields.pop(name)
+
+        return serializer
+
+    def trim_queryset(self, queryset):
+        """Load only the columns of the requested fields and ordering"""
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return queryset
+
+        fields = self._serializer_fields()
+        names = [fields[name].source for name in fieldset]
+        paginator = self.paginator
+        if paginator is not None and hasattr(paginator, 'get_ordering'):
+            names += [
+                field.lstrip('-') for field in
+                paginator.get_ordering(self.request, queryset, self)
+            ]
+        columns = set()
+        for name in names:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Annotations and properties load nothing themselves
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(field.name)
+
+        return queryset.only('pk', *sorted(columns))
+
+
+def _names(value):
+    """Return field names of a comma separated parameter value"""
+    if not value:
+        return []
+    return [name.strip() for name in value.split(',') if name.strip()]
@@ -0,0 +1,227 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import ImageBlob, Recipe
+from core.storage import image_storage
+
+logger = logging.getLogger(__name__)
+
+# Bounding boxes of the resized copies generated for every recipe image
+VARIANTS = (
+    ('thumbnail', (150, 150)),
+    ('medium', (600, 600)),
+    ('large', (1200, 1200)),
+)
+
+_executor = None
+_store_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_variants(data):
+    """Return JPEG encoded variants of image data keyed by variant name
+
+    Runs in a worker process so it must only depend on its arguments.
+    """
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    variants = {}
+    for name, size in VARIANTS:
+        variant = image.copy()
+        variant.thumbnail(size, Image.LANCZOS)
+        out = io.BytesIO()
+        variant.save(out, format='JPEG', quality=85, optimize=True)
+        variants[name] = out.getvalue()
+
+    return variants
+
+
+def variant_path(image_name, variant):
+    """Return storage path of a variant of the stored image
+
+    Images are named by content, so recipes sharing an image share its
+    variants too.
+    """
+    directory, filename = os.path.split(image_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f'{stem}_{variant}.jpg')
+
+
+def stored_variants(image_name):
+    """Return paths of the variants of an image if all were rendered"""
+    paths = {name: variant_path(image_name, name) for name, size in VARIANTS}
+    if all(default_storage.exists(path) for path in paths.values()):
+        return paths
+    return None
+
+
+def get_executor():
+    """Return the process pool resizing images, creating it on first use
+
+    Servers create it with start_workers() before handling requests.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+            )
+        return _executor
+
+
+def get_store_executor():
+    """Return the threads storing rendered variants"""
+    global _store_executor
+    with _executor_lock:
+        if _store_executor is None:
+            _store_executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+        return _store_executor
+
+
+def start_workers():
+    """Start the image worker processes and storing threads
+
+    Called once when a server process starts, before it runs request
+    threads: forking the workers from a request thread would copy locks
+    other threads hold.
+    """
+    if settings.RECIPE_IMAGE_PROCESSING == 'sync':
+        return
+    get_executor().submit(int).result()
+    get_store_executor()
+
+
+def schedule_variants(recipe):
+    """Generate variants of the recipe image outside of the request
+
+    In 'sync' mode (used by tests) the variants are rendered inline.
+    Otherwise rendering is queued on the process pool once the upload
+    is committed.
+    """
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    paths = stored_variants(image_name)
+    if paths is not None:
+        # The same content was uploaded and processed before
+        _mark_processed(recipe_id, image_name, paths)
+        return
+
+    if settings.RECIPE_IMAGE_PROCESSING == 'sync':
+        try:
+            variants = _render_file(image_name)
+        except Exception:
+            logger.exception('Could not resize recipe image %s', image_name)
+            variants = None
+        _store_result(recipe_id, image_name, variants)
+        return
+
+    def submit():
+        future = get_executor().submit(_render_file, image_name)
+        future.add_done_callback(
+            lambda future: get_store_executor().submit(
+                _finish, recipe_id, image_name, future,
+            )
+        )
+
+    transaction.on_commit(submit)
+
+
+def _render_file(image_name):
+    """Worker process entry point"""
+    with default_storage.open(image_name) as image_file:
+        return render_variants(image_file.read())
+
+
+def _finish(recipe_id, image_name, future):
+    """Store result of a worker, runs on a storing thread
+
+    Not on the result handling thread of the process pool, where a slow
+    write would hold back the results of every other worker.
+    """
+    try:
+        variants = future.result()
+    except Exception:
+        logger.exception('Could not resize recipe image %s', image_name)
+        variants = None
+
+    try:
+        _store_result(recipe_id, image_name, variants)
+    finally:
+        connection.close()
+
+
+def _store_result(recipe_id, image_name, variants):
+    """Save rendered variants and mark the recipe image as processed"""
+    if not Recipe.objects.filter(pk=recipe_id, image=image_name).exists():
+        # The recipe was deleted or got a newer image meanwhile
+        return
+
+    paths = {}
+    for name, data in (variants or {}).items():
+        path = variant_path(image_name, name)
+        # Another recipe with the same image may have stored it already
+        if not default_storage.exists(path):
+            path = default_storage.save(path, ContentFile(data))
+        paths[name] = path
+
+    _mark_processed(recipe_id, image_name, paths)
+
+
+def _mark_processed(recipe_id, image_name, paths):
+    """Record variant paths of the recipe image, failed if there are none"""
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or recipe.image.name != image_name:
+        # The recipe was deleted or got a newer image meanwhile
+        return
+
+    recipe.image_variants = paths
+    recipe.image_status = (
+        Recipe.IMAGE_READY if paths else Recipe.IMAGE_FAILED
+    )
+    recipe.save(update_fields=['image_variants', 'image_status'])
+
+
+def collect_images(grace, batch_size=500):
+    """Delete image blobs unreferenced for grace seconds, return how many
+
+    Each batch of blobs is locked and its files deleted before the rows
+    are, a concurrent upload of the same content waits for the batch to
+    commit and then stores the file again. Blobs locked by a writer are
+    skipped until the next run.
+    """
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            blobs = list(
+                ImageBlob.objects.select_for_update(skip_locked=True)
+                .filter(ref_count=0, released_at__lt=cutoff)
+                .order_by('pk').values_list('pk', 'name')[:batch_size]
+            )
+            for pk, name in blobs:
+                for variant, size in VARIANTS:
+                    default_storage.delete(variant_path(name, variant))
+                image_storage.delete(name)
+            ImageBlob.objects.filter(pk__in=[pk for pk, name in blobs]) \
+                .delete()
+
+        deleted += len(blobs)
+        if len(blobs) < batch_size:
+            return deleted
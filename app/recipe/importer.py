@@ -0,0 +1,288 @@
+import csv
+import io
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+
+from core.models import SEARCH_CONFIG, Tag, Ingredient, Recipe
+from recipe.export import split_names
+
+FORMATS = ('ndjson', 'csv')
+# 'copy' streams rows with COPY FROM STDIN, 'bulk' uses bulk_create
+METHODS = ('copy', 'bulk')
+# Recipe fields read from a record, the layout written by recipe.export
+FIELDS = ('title', 'time_minutes', 'price', 'link')
+# Record key -> model of the rows named in it
+RELATIONS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def read_records(file, file_format):
+    """Yield the unparsed records of an NDJSON or CSV file
+
+    Parsing is left to import_batch so it can happen in the workers.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+
+    for line in file:
+        if line.strip():
+            yield line
+
+
+def parse_record(raw, file_format):
+    """Return record dictionary of a raw NDJSON line or CSV row"""
+    if file_format == 'csv':
+        record = dict(raw)
+        for key in RELATIONS:
+            record[key] = split_names(record.get(key))
+        return record
+
+    record = json.loads(raw)
+    if not isinstance(record, dict):
+        raise ValidationError('Expected a JSON object.')
+    for key in RELATIONS:
+        # Exports list {id, name} objects, plain names are accepted too
+        record[key] = [
+            item.get('name', '') if isinstance(item, dict) else item
+            for item in record.get(key) or ()
+        ]
+    return record
+
+
+def import_batch(user, number, raws, file_format, method='copy'):
+    """Import one batch, return (number, result) for the progress report
+
+    Runs in the worker processes of a parallel import.
+    """
+    return number, RecipeImporter(user, method).save(raws, file_format)
+
+
+class RecipeImporter:
+    """Load batches of recipe records for a user
+
+    Missing tags and ingredients are created for the whole batch at
+    once. Recipe ids are reserved from the sequence so that recipes,
+    their denormalized id arrays and the through table links can be
+    streamed with COPY (or bulk_create) without reading them back. A
+    batch is imported in one transaction, invalid records are skipped
+    and reported.
+    """
+
+    def __init__(self, user, method='copy'):
+        self.user = user
+        self.method = method
+        self.db = router.db_for_write(Recipe)
+
+    def save(self, raws, file_format):
+        """Import raw records, return counts and errors by record index"""
+        recipes, errors = [], {}
+        for index, raw in enumerate(raws):
+            try:
+                recipes.append(self._clean(parse_record(raw, file_format)))
+            except ValidationError as exc:
+                errors[index] = getattr(exc, 'message_dict', exc.messages)
+            except ValueError as exc:
+                errors[index] = [str(exc)]
+        if not recipes:
+            return {'recipes': 0, 'links': 0, 'errors': errors}
+
+        ids = {
+            key: self._resolve(model, recipes, key)
+            for key, model in RELATIONS.items()
+        }
+        for recipe in recipes:
+            for key in RELATIONS:
+                recipe[f'{key}_ids'] = sorted(
+                    {ids[key][name] for name in recipe[key]}
+                )
+
+        with transaction.atomic(using=self.db):
+            links = getattr(self, f'_{self.method}')(recipes)
+            for key, model in RELATIONS.items():
+                model.objects.using(self.db).add_recipe_counts(Counter(
+                    pk for recipe in recipes for pk in recipe[f'{key}_ids']
+                ))
+
+        return {'recipes': len(recipes), 'links': links, 'errors': errors}
+
+    def _clean(self, record):
+        recipe, errors = {}, {}
+        if record.get('link') is None:
+            record['link'] = ''
+        for name in FIELDS:
+            field = Recipe._meta.get_field(name)
+            try:
+                recipe[name] = field.clean(record.get(name), None)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        for key, model in RELATIONS.items():
+            names = list(dict.fromkeys(
+                name for name in (str(item).strip() for item in record[key])
+                if name
+            ))
+            max_length = model._meta.get_field('name').max_length
+            if any(len(name) > max_length for name in names):
+                errors[key] = [
+                    f'Names have at most {max_length} characters.'
+                ]
+            recipe[key] = names
+        if errors:
+            raise ValidationError(errors)
+
+        return recipe
+
+    def _resolve(self, model, recipes, key):
+        """Return name -> id of the batch's names, creating missing rows"""
+        names = list(dict.fromkeys(
+            name for recipe in recipes for name in recipe[key]
+        ))
+        if not names:
+            return {}
+        found = model.objects.using(self.db).get_or_create_names(
+            self.user, names,
+        )
+        return {name: pk for name, (pk, created) in found.items()}
+
+    def _copy(self, recipes):
+        table = Recipe._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                [table, 'id', len(recipes)],
+            )
+            for recipe, (pk,) in zip(recipes, cursor.fetchall()):
+                recipe['id'] = pk
+
+            # Staged with the names so the search vector is computed on
+            # insert rather than by a second write of every row
+            cursor.execute(
+                'CREATE TEMPORARY TABLE import_recipe ('
+                'id integer, title text, time_minutes integer, '
+                'price numeric, link text, tag_ids integer[], '
+                'ingredient_ids integer[], tag_names text[], '
+                'ingredient_names text[])'
+            )
+            self._copy_rows(cursor, 'import_recipe', (
+                'id', *FIELDS, 'tag_ids', 'ingredient_ids', 'tag_names',
+                'ingredient_names',
+            ), (
+                (
+                    recipe['id'], *(recipe[name] for name in FIELDS),
+                    _array(recipe['tags_ids']),
+                    _array(recipe['ingredients_ids']),
+                    _array(recipe['tags']), _array(recipe['ingredients']),
+                )
+                for recipe in recipes
+            ))
+            cursor.execute(INSERT_STAGED.format(table=table), [
+                self.user.pk, SEARCH_CONFIG, SEARCH_CONFIG, SEARCH_CONFIG,
+            ])
+            cursor.execute('DROP TABLE import_recipe')
+
+            links = 0
+            for key in RELATIONS:
+                through, column = _through(key)
+                rows = [
+                    (recipe['id'], pk)
+                    for recipe in recipes for pk in recipe[f'{key}_ids']
+                ]
+                self._copy_rows(
+                    cursor, through._meta.db_table, ('recipe_id', column),
+                    rows,
+                )
+                links += len(rows)
+
+        return links
+
+    def _copy_rows(self, cursor, table, columns, rows):
+        buffer = io.StringIO()
+        # Quoted empty strings stay '', only None becomes NULL
+        csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(columns)}) FROM STDIN '
+            f'WITH (FORMAT csv)',
+            buffer,
+        )
+
+    def _bulk(self, recipes):
+        objs = Recipe.objects.using(self.db).bulk_create(
+            [
+                Recipe(
+                    user=self.user,
+                    tag_ids=recipe['tags_ids'],
+                    ingredient_ids=recipe['ingredients_ids'],
+                    **{name: recipe[name] for name in FIELDS}
+                )
+                for recipe in recipes
+            ],
+            batch_size=settings.RECIPE_API_BULK_BATCH_SIZE,
+        )
+
+        links = 0
+        for recipe, obj in zip(recipes, objs):
+            recipe['id'] = obj.pk
+        for key in RELATIONS:
+            through, column = _through(key)
+            rows = through.objects.using(self.db).bulk_create(
+                [
+                    through(recipe_id=recipe['id'], **{column: pk})
+                    for recipe in recipes for pk in recipe[f'{key}_ids']
+                ],
+                batch_size=settings.RECIPE_API_BULK_BATCH_SIZE,
+            )
+            links += len(rows)
+        Recipe.objects.using(self.db).filter(
+            pk__in=[recipe['id'] for recipe in recipes],
+        ).update_search_vector()
+
+        return links
+
+
+# Moves staged rows into the recipe table, the search vector matches
+# the one RecipeQuerySet.update_search_vector() builds
+INSERT_STAGED = """
+    INSERT INTO {table} (
+        id, user_id, title, time_minutes, price, link, image_status,
+        image_variants, tag_ids, ingredient_ids, search_vector
+    )
+    SELECT
+        id, %s, title, time_minutes, price, link, '', '{{}}', tag_ids,
+        ingredient_ids,
+        setweight(to_tsvector(%s::regconfig, COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector(%s::regconfig,
+            ARRAY_TO_STRING(ARRAY(
+                SELECT name FROM unnest(tag_names) name ORDER BY name
+            ), ' ') || ' ' ||
+            ARRAY_TO_STRING(ARRAY(
+                SELECT name FROM unnest(ingredient_names) name ORDER BY name
+            ), ' ')
+        ), 'B') ||
+        setweight(to_tsvector(%s::regconfig, COALESCE(link, '')), 'C')
+    FROM import_recipe
+"""
+
+
+def _through(key):
+    """Return through model of a relation and its tag/ingredient column"""
+    through = getattr(Recipe, key).through
+    field = through._meta.get_field(RELATIONS[key]._meta.model_name)
+    return through, field.column
+
+
+def _array(values):
+    """Return PostgreSQL array literal of integers or strings"""
+    return '{' + ','.join(
+        str(value) if isinstance(value, int) else _quote(value)
+        for value in values
+    ) + '}'
+
+
+def _quote(text):
+    escaped = text.replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
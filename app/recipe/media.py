@@ -0,0 +1,197 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.models import Recipe
+from core.storage import CONTENT_ADDRESSED_NAME, image_storage
+from user.authentication import CachedTokenAuthentication
+
+# "<stem>_<variant>.jpg" files in a "variants" directory, see variant_path
+VARIANT_NAME = re.compile(r'^.+_(?P<variant>[a-z]+)\.jpg$')
+RANGE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+
+class FileRange:
+    """Read only file object limited to length bytes from start
+
+    Servers sending wsgi.file_wrapper responses with sendfile() start
+    at the current offset of fileno() and stop after Content-Length
+    bytes, the others read() until it returns nothing.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+class IgnoreAcceptNegotiation(BaseContentNegotiation):
+    """Negotiation ignoring Accept, images are requested with image/*"""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class MediaView(APIView):
+    """Serve recipe images and their variants to owners of the recipes
+
+    After the ownership check the transfer is handed to the front proxy
+    with X-Accel-Redirect ('accel', nginx) or X-Sendfile ('sendfile')
+    as set by MEDIA_SERVE. With 'django' the file is streamed by a
+    FileResponse answering Range and conditional requests itself.
+    """
+    authentication_classes = (
+        CachedTokenAuthentication, SessionAuthentication,
+    )
+    permission_classes = (IsAuthenticated,)
+    content_negotiation_class = IgnoreAcceptNegotiation
+    read_from_replica = True
+
+    def get(self, request, path):
+        try:
+            full_path = image_storage.path(path)
+        except SuspiciousFileOperation:
+            raise NotFound()
+        if not self.is_owner(request.user, path):
+            # Not 403, it would tell other users the file exists
+            raise NotFound()
+
+        serve = settings.MEDIA_SERVE
+        if serve == 'accel':
+            response = HttpResponse(content_type=_content_type(path))
+            response['X-Accel-Redirect'] = quote(
+                settings.MEDIA_ACCEL_LOCATION + path
+            )
+        elif serve == 'sendfile':
+            response = HttpResponse(content_type=_content_type(path))
+            response['X-Sendfile'] = full_path
+        else:
+            response = file_response(request, path, full_path)
+
+        response['Cache-Control'] = (
+            settings.MEDIA_IMMUTABLE_CACHE_CONTROL
+            if CONTENT_ADDRESSED_NAME.search(path) else 'private, no-cache'
+        )
+        return response
+
+    def is_owner(self, user, path):
+        """Return if the user has a recipe using the image or variant"""
+        query = Q(image=path)
+        directory, filename = posixpath.split(path)
+        match = VARIANT_NAME.match(filename)
+        if match and posixpath.basename(directory) == 'variants':
+            query |= Q(image_variants__contains={match['variant']: path})
+
+        return Recipe.objects.filter(query, user=user).exists()
+
+
+def file_response(request, name, full_path):
+    """Return a FileResponse of the file, partial or not modified
+
+    Handles If-None-Match/If-Modified-Since and a single byte Range,
+    honouring If-Range. Multiple ranges are answered with the whole
+    file, which RFC 7233 allows.
+    """
+    try:
+        stat = os.stat(full_path)
+    except FileNotFoundError:
+        raise NotFound()
+    size = stat.st_size
+    stem = os.path.splitext(posixpath.basename(name))[0]
+    etag = quote_etag(
+        stem if CONTENT_ADDRESSED_NAME.search(name)
+        else f'{stat.st_mtime_ns:x}-{size:x}'
+    )
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified,
+    )
+    if response is None:
+        byte_range = _byte_range(request, etag, last_modified, size)
+        if byte_range is None:
+            start, length, status = 0, size, 200
+        elif byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        else:
+            start, end = byte_range
+            length, status = end - start + 1, 206
+
+        response = FileResponse(
+            FileRange(open(full_path, 'rb'), start, length),
+            status=status,
+            content_type=_content_type(name),
+        )
+        response['Content-Length'] = length
+        if status == 206:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _byte_range(request, etag, last_modified, size):
+    """Return (first, last) byte requested, None for all, False if invalid
+
+    Only a single satisfiable range is served partially.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = RANGE.match(header.strip())
+    if not match or not (match['start'] or match['end']):
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and \
+            parse_http_date_safe(if_range) != last_modified:
+        return None
+
+    if match['start']:
+        start = int(match['start'])
+        end = min(int(match['end'] or size - 1), size - 1)
+    else:
+        # "bytes=-N" asks for the last N bytes
+        start, end = max(size - int(match['end']), 0), size - 1
+    if start > end or start >= size:
+        return False
+
+    return start, end
+
+
+def _content_type(name):
+    content_type, encoding = mimetypes.guess_type(name)
+    return content_type or 'application/octet-stream'
@@ -0,0 +1,246 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Field, Func, Q, Value
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Opaque cursor pagination seeking on the ordering columns
+
+    Unlike offset pagination the cost of a page does not grow with its
+    depth: the cursor stores the ordering values of the row at the page
+    edge and the next page is fetched with a ``WHERE`` on those values.
+    The ordering must be unique, so it should always end with ``id``.
+    """
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = _('Invalid cursor')
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering used to seek through the queryset"""
+        if hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering())
+
+        return self.ordering
+
+    def get_page_size(self, request):
+        """Return requested page size capped at the maximum"""
+        max_page_size = settings.RECIPE_API_MAX_PAGE_SIZE
+        try:
+            return positive_int(
+                request.query_params[self.page_size_query_param],
+                cutoff=max_page_size,
+            )
+        except (KeyError, ValueError):
+            return min(settings.RECIPE_API_PAGE_SIZE, max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        reverse, position = self.decode_cursor(request, queryset)
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(_invert(field) for field in ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = _seek(queryset, ordering, position)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self.page[0])
+
+    def decode_cursor(self, request, queryset):
+        """Return (reverse, position) from the cursor query parameter
+
+        Values of the position are converted to the types of the ordering
+        fields of queryset, a cursor not matching them is invalid.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+
+        try:
+            payload = json.loads(
+                urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            )
+            reverse = bool(payload['r'])
+            position = list(payload['p'])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            position = [
+                _to_python(_field(queryset, field.lstrip('-')), value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def encode_cursor(self, reverse, instance):
+        """Return a url pointing at the page next to the given row"""
+        position = [
+            _attr(instance, field.lstrip('-')) for field in self.ordering
+        ]
+        payload = json.dumps({'r': int(reverse), 'p': position})
+        encoded = urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+
+class RecipePagination(KeysetPagination):
+    """Keyset pagination for recipes"""
+    ordering = ('id',)
+
+
+class RecipeAttrPagination(KeysetPagination):
+    """Keyset pagination for tags and ingredients"""
+    ordering = ('-name', '-id')
+
+
+class Row(Func):
+    """Row value ``ROW(a, b, ...)``, compared to another column by column"""
+    function = 'ROW'
+    output_field = Field()
+
+
+def positive_int(value, cutoff=None):
+    """Return value as an integer above zero, at most cutoff
+
+    Raises ValueError for anything else.
+    """
+    value = int(value)
+    if value <= 0:
+        raise ValueError(value)
+    if cutoff:
+        return min(value, cutoff)
+    return value
+
+
+def _invert(field):
+    """Return the ordering expression sorting the other way round"""
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _attr(instance, field):
+    """Return JSON friendly value of a field used in the cursor"""
+    if isinstance(instance, dict):
+        value = instance[field]
+    else:
+        value = getattr(instance, field)
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    return str(value)
+
+
+def _seek(queryset, ordering, position):
+    """Return the rows of queryset strictly after position in ordering
+
+    Columns sorted the same way are compared as one row value, which
+    PostgreSQL uses as the start of an index range. A condition like
+    ``a < x OR (a = x AND id < y)`` is not, so otherwise the first column
+    also gets the redundant bound ``a <= x`` limiting the range read.
+    """
+    descending = {field.startswith('-') for field in ordering}
+    columns = _columns(queryset.model, ordering)
+    if len(ordering) > 1 and len(descending) == 1 and columns and \
+            None not in position:
+        lookup = 'lt' if descending.pop() else 'gt'
+        return queryset.annotate(
+            keyset_row=Row(*(F(field.name) for field in columns)),
+        ).filter(**{f'keyset_row__{lookup}': Row(*(
+            Value(value, output_field=field)
+            for field, value in zip(columns, position)
+        ))})
+
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    if len(ordering) > 1 and position[0] is not None:
+        name = ordering[0].lstrip('-')
+        lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+        condition &= Q(**{f'{name}__{lookup}': position[0]})
+
+    return queryset.filter(condition)
+
+
+def _field(queryset, name):
+    """Return the model field or annotation output field called name"""
+    try:
+        return queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return queryset.query.annotations[name].output_field
+
+
+def _to_python(field, value):
+    """Return the cursor value converted to the type of field"""
+    if value is None:
+        if not field.null:
+            raise ValueError('Null cursor value of a not null field')
+        return None
+    return field.to_python(value)
+
+
+def _columns(model, ordering):
+    """Return model fields of the ordering, None if one is not a column"""
+    columns = []
+    for field in ordering:
+        try:
+            column = model._meta.get_field(field.lstrip('-'))
+        except FieldDoesNotExist:
+            return None
+        if not column.concrete or column.many_to_many:
+            return None
+        columns.append(column)
+
+    return columns
@@ -1,9 +1,50 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+
 from rest_framework import serializers
 
 from core.models import Tag, Ingredient, Recipe
 
 
-class TagSerializer(serializers.ModelSerializer):
+class UniqueNameMixin:
+    """Reject names the requesting user already has"""
+
+    def validate_name(self, value):
+        request = self.context.get('request')
+        if request is None:
+            return value
+        existing = self.Meta.model.objects.filter(
+            user=request.user, name=value,
+        )
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError(
+                f'{self.Meta.model._meta.verbose_name.capitalize()} '
+                f'with this name already exists.'
+            )
+
+        return value
+
+
+class NamesSerializer(serializers.Serializer):
+    """Serializer for a batch of tag or ingredient names"""
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+    )
+
+    def validate_names(self, value):
+        max_size = settings.RECIPE_API_MAX_BULK_SIZE
+        if len(value) > max_size:
+            raise serializers.ValidationError(
+                f'At most {max_size} names can be written at once.'
+            )
+
+        return value
+
+
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for tag object"""
 
     class Meta:
@@ -12,7 +53,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_Fields = ('id',)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """Serializer for ingredient object"""
 
     class Meta:
@@ -21,6 +62,39 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_Fileds = ('id',)
 
 
+class CountedTagSerializer(TagSerializer):
+    """Serializer for tag object with the number of its recipes"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('recipe_count',)
+
+
+class CountedIngredientSerializer(IngredientSerializer):
+    """Serializer for ingredient object with the number of its recipes"""
+    recipe_count = serializers.IntegerField(read_only=True)
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('recipe_count',)
+
+
+class ImageVariantsField(serializers.Field):
+    """Read only map of image variant name to its url"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for name, path in value.items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+
+        return urls
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipe"""
     ingredients = serializers.PrimaryKeyRelatedField(
@@ -31,16 +105,41 @@ class RecipeSerializer(serializers.ModelSerializer):
         many=True,
         queryset=Tag.objects.all(),
     )
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'title', 'ingredients', 'tags', 'time_minutes',
-            'price', 'link'
+            'price', 'link', 'image_status', 'image_variants',
             )
         read_only_Fields = ('id')
 
 
+class RecipeBulkItemSerializer(serializers.ModelSerializer):
+    """Serializer validating one item of a bulk write
+
+    Tags and ingredients are plain ids here, they are resolved for the
+    whole batch at once instead of one query per item.
+    """
+    id = serializers.IntegerField(required=False)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+    )
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+    )
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'title', 'ingredients', 'tags', 'time_minutes',
+            'price', 'link',
+        )
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail"""
     ingredients = IngredientSerializer(many=True, read_only=True)
@@ -49,8 +148,27 @@ class RecipeDetailSerializer(RecipeSerializer):
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     "Serializer for recipe image"""
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'image_status', 'image_variants')
         read_only_Fields = ('id')
+
+    def update(self, instance, validated_data):
+        """Store the upload and leave resizing to the image workers"""
+        validated_data['image_status'] = Recipe.IMAGE_PENDING
+        validated_data['image_variants'] = {}
+        return super().update(instance, validated_data)
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Serializer for the price and time range of recipe lists"""
+    min_price = serializers.DecimalField(
+        max_digits=None, decimal_places=None, min_value=0, required=False,
+    )
+    max_price = serializers.DecimalField(
+        max_digits=None, decimal_places=None, min_value=0, required=False,
+    )
+    min_time = serializers.IntegerField(min_value=0, required=False)
+    max_time = serializers.IntegerField(min_value=0, required=False)
@@ -0,0 +1,89 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Tag, Ingredient, Recipe
+from recipe.cache import response_cache
+from recipe.similarity import similarity_index
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, **kwargs):
+    """Drop cached recipe lists of the owner"""
+    response_cache.invalidate(instance.user_id, ('recipes',))
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    """Drop cached lists, tags/ingredients may no longer be assigned"""
+    response_cache.invalidate(
+        instance.user_id,
+        ('recipes', 'tags', 'ingredients'),
+    )
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag(sender, instance, **kwargs):
+    """Drop cached tags and recipes filtered or searched by tag"""
+    response_cache.invalidate(instance.user_id, ('tags', 'recipes'))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient(sender, instance, **kwargs):
+    """Drop cached ingredients and recipes filtered by ingredient"""
+    response_cache.invalidate(instance.user_id, ('ingredients', 'recipes'))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, instance, action, **kwargs):
+    """Drop cached recipes and tags assignment after relinking"""
+    if action.startswith('post_'):
+        response_cache.invalidate(instance.user_id, ('recipes', 'tags'))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_ingredients(sender, instance, action, **kwargs):
+    """Drop cached recipes and ingredients assignment after relinking"""
+    if action.startswith('post_'):
+        response_cache.invalidate(
+            instance.user_id,
+            ('recipes', 'ingredients'),
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def index_saved_recipe(sender, instance, created, raw=False, **kwargs):
+    """Add new recipes to the similarity index"""
+    if created and not raw:
+        similarity_index.changed(instance.user_id, [instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_deleted_recipe(sender, instance, **kwargs):
+    """Drop deleted recipes from the similarity index"""
+    similarity_index.changed(instance.user_id, [instance.pk])
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def reindex_unlinked_recipes(sender, instance, **kwargs):
+    """Reload similarity of recipes that lost a deleted tag/ingredient"""
+    similarity_index.changed(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def reindex_relinked_recipes(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Update similarity of recipes whose tags or ingredients changed"""
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'post_clear':
+        recipe_ids = None
+    else:
+        recipe_ids = pk_set
+    similarity_index.changed(instance.user_id, recipe_ids)
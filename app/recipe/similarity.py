@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import VersionCounter, build_cache
+from core.models import Recipe
+
+
+def _features(tag_ids, ingredient_ids):
+    """Return feature keys of a recipe, even for tags and odd otherwise"""
+    return np.array(
+        [tag_id * 2 for tag_id in tag_ids] +
+        [ingredient_id * 2 + 1 for ingredient_id in ingredient_ids],
+        dtype=np.int64,
+    )
+
+
+class RecipeSets:
+    """Tag and ingredient sets of the recipes of one user
+
+    Recipes are rows and every tag or ingredient has a posting array of
+    the rows having it. The recipes sharing features with one recipe
+    are counted with a bincount of its few postings, so a query costs
+    the length of those postings rather than the size of the library.
+    Deleted recipes leave an empty row behind.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.rows = {}
+        recipe_ids, features = [], []
+        for recipe_id, tag_ids, ingredient_ids in rows:
+            self.rows[recipe_id] = len(recipe_ids)
+            recipe_ids.append(recipe_id)
+            features.append(_features(tag_ids, ingredient_ids))
+        self.recipe_ids = np.array(recipe_ids, dtype=np.int64)
+        self.features = features
+        self.sizes = np.array([len(keys) for keys in features], np.int64)
+
+        keys = np.concatenate(features) if features else np.empty(0, int)
+        owners = np.repeat(np.arange(len(features)), self.sizes)
+        order = np.argsort(keys, kind='stable')
+        keys, owners = keys[order], owners[order]
+        unique, starts = np.unique(keys, return_index=True)
+        self.postings = dict(zip(
+            unique.tolist(), np.split(owners, starts[1:]),
+        ))
+
+    @classmethod
+    def load(cls, user_id, version=None):
+        """Return the sets of the user's recipes read from the database"""
+        rows = Recipe.objects.filter(user_id=user_id).values_list(
+            'id', 'tag_ids', 'ingredient_ids',
+        )
+        return cls(rows.iterator(), version)
+
+    def set(self, recipe_id, tag_ids, ingredient_ids):
+        """Replace the features of a recipe, adding it when new"""
+        row = self.rows.get(recipe_id)
+        if row is None:
+            row = self.rows[recipe_id] = len(self.recipe_ids)
+            self.recipe_ids = np.append(self.recipe_ids, recipe_id)
+            self.sizes = np.append(self.sizes, 0)
+            self.features.append(np.empty(0, np.int64))
+        self._unlink(row)
+        keys = _features(tag_ids, ingredient_ids)
+        for key in keys.tolist():
+            posting = self.postings.get(key)
+            self.postings[key] = np.array([row]) if posting is None \
+                else np.append(posting, row)
+        self.features[row] = keys
+        self.sizes[row] = len(keys)
+
+    def remove(self, recipe_id):
+        """Forget a deleted recipe"""
+        row = self.rows.pop(recipe_id, None)
+        if row is not None:
+            self._unlink(row)
+            self.recipe_ids[row] = 0
+
+    def _unlink(self, row):
+        for key in self.features[row].tolist():
+            posting = self.postings[key]
+            self.postings[key] = posting[posting != row]
+        self.features[row] = np.empty(0, np.int64)
+        self.sizes[row] = 0
+
+    def similar(self, recipe_id, limit):
+        """Return [(recipe id, Jaccard similarity)] most similar first
+
+        Only recipes sharing a tag or an ingredient are returned, equal
+        scores ordered by recipe id. None if the recipe is unknown.
+        """
+        row = self.rows.get(recipe_id)
+        if row is None:
+            return None
+        if not self.sizes[row]:
+            return []
+
+        hits = np.concatenate([
+            self.postings[key] for key in self.features[row].tolist()
+        ])
+        shared = np.bincount(hits, minlength=len(self.recipe_ids))
+        shared[row] = 0
+        candidates = np.flatnonzero(shared)
+        common = shared[candidates]
+        scores = common / (self.sizes[row] + self.sizes[candidates] - common)
+
+        if len(candidates) > limit:
+            # Everything scoring at least the limit-th best, ties included
+            cutoff = np.partition(scores, len(scores) - limit)[-limit]
+            kept = scores >= cutoff
+            candidates, scores = candidates[kept], scores[kept]
+        recipe_ids = self.recipe_ids[candidates]
+        order = np.lexsort((recipe_ids, -scores))[:limit]
+
+        return list(zip(recipe_ids[order].tolist(), scores[order].tolist()))
+
+
+class SimilarityIndex:
+    """Per process RecipeSets of the most recently queried users
+
+    Every change to the recipes of a user bumps a shared version once
+    the transaction commits. The process making the change applies it
+    to its sets in place when they were current, the others see a newer
+    version on their next query and reload the user's sets.
+    """
+
+    def __init__(self, backend, max_users=100):
+        self.versions = VersionCounter(backend, 'recipe-similarity:version')
+        self.max_users = max_users
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_version(self, user_id):
+        """Return current version of the user's recipe sets"""
+        return self.versions.get(user_id)
+
+    def similar(self, user_id, recipe_id, limit):
+        """Return the recipes of the user most similar to recipe_id"""
+        version = self.get_version(user_id)
+        with self._lock:
+            sets = self._sets.get(user_id)
+            if sets is not None:
+                self._sets.move_to_end(user_id)
+        if sets is None or sets.version != version:
+            sets = RecipeSets.load(user_id, version)
+            with self._lock:
+                self._sets[user_id] = sets
+                self._sets.move_to_end(user_id)
+                while len(self._sets) > self.max_users:
+                    self._sets.popitem(last=False)
+
+        with self._lock:
+            return sets.similar(recipe_id, limit)
+
+    def changed(self, user_id, recipe_ids=None):
+        """Apply changes to recipes of the user once they are committed
+
+        Without recipe_ids every process reloads the user's sets.
+        """
+        transaction.on_commit(lambda: self._apply(user_id, recipe_ids))
+
+    def _apply(self, user_id, recipe_ids):
+        version = self.versions.bump(user_id)
+        with self._lock:
+            sets = self._sets.get(user_id)
+        if sets is None:
+            return
+        if version is None or recipe_ids is None or \
+                sets.version != version - 1:
+            # Changed by another process too, reload on the next query
+            with self._lock:
+                self._sets.pop(user_id, None)
+            return
+
+        # Read before locking, every query of the process needs the lock
+        rows = list(Recipe.objects.filter(
+            user_id=user_id, pk__in=recipe_ids,
+        ).values_list('id', 'tag_ids', 'ingredient_ids'))
+        with self._lock:
+            found = set()
+            for recipe_id, tag_ids, ingredient_ids in rows:
+                sets.set(recipe_id, tag_ids, ingredient_ids)
+                found.add(recipe_id)
+            for recipe_id in set(recipe_ids) - found:
+                sets.remove(recipe_id)
+            sets.version = version
+
+
+def _build_similarity_index():
+    config = settings.RECIPE_SIMILARITY
+    return SimilarityIndex(
+        build_cache(config), max_users=config.get('MAX_USERS', 100),
+    )
+
+
+similarity_index = _build_similarity_index()
@@ -0,0 +1,192 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import QueryCountMixin
+
+BULK_URL = reverse('recipe:recipe-bulk')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def recipe_payload(**params):
+    """Return payload of a recipe in a bulk request"""
+    payload = {
+        'title': 'Bulk recipe',
+        'time_minutes': 15,
+        'price': '4.50',
+    }
+    payload.update(params)
+    return payload
+
+
+class BulkRecipeApiTests(QueryCountMixin, TestCase):
+    """Test writing recipes in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.bulk@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Quick')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Rice',
+        )
+
+    def test_bulk_create(self):
+        """Test recipes and their links are created"""
+        payload = [
+            recipe_payload(title='One', tags=[self.tag.id]),
+            recipe_payload(
+                title='Two',
+                ingredients=[self.ingredient.id],
+                tags=[self.tag.id],
+            ),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['status'] for r in res.data], ['created'] * 2)
+        recipe = Recipe.objects.get(id=res.data[1]['id'])
+        self.assertEqual(recipe.title, 'Two')
+        self.assertEqual(recipe.price, Decimal('4.50'))
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+        self.assertEqual(list(recipe.ingredients.all()), [self.ingredient])
+        self.assertEqual(recipe.tag_ids, [self.tag.id])
+
+    def test_bulk_create_constant_queries(self):
+        """Test query count does not grow with the batch"""
+        payload = [
+            recipe_payload(
+                title=f'Recipe {i}',
+                tags=[self.tag.id],
+                ingredients=[self.ingredient.id],
+            )
+            for i in range(100)
+        ]
+
+        # Includes two statements per relation adjusting recipe counts
+        with self.assertMaxQueries(14):
+            res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 100)
+        self.assertEqual(
+            Recipe.tags.through.objects.filter(tag=self.tag).count(),
+            100,
+        )
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 100)
+
+    def test_bulk_update(self):
+        """Test items with an id update that recipe"""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Old',
+            time_minutes=5,
+            price=1,
+        )
+        recipe.ingredients.add(self.ingredient)
+        recipe.tags.add(self.tag)
+
+        res = self.client.post(BULK_URL, [
+            {'id': recipe.id, 'title': 'New', 'tags': [self.tag.id]},
+        ], format='json')
+
+        self.assertEqual(res.data, [{'status': 'updated', 'id': recipe.id}])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New')
+        self.assertEqual(recipe.time_minutes, 5)
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+        self.assertEqual(list(recipe.ingredients.all()), [self.ingredient])
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 1)
+
+    def test_invalid_items_reported(self):
+        """Test invalid items are reported and valid ones still written"""
+        other = get_user_model().objects.create_user(
+            email='shubham.bulk2@gmail.com',
+            password='shubham',
+        )
+        other_tag = Tag.objects.create(user=other, name='Theirs')
+        other_recipe = Recipe.objects.create(
+            user=other,
+            title='Theirs',
+            time_minutes=5,
+            price=1,
+        )
+
+        res = self.client.post(BULK_URL, [
+            recipe_payload(title='Fine'),
+            recipe_payload(title=''),
+            recipe_payload(tags=[other_tag.id]),
+            {'id': other_recipe.id, 'title': 'Mine now'},
+            'not a recipe',
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in res.data],
+            ['created', 'error', 'error', 'error', 'error'],
+        )
+        self.assertIn('title', res.data[1]['errors'])
+        self.assertIn('tags', res.data[2]['errors'])
+        self.assertIn('id', res.data[3]['errors'])
+        other_recipe.refresh_from_db()
+        self.assertEqual(other_recipe.title, 'Theirs')
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_repeated_updates_rejected(self):
+        """Test items updating the same recipe are all rejected"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Once', time_minutes=5, price=1,
+        )
+
+        res = self.client.post(BULK_URL, [
+            {'id': recipe.id, 'tags': [self.tag.id]},
+            recipe_payload(title='Fine'),
+            {'id': recipe.id, 'tags': [self.tag.id], 'title': 'Twice'},
+        ], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['status'] for r in res.data], ['error', 'created', 'error'],
+        )
+        self.assertIn('id', res.data[2]['errors'])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Once')
+        self.assertFalse(recipe.tags.exists())
+
+    def test_all_invalid(self):
+        """Test a batch without valid items is a bad request"""
+        res = self.client.post(BULK_URL, [{'title': ''}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_API_MAX_BULK_SIZE=2)
+    def test_batch_size_limited(self):
+        """Test oversized batches and non lists are rejected"""
+        res = self.client.post(BULK_URL, [recipe_payload()] * 3, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(BULK_URL, recipe_payload(), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_write_visible_in_list(self):
+        """Test cached recipe lists are invalidated"""
+        self.client.get(RECIPES_URL)
+
+        self.client.post(BULK_URL, [recipe_payload()], format='json')
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
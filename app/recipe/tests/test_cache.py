@@ -0,0 +1,265 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import QueryCountMixin
+from core.cache import SharedCache
+from recipe.cache import _build_response_cache, response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+CACHE_STATS_URL = reverse('recipe:cache-stats')
+
+
+def sample_recipe(user, **params):
+    """Creates and return sample recipe"""
+    defaults = {
+        'title': 'Demo Recipe',
+        'time_minutes': 10,
+        'price': 5.00,
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTests(QueryCountMixin, TestCase):
+    """Test caching and invalidation of list responses"""
+
+    def setUp(self):
+        response_cache.backend.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.cache@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """Test second identical request runs no queries"""
+        sample_recipe(self.user)
+        res1 = self.client.get(RECIPES_URL)
+
+        with self.assertMaxQueries(0):
+            res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.data, res2.data)
+
+    def test_query_params_normalized(self):
+        """Test reordered set parameters share a cache entry"""
+        tag1 = Tag.objects.create(user=self.user, name='a')
+        tag2 = Tag.objects.create(user=self.user, name='b')
+        self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        with self.assertMaxQueries(0):
+            self.client.get(RECIPES_URL, {'tags': f'{tag2.id}, {tag1.id}'})
+
+    def test_create_invalidates_list(self):
+        """Test creating a recipe drops the cached list"""
+        self.client.get(RECIPES_URL)
+
+        recipe = sample_recipe(self.user)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [recipe.id],
+        )
+
+    def test_linking_tag_invalidates_assigned_tags(self):
+        """Test assigning a tag to a recipe drops cached tag lists"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = sample_recipe(self.user)
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual(res.data['results'], [])
+
+        recipe.tags.add(tag)
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_recipe_delete_invalidates_tags(self):
+        """Test deleting a recipe drops cached assigned tags"""
+        recipe = sample_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        recipe.delete()
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_cache_is_per_user(self):
+        """Test users never see each others cached lists"""
+        sample_recipe(self.user)
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            email='shubham.cache2@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_cache_stats(self):
+        """Test hit and miss counters are reported to admins only"""
+        before = response_cache.stats()['recipes']
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['recipes']['hits'] - before['hits'], 1
+        )
+        self.assertEqual(
+            res.data['recipes']['misses'] - before['misses'], 1
+        )
+
+
+class ConditionalGetTests(QueryCountMixin, TestCase):
+    """Test ETag validation of list and detail responses"""
+
+    def setUp(self):
+        response_cache.backend.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.etag@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_not_modified_without_queries(self):
+        """Test matching If-None-Match is answered without the database"""
+        sample_recipe(self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.assertMaxQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertFalse(res.content)
+
+    def test_no_tag_or_ingredient_detail(self):
+        """Test tags and ingredients still have no detail routes"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+
+        for url in (f'{TAGS_URL}{tag.id}/',
+                    f'{INGREDIENTS_URL}{ingredient.id}/'):
+            res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_write_changes_etag(self):
+        """Test creating a recipe invalidates the previous ETag"""
+        etag = self.client.get(RECIPES_URL)['ETag']
+        sample_recipe(self.user)
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_etag_depends_on_query(self):
+        """Test filtered lists do not share an ETag"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(
+            TAGS_URL, {'assigned_only': 1}, HTTP_IF_NONE_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn(tag.id, [t['id'] for t in res.data['results']])
+
+    def test_tag_rename_changes_recipe_detail_etag(self):
+        """Test detail ETag follows changes of nested tags"""
+        recipe = sample_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_weak_and_wildcard_match(self):
+        """Test If-None-Match uses weak comparison and accepts *"""
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        for header in (f'"other", W/{etag}', '*'):
+            res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=header)
+
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etags_without_response_cache(self):
+        """Test ETags are still versioned with list caching disabled"""
+        with patch.object(response_cache, 'enabled', False):
+            etag = self.client.get(RECIPES_URL)['ETag']
+            not_modified = self.client.get(
+                RECIPES_URL, HTTP_IF_NONE_MATCH=etag,
+            )
+            sample_recipe(self.user)
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED,
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_no_etags_without_shared_versions(self):
+        """Test no ETags are sent when processes do not share versions"""
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with patch.object(response_cache, 'validators', False):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+
+    def test_validators_need_shared_versions(self):
+        """Test ETags need versions shared by the processes"""
+        with override_settings(
+            RECIPE_API_CACHE={'BACKEND': 'none'}, WEB_CONCURRENCY=4,
+        ):
+            self.assertFalse(_build_response_cache().validators)
+
+        with override_settings(
+            RECIPE_API_CACHE={'BACKEND': 'none'}, WEB_CONCURRENCY=4,
+            DEFAULT_CACHE_BACKEND='shared', CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                'LOCATION': 'cache',
+            }},
+        ):
+            cache = _build_response_cache()
+
+        self.assertIsInstance(cache.backend, SharedCache)
+        self.assertTrue(cache.validators)
+        self.assertFalse(cache.enabled)
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import QueryCountMixin
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def sample_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {'title': 'Export recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeExportApiTests(QueryCountMixin, TestCase):
+    """Test streaming a user's recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.export@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user,
+            name='Salt',
+        )
+
+    def _export(self, params=None):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        return res, b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """Test each recipe is one JSON line with its tags and ingredients"""
+        first = sample_recipe(user=self.user, title='Curry', link='x.com')
+        first.tags.add(self.tag)
+        first.ingredients.add(self.ingredient)
+        second = sample_recipe(user=self.user, title='Toast')
+        other = get_user_model().objects.create_user(
+            email='other.export@gmail.com',
+            password='shubham',
+        )
+        sample_recipe(user=other, title='Hidden')
+
+        res, body = self._export()
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertIn('recipes.ndjson', res['Content-Disposition'])
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(records, [
+            {
+                'id': first.id, 'title': 'Curry', 'time_minutes': 10,
+                'price': '5.00', 'link': 'x.com',
+                'tags': [{'id': self.tag.id, 'name': 'Vegan'}],
+                'ingredients': [{'id': self.ingredient.id, 'name': 'Salt'}],
+            },
+            {
+                'id': second.id, 'title': 'Toast', 'time_minutes': 10,
+                'price': '5.00', 'link': '', 'tags': [], 'ingredients': [],
+            },
+        ])
+
+    def test_export_csv(self):
+        """Test CSV export lists tag and ingredient names per recipe"""
+        recipe = sample_recipe(user=self.user, title='Curry, hot')
+        recipe.tags.add(
+            self.tag, Tag.objects.create(user=self.user, name='Spicy'),
+        )
+
+        res, body = self._export({'export_format': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows, [
+            ['id', 'title', 'time_minutes', 'price', 'link', 'tags',
+             'ingredients'],
+            [str(recipe.id), 'Curry, hot', '10', '5.00', '', 'Vegan;Spicy',
+             ''],
+        ])
+
+    def test_export_applies_filters(self):
+        """Test the list filters narrow the export"""
+        tagged = sample_recipe(user=self.user, title='Tagged')
+        tagged.tags.add(self.tag)
+        sample_recipe(user=self.user, title='Untagged')
+
+        res, body = self._export({'tags': str(self.tag.id)})
+
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r['title'] for r in records], ['Tagged'])
+
+    def test_invalid_export_format(self):
+        """Test unknown export formats are rejected"""
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('export_format', res.data)
+
+    @override_settings(RECIPE_API_EXPORT_CHUNK_SIZE=2)
+    def test_related_rows_queried_per_chunk(self):
+        """Test tags and ingredients are looked up once per chunk"""
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(self.ingredient)
+
+        # The recipes, then a tag and an ingredient query per chunk
+        with self.assertMaxQueries(1 + 3 * 2):
+            res, body = self._export()
+
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[4]['tags'][0]['name'], 'Vegan')
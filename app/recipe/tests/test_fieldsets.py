@@ -0,0 +1,133 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import QueryCountMixin
+from recipe.cache import response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsetTests(QueryCountMixin, TestCase):
+    """Test ?fields= and ?exclude= trim responses and queries"""
+
+    def setUp(self):
+        response_cache.backend.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.fields@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=20, price=7,
+        )
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice'),
+        )
+
+    def test_list_fields(self):
+        """Test only the requested fields and columns are loaded"""
+        with self.assertMaxQueries(1) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'title,id'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            [{'id': self.recipe.id, 'title': 'Curry'}],
+        )
+        sql = queries.captured_queries[0]['sql']
+        self.assertIn('"core_recipe"."title"', sql)
+        self.assertNotIn('"core_recipe"."price"', sql)
+        self.assertNotIn('"core_recipe"."image_variants"', sql)
+
+    def test_list_exclude_relations(self):
+        """Test excluded relations are not prefetched"""
+        with self.assertMaxQueries(1):
+            res = self.client.get(
+                RECIPES_URL, {'exclude': 'tags,ingredients,image_variants'},
+            )
+
+        self.assertEqual(set(res.data['results'][0]), {
+            'id', 'title', 'time_minutes', 'price', 'link', 'image_status',
+        })
+
+    def test_retrieve_fields(self):
+        """Test detail responses keep nested relations that are asked for"""
+        with self.assertMaxQueries(2):
+            res = self.client.get(
+                detail_url(self.recipe.id), {'fields': 'tags'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, {'tags': [{'id': self.tag.id, 'name': 'Vegan'}]},
+        )
+
+    def test_counts_skipped_when_not_requested(self):
+        """Test recipe counts are not computed for responses without them"""
+        with self.assertMaxQueries(1) as queries:
+            res = self.client.get(
+                TAGS_URL, {'with_counts': 1, 'fields': 'id'},
+            )
+        self.assertEqual(res.data['results'], [{'id': self.tag.id}])
+        self.assertNotIn('COUNT', queries.captured_queries[0]['sql'])
+
+        res = self.client.get(
+            TAGS_URL, {'with_counts': 1, 'exclude': 'id'},
+        )
+        self.assertEqual(
+            res.data['results'], [{'name': 'Vegan', 'recipe_count': 1}],
+        )
+
+    def test_paginated_without_ordering_fields(self):
+        """Test cursors are built from loaded columns, not extra queries"""
+        Tag.objects.create(user=self.user, name='Quick')
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(TAGS_URL, {'fields': 'id', 'page_size': 1})
+        self.assertIsNotNone(res.data['next'])
+
+        res = self.client.get(res.data['next'])
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_unknown_field(self):
+        """Test unknown field names are rejected"""
+        res = self.client.get(
+            RECIPES_URL, {'fields': 'id,secret', 'exclude': 'nope'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data['fields'], ['Unknown field: secret'])
+        self.assertEqual(res.data['exclude'], ['Unknown field: nope'])
+
+    def test_field_order_shares_cache_entry(self):
+        """Test the same fieldset in another order is served from cache"""
+        first = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        with self.assertMaxQueries(0):
+            second = self.client.get(RECIPES_URL, {'fields': 'title,id'})
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_writes_ignore_fieldset(self):
+        """Test create responses always carry every field"""
+        res = self.client.post(
+            RECIPES_URL + '?fields=id',
+            {'title': 'Soup', 'time_minutes': 5, 'price': '2.00'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn('title', res.data)
@@ -0,0 +1,299 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ImageBlob, Recipe
+from recipe import images
+from recipe.views import RecipeViewset
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def image_url(recipe_id):
+    """Create and returns image url"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def sample_image_data(size=(1600, 800), color='orange'):
+    """Return JPEG encoded image data"""
+    out = io.BytesIO()
+    Image.new('RGB', size, color=color).save(out, format='JPEG')
+    return out.getvalue()
+
+
+class RenderVariantsTests(TestCase):
+    """Test generating resized copies of images"""
+
+    def test_variants_fit_bounding_boxes(self):
+        """Test each variant keeps aspect ratio within its box"""
+        variants = images.render_variants(sample_image_data())
+
+        sizes = {
+            name: Image.open(io.BytesIO(data)).size
+            for name, data in variants.items()
+        }
+        self.assertEqual(sizes, {
+            'thumbnail': (150, 75),
+            'medium': (600, 300),
+            'large': (1200, 600),
+        })
+
+    def test_variants_rendered_in_worker_process(self):
+        """Test rendering works on the process pool"""
+        name = default_storage.save(
+            'uploads/recipe/pool-test.jpg',
+            io.BytesIO(sample_image_data((40, 20))),
+        )
+        self.addCleanup(default_storage.delete, name)
+
+        future = images.get_executor().submit(images._render_file, name)
+
+        self.assertEqual(set(future.result(timeout=30)), {
+            'thumbnail', 'medium', 'large',
+        })
+
+    def test_variant_path(self):
+        """Test variants are stored next to the original"""
+        self.assertEqual(
+            images.variant_path('uploads/recipe/abc.png', 'thumbnail'),
+            'uploads/recipe/variants/abc_thumbnail.jpg',
+        )
+
+
+class RecipeImageProcessingTests(TestCase):
+    """Test processing uploaded recipe images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.images@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Mango lassi',
+            time_minutes=5,
+            price=2.00,
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        for path in self.recipe.image_variants.values():
+            default_storage.delete(path)
+        self.recipe.image.delete()
+
+    def _upload(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(sample_image_data())
+            ntf.seek(0)
+            return self.client.post(
+                image_url(self.recipe.id),
+                {'image': ntf},
+                format='multipart',
+            )
+
+    def test_upload_queues_processing(self):
+        """Test upload returns before variants are rendered"""
+        with patch('recipe.images.transaction.on_commit') as on_commit:
+            res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertEqual(res.data['image_variants'], {})
+        submit, = [
+            call[0][0] for call in on_commit.call_args_list
+            if call[0][0].__name__ == 'submit'
+        ]
+        with patch('recipe.images.get_executor') as get_executor:
+            submit()
+        self.recipe.refresh_from_db()
+        get_executor.return_value.submit.assert_called_once_with(
+            images._render_file,
+            self.recipe.image.name,
+        )
+
+    def test_results_stored_on_store_thread(self):
+        """Test worker results are stored off the pool's result thread"""
+        stored = threading.Event()
+        threads = []
+
+        def store_result(recipe_id, image_name, variants):
+            threads.append(threading.current_thread().name)
+            stored.set()
+
+        with patch('recipe.images.transaction.on_commit') as on_commit:
+            self._upload()
+        submit, = [
+            call[0][0] for call in on_commit.call_args_list
+            if call[0][0].__name__ == 'submit'
+        ]
+        with patch('recipe.images._store_result', store_result):
+            submit()
+            self.assertTrue(stored.wait(timeout=30))
+
+        self.assertTrue(threads[0].startswith('recipe-images'))
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='sync')
+    def test_variant_urls_listed(self):
+        """Test processed variants are exposed as urls"""
+        self._upload()
+
+        res = self.client.get(RECIPES_URL)
+
+        recipe = res.data['results'][0]
+        self.assertEqual(recipe['image_status'], Recipe.IMAGE_READY)
+        self.assertEqual(
+            set(recipe['image_variants']),
+            {'thumbnail', 'medium', 'large'},
+        )
+        self.assertTrue(
+            recipe['image_variants']['thumbnail'].startswith('http')
+        )
+        self.recipe.refresh_from_db()
+        for path in self.recipe.image_variants.values():
+            self.assertTrue(default_storage.exists(path))
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='sync')
+    def test_failed_processing_reported(self):
+        """Test images that can not be resized are marked failed"""
+        with patch('recipe.images.render_variants', side_effect=OSError):
+            self._upload()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(self.recipe.image_variants, {})
+
+    def test_stale_result_ignored(self):
+        """Test results for a replaced image are dropped"""
+        with patch('recipe.images.transaction.on_commit'):
+            self._upload()
+
+        images._store_result(self.recipe.id, 'uploads/recipe/old.jpg', {
+            'thumbnail': sample_image_data((10, 10)),
+        })
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_PENDING)
+
+
+@override_settings(RECIPE_IMAGE_PROCESSING='sync')
+class ImageDeduplicationTests(TestCase):
+    """Test recipe images are stored once and collected when unused"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.blobs@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipes = [
+            Recipe.objects.create(
+                user=self.user, title=title, time_minutes=5, price=2.00,
+            )
+            for title in ('Mango lassi', 'Mango shake')
+        ]
+
+    def _upload(self, recipe, color='orange'):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(sample_image_data((200, 100), color))
+            ntf.seek(0)
+            self.client.post(
+                image_url(recipe.id), {'image': ntf}, format='multipart',
+            )
+        recipe.refresh_from_db()
+        return recipe.image.name
+
+    def _files(self, name):
+        """Return which of the image and its variants are stored"""
+        paths = [name] + [
+            images.variant_path(name, variant)
+            for variant, size in images.VARIANTS
+        ]
+        return [default_storage.exists(path) for path in paths]
+
+    def test_shared_upload_stored_and_rendered_once(self):
+        """Test the same photo on two recipes shares file and variants"""
+        with patch(
+            'recipe.images.render_variants', wraps=images.render_variants,
+        ) as render:
+            first, second = (self._upload(r) for r in self.recipes)
+
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^uploads/recipe/[0-9a-f]{2}/[0-9a-f]{64}')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(ImageBlob.objects.get(name=first).ref_count, 2)
+        self.assertEqual(
+            self.recipes[1].image_variants, self.recipes[0].image_variants,
+        )
+        self.assertEqual(self.recipes[1].image_status, Recipe.IMAGE_READY)
+
+    def test_unreferenced_images_collected(self):
+        """Test replaced and deleted images are removed after the grace"""
+        old = self._upload(self.recipes[0])
+        self._upload(self.recipes[1])
+        new = self._upload(self.recipes[0], color='green')
+        self.assertEqual(ImageBlob.objects.get(name=old).ref_count, 1)
+
+        self.recipes[1].delete()
+        self.assertEqual(images.collect_images(grace=3600), 0)
+        self.assertEqual(self._files(old), [True] * 4)
+
+        self.assertEqual(images.collect_images(grace=0), 1)
+        self.assertEqual(self._files(old), [False] * 4)
+        self.assertFalse(ImageBlob.objects.filter(name=old).exists())
+        self.assertEqual(self._files(new), [True] * 4)
+        self.assertEqual(ImageBlob.objects.get(name=new).ref_count, 1)
+
+    def test_upload_releases_committed_image(self):
+        """Test an upload racing another releases the image it replaced"""
+        shared = self._upload(self.recipes[0])
+        self._upload(self.recipes[1])
+        raced = self._upload(self.recipes[1], color='green')
+        self._upload(self.recipes[1])
+        get_object = RecipeViewset.get_object
+
+        def stale_get_object(view):
+            # Another upload commits after this one loaded the recipe
+            recipe = get_object(view)
+            other = Recipe.objects.get(pk=recipe.pk)
+            other.image = raced
+            other.save()
+            return recipe
+
+        with patch.object(RecipeViewset, 'get_object', stale_get_object):
+            new = self._upload(self.recipes[1], color='blue')
+
+        self.assertEqual(ImageBlob.objects.get(name=shared).ref_count, 1)
+        self.assertEqual(ImageBlob.objects.get(name=raced).ref_count, 0)
+        self.assertEqual(ImageBlob.objects.get(name=new).ref_count, 1)
+
+    def test_reupload_keeps_collected_file(self):
+        """Test an unused image uploaded again is stored again"""
+        name = self._upload(self.recipes[0])
+        self.recipes[0].delete()
+        images.collect_images(grace=0)
+
+        self.assertEqual(self._upload(self.recipes[1]), name)
+        self.assertTrue(os.path.exists(default_storage.path(name)))
+        self.assertEqual(ImageBlob.objects.get(name=name).ref_count, 1)
@@ -9,6 +9,7 @@ from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+INGREDIENTS_BULK_URL = reverse('recipe:ingredient-bulk')
 
 
 class PublicIngredientApiTest(TestCase):
@@ -46,7 +47,7 @@ class PrivateIngredientApiTest(TestCase):
         ingredient = Ingredient.objects.all().order_by('-name')
         serializer = IngredientSerializer(ingredient, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredient_limited_user(self):
         """Test api returns ingredient for authenticated user"""
@@ -60,8 +61,8 @@ class PrivateIngredientApiTest(TestCase):
         res = self.client.get(INGREDIENTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_successfully(self):
         """Test ingredients are created successfully"""
@@ -104,8 +105,8 @@ class PrivateIngredientApiTest(TestCase):
 
         serializer1 = IngredientSerializer(ingredient1)
         serializer2 = IngredientSerializer(ingredient2)
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_ingredeints_assigned_unique(self):
         """Test filtering ingredients by assigned returns unique items"""
@@ -134,4 +135,73 @@ class PrivateIngredientApiTest(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+
+class IngredientBulkApiTests(TestCase):
+    """Test getting or creating ingredients by name in one request"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.bulk@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_creates_only_missing_names(self):
+        """Test existing ingredients are reused"""
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+
+        res = self.client.post(
+            INGREDIENTS_BULK_URL,
+            {'names': ['Egg', 'Rice']},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['name'], item['created']) for item in res.data],
+            [('Egg', True), ('Rice', False)],
+        )
+        self.assertEqual(res.data[1]['id'], rice.id)
+
+    def test_created_names_listed(self):
+        """Test cached ingredient list includes the created names"""
+        self.client.get(INGREDIENTS_URL)
+
+        self.client.post(
+            INGREDIENTS_BULK_URL, {'names': ['Egg']}, format='json',
+        )
+        res = self.client.get(INGREDIENTS_URL)
+
+        self.assertEqual(
+            [item['name'] for item in res.data['results']], ['Egg'],
+        )
+
+    def test_create_duplicate_ingredient(self):
+        """Test creating an ingredient with an existing name fails"""
+        Ingredient.objects.create(user=self.user, name='Rice')
+
+        res = self.client.post(INGREDIENTS_URL, {'name': 'Rice'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_with_counts(self):
+        """Test each ingredient carries its recipe count"""
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        Ingredient.objects.create(user=self.user, name='Egg')
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                title='Pulao', time_minutes=20, price=4.00, user=self.user,
+            )
+            recipe.ingredients.add(rice)
+
+        res = self.client.get(
+            INGREDIENTS_URL, {'with_counts': 1, 'assigned_only': 1},
+        )
+
+        self.assertEqual(
+            res.data['results'],
+            [{'id': rice.id, 'name': 'Rice', 'recipe_count': 3}],
+        )
@@ -0,0 +1,201 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.storage import image_storage
+from recipe.images import variant_path
+
+CONTENT = bytes(range(256)) * 4
+
+
+def media_url(name):
+    """Return url serving the stored file"""
+    return reverse('media', args=[name])
+
+
+def body(res):
+    """Return the content of a file response"""
+    return b''.join(res.streaming_content)
+
+
+class MediaTests(TestCase):
+    """Test recipe images are only served to the owners of the recipes"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = self.settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.media@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        self.name = image_storage.save(
+            'uploads/recipe/upload.jpg', ContentFile(CONTENT),
+        )
+        self.thumbnail = variant_path(self.name, 'thumbnail')
+        default_storage.save(self.thumbnail, ContentFile(b'thumbnail'))
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Pav bhaji', time_minutes=20, price=4.00,
+            image=self.name, image_variants={'thumbnail': self.thumbnail},
+        )
+        self.url = media_url(self.name)
+
+    def test_owner_gets_image(self):
+        """Test the owner receives the whole file and cache headers"""
+        res = self.client.get(self.url, HTTP_ACCEPT='image/*')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(body(res), CONTENT)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertEqual(
+            res['Cache-Control'], 'private, max-age=31536000, immutable',
+        )
+
+    def test_variant_served_to_owner(self):
+        """Test variants are served with the recipe owning them"""
+        res = self.client.get(media_url(self.thumbnail))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(body(res), b'thumbnail')
+
+    def test_other_users_get_not_found(self):
+        """Test images of other users look like missing files"""
+        other = get_user_model().objects.create_user(
+            email='other.media@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(other)
+
+        for name in (self.name, self.thumbnail):
+            res = self.client.get(media_url(name))
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_login_required(self):
+        """Test media is not served to anonymous users"""
+        res = APIClient().get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_path_outside_media_root(self):
+        """Test paths escaping MEDIA_ROOT are not found"""
+        Recipe.objects.filter(pk=self.recipe.pk).update(image='../secret')
+
+        res = self.client.get('/media/../secret')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = self.client.get(media_url('uploads/../../secret'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing_file(self):
+        """Test referenced files missing from disk are not found"""
+        os.remove(image_storage.path(self.name))
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_range(self):
+        """Test single byte ranges are answered partially"""
+        cases = (
+            ('bytes=0-99', 0, 99),
+            ('bytes=1000-', 1000, 1023),
+            ('bytes=-24', 1000, 1023),
+            ('bytes=1000-5000', 1000, 1023),
+        )
+        for header, start, end in cases:
+            res = self.client.get(self.url, HTTP_RANGE=header)
+
+            self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(body(res), CONTENT[start:end + 1])
+            self.assertEqual(res['Content-Length'], str(end - start + 1))
+            self.assertEqual(
+                res['Content-Range'], f'bytes {start}-{end}/1024',
+            )
+
+    def test_range_ignored(self):
+        """Test invalid, multiple and outdated ranges get the whole file"""
+        for headers in ({'HTTP_RANGE': 'bytes=0-1,5-6'},
+                        {'HTTP_RANGE': 'items=0-1'},
+                        {'HTTP_RANGE': 'bytes=0-1', 'HTTP_IF_RANGE': '"old"'}):
+            res = self.client.get(self.url, **headers)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(body(res), CONTENT)
+
+    def test_range_not_satisfiable(self):
+        """Test ranges starting after the end of the file"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+
+        self.assertEqual(
+            res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        self.assertEqual(res['Content-Range'], 'bytes */1024')
+
+    def test_conditional_requests(self):
+        """Test matching ETag or modification date return not modified"""
+        etag = self.client.get(self.url)['ETag']
+        mtime = os.stat(image_storage.path(self.name)).st_mtime
+
+        for headers in ({'HTTP_IF_NONE_MATCH': etag},
+                        {'HTTP_IF_MODIFIED_SINCE': http_date(mtime)}):
+            res = self.client.get(self.url, **headers)
+
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(res['ETag'], etag)
+            self.assertIn('immutable', res['Cache-Control'])
+
+        res = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag,
+        )
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+    @override_settings(MEDIA_SERVE='accel')
+    def test_accel_redirect(self):
+        """Test nginx is told the internal location of the file"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(
+            res['X-Accel-Redirect'], f'/protected-media/{self.name}',
+        )
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+
+    @override_settings(MEDIA_SERVE='sendfile')
+    def test_sendfile(self):
+        """Test the proxy is told the absolute path of the file"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Sendfile'], image_storage.path(self.name))
+
+    @override_settings(MEDIA_SERVE='accel')
+    def test_accel_checks_owner(self):
+        """Test files are only handed to the proxy for their owners"""
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            email='other.accel@gmail.com',
+            password='shubham',
+        ))
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(res.has_header('X-Accel-Redirect'))
@@ -0,0 +1,158 @@
+import json
+from base64 import urlsafe_b64encode
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample_recipe(user, **params):
+    """Creates and return sample recipe"""
+    defaults = {
+        'title': 'Demo Recipe',
+        'time_minutes': 10,
+        'price': 5.00,
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class KeysetPaginationTests(TestCase):
+    """Test cursor pagination of list endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.pages@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _walk(self, url, params):
+        """Follow next links returning ids of every page"""
+        pages = []
+        res = self.client.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append([item['id'] for item in res.data['results']])
+            if not res.data['next']:
+                return pages, res
+            res = self.client.get(res.data['next'])
+
+    def test_recipes_paginated_by_id(self):
+        """Test recipes are split into pages ordered by id"""
+        recipes = [sample_recipe(self.user) for i in range(5)]
+
+        pages, last = self._walk(RECIPES_URL, {'page_size': 2})
+
+        ids = [recipe.id for recipe in recipes]
+        self.assertEqual(pages, [ids[0:2], ids[2:4], ids[4:5]])
+        self.assertIsNotNone(last.data['previous'])
+
+    def test_previous_link(self):
+        """Test following previous link returns the earlier page"""
+        recipes = [sample_recipe(self.user) for i in range(5)]
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        res = self.client.get(res.data['next'])
+
+        res = self.client.get(res.data['previous'])
+
+        ids = [item['id'] for item in res.data['results']]
+        self.assertEqual(ids, [recipes[0].id, recipes[1].id])
+        self.assertIsNone(res.data['previous'])
+        self.assertIsNotNone(res.data['next'])
+
+    def test_tags_paginated_by_name_and_id(self):
+        """Test tags are split into pages ordered by name descending"""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dessert', 'Thai', 'Curry', 'Spicy')
+        ]
+
+        pages, last = self._walk(TAGS_URL, {'page_size': 2})
+
+        expected = sorted(tags, key=lambda tag: tag.name, reverse=True)
+        self.assertEqual(
+            [tag_id for page in pages for tag_id in page],
+            [tag.id for tag in expected],
+        )
+        self.assertEqual(len(pages), 3)
+
+    @override_settings(RECIPE_API_MAX_PAGE_SIZE=3)
+    def test_page_size_capped(self):
+        """Test requested page size can not exceed the maximum"""
+        for i in range(5):
+            sample_recipe(self.user)
+
+        res = self.client.get(RECIPES_URL, {'page_size': 100})
+
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test invalid cursor returns not found"""
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_tampered_cursor(self):
+        """Test cursors with values not fitting the ordering are invalid"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        cursors = [
+            (RECIPES_URL, {}, {'r': 0, 'p': ['abc']}),
+            (RECIPES_URL, {}, {'r': 0, 'p': [None]}),
+            (RECIPES_URL, {}, {'r': 0, 'p': [[1]]}),
+            (TAGS_URL, {}, {'r': 0, 'p': [None, 1]}),
+            (TAGS_URL, {}, {'r': 0, 'p': ['Vegan', 'abc']}),
+            # Reused with another ordering of the same length
+            (TAGS_URL, {'ordering': '-recipe_count'},
+             {'r': 0, 'p': ['Vegan', 1]}),
+        ]
+
+        for url, params, payload in cursors:
+            cursor = urlsafe_b64encode(
+                json.dumps(payload).encode('utf-8'),
+            ).decode('ascii')
+            res = self.client.get(url, {**params, 'cursor': cursor})
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_pagination_with_tag_filter(self):
+        """Test filters apply to every page"""
+        tag = Tag.objects.create(user=self.user, name='Thai')
+        tagged = []
+        for i in range(4):
+            recipe = sample_recipe(self.user)
+            sample_recipe(self.user)
+            recipe.tags.add(tag)
+            tagged.append(recipe.id)
+
+        pages, last = self._walk(
+            RECIPES_URL,
+            {'tags': f'{tag.id}', 'page_size': 3}
+        )
+
+        self.assertEqual(pages, [tagged[0:3], tagged[3:4]])
+
+    def test_assigned_only_paginated(self):
+        """Test assigned_only filter works across pages"""
+        recipe = sample_recipe(self.user)
+        for name in ('a', 'b', 'c'):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=name))
+        Tag.objects.create(user=self.user, name='unused')
+
+        pages, last = self._walk(
+            TAGS_URL,
+            {'assigned_only': 1, 'page_size': 2}
+        )
+
+        self.assertEqual(sum(len(page) for page in pages), 3)
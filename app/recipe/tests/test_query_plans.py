@@ -0,0 +1,96 @@
+import random
+import re
+
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.benchmark import seed_users
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import QueryPlanMixin
+from recipe.cache import response_cache
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class ListQueryPlanTests(QueryPlanMixin, TestCase):
+    """Test list pages are read in index order without scanning tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_users(
+            10, 200, tags=60, ingredients=120, rng=random.Random(4),
+        )[0]
+        cls.analyze(
+            Recipe, Tag, Ingredient,
+            Recipe.tags.through, Recipe.ingredients.through,
+        )
+
+    def setUp(self):
+        response_cache.backend.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertIndexedList(self, url, params=None):
+        """Assert the first pages of a list are indexed"""
+        self.assertIndexedPages(
+            self.client, url, {'page_size': 3, **(params or {})},
+        )
+
+    def test_tags_and_ingredients(self):
+        """Test orderings and assigned_only use the indexes"""
+        for url, name in ((TAGS_URL, 'tag'), (INGREDIENTS_URL, 'ingr')):
+            self.assertIndexedList(url)
+            self.assertIndexedList(url, {'ordering': 'name'})
+            self.assertIndexedList(url, {'assigned_only': 1})
+            for ordering in ('recipe_count', '-recipe_count'):
+                self.assertIndexedList(url, {'ordering': ordering})
+                res, plans = self.explain_request(
+                    self.client, url, {'ordering': ordering},
+                )
+                self.assertIn(f'core_{name}_user_count_idx', plans[0])
+
+    def test_recipes(self):
+        """Test id orderings use the (user, id) index"""
+        self.assertIndexedList(RECIPES_URL)
+        self.assertIndexedList(RECIPES_URL, {'ordering': '-id'})
+        # Not the primary key, which reads the rows of every user
+        res, plans = self.explain_request(self.client, RECIPES_URL)
+        self.assertIn('core_recipe_user_id_idx', plans[0])
+
+    def test_recipe_ranges(self):
+        """Test range filters with their ordering use their index"""
+        cases = (
+            ({'ordering': 'price', 'max_price': 10}, 'price'),
+            ({'ordering': '-price', 'min_price': 50}, 'price'),
+            ({'ordering': 'time_minutes', 'max_time': 30}, 'time'),
+            ({'ordering': '-time_minutes', 'min_time': 120}, 'time'),
+        )
+        for params, index in cases:
+            self.assertIndexedList(RECIPES_URL, params)
+            res, plans = self.explain_request(
+                self.client, RECIPES_URL, params,
+            )
+            self.assertIn(f'core_recipe_user_{index}_idx', plans[0])
+
+    def test_deep_cursor_starts_index_range(self):
+        """Test a cursor far into the list bounds the index range read"""
+        cases = (
+            (RECIPES_URL, 'price', 'price'),
+            (RECIPES_URL, '-time_minutes', 'time_minutes'),
+            (TAGS_URL, 'name', 'name'),
+        )
+        for url, ordering, column in cases:
+            data = {'page_size': 10, 'ordering': ordering}
+            for page in range(4):
+                res = self.client.get(url, data)
+                url, data = res.data['next'], None
+
+            res, plans = self.explain_request(self.client, url)
+
+            self.assertEqual(res.status_code, 200)
+            index_cond = re.search(r'Index Cond: (.*)', plans[0]).group(1)
+            self.assertIn(f'ROW({column}, id)', index_cond)
@@ -10,6 +10,7 @@ from rest_framework.test import APIClient
 from rest_framework import status
 
 from core.models import Recipe, Tag, Ingredient
+from core.tests.utils import QueryCountMixin
 
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
@@ -85,7 +86,7 @@ class PrivateRecipeApiTest(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """Test retrieving recipe for user"""
@@ -102,8 +103,8 @@ class PrivateRecipeApiTest(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """Test viewing recipe detail"""
@@ -217,6 +218,315 @@ class PrivateRecipeApiTest(TestCase):
         self.assertEqual(tags.count(), 0)
 
 
+class RecipeMatchFilterTests(TestCase):
+    """Test matching recipes on all or any of the given tags"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(
+            email='shubham.match@gmail.com',
+            password='shubham123',
+        )
+        self.client.force_authenticate(self.user)
+        self.thai = sample_tag(user=self.user, name='Thai')
+        self.spicy = sample_tag(user=self.user, name='Spicy')
+        self.both = sample_recipe(user=self.user, title='Tom yum')
+        self.both.tags.add(self.thai, self.spicy)
+        self.thai_only = sample_recipe(user=self.user, title='Pad thai')
+        self.thai_only.tags.add(self.thai)
+
+    def _result_ids(self, res):
+        return [item['id'] for item in res.data['results']]
+
+    def test_match_any_returns_each_recipe_once(self):
+        """Test recipes matching several tags are not duplicated"""
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{self.thai.id},{self.spicy.id}'}
+        )
+
+        self.assertEqual(
+            self._result_ids(res),
+            [self.both.id, self.thai_only.id],
+        )
+
+    def test_match_all(self):
+        """Test match=all returns recipes having every tag"""
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{self.thai.id},{self.spicy.id}', 'match': 'all'}
+        )
+
+        self.assertEqual(self._result_ids(res), [self.both.id])
+
+    def test_match_all_ingredients(self):
+        """Test match=all applies to ingredients"""
+        rice = sample_ingredient(user=self.user, name='Rice')
+        egg = sample_ingredient(user=self.user, name='Egg')
+        self.both.ingredients.add(rice, egg)
+        self.thai_only.ingredients.add(rice)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'ingredients': f'{rice.id},{egg.id}', 'match': 'all'}
+        )
+
+        self.assertEqual(self._result_ids(res), [self.both.id])
+
+    def test_invalid_match(self):
+        """Test unknown match mode is rejected"""
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{self.thai.id}', 'match': 'some'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeSearchTests(TestCase):
+    """Test full text search of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(
+            email='shubham.search@gmail.com',
+            password='shubham123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _search(self, text, **params):
+        res = self.client.get(RECIPES_URL, {'search': text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_search_title_and_link(self):
+        """Test search matches title words and link"""
+        curry = sample_recipe(user=self.user, title='Thai green curry')
+        soup = sample_recipe(
+            user=self.user,
+            title='Soup',
+            link='https://tomatoes.example.com/soup',
+        )
+        sample_recipe(user=self.user, title='Dal makhani')
+
+        res = self._search('curries')
+        self.assertEqual([r['id'] for r in res.data['results']], [curry.id])
+
+        res = self._search('tomatoes.example.com')
+        self.assertEqual([r['id'] for r in res.data['results']], [soup.id])
+
+    def test_search_tag_and_ingredient_names(self):
+        """Test search matches names of attached tags and ingredients"""
+        recipe = sample_recipe(user=self.user, title='Kheer')
+        recipe.tags.add(sample_tag(user=self.user, name='Dessert'))
+        recipe.ingredients.add(sample_ingredient(self.user, name='Jaggery'))
+        sample_recipe(user=self.user, title='Puran poli')
+
+        for text in ('desserts', 'jaggery'):
+            res = self._search(text)
+            self.assertEqual(
+                [r['id'] for r in res.data['results']],
+                [recipe.id],
+            )
+
+    def test_search_follows_renamed_tag(self):
+        """Test renaming a tag reindexes its recipes"""
+        recipe = sample_recipe(user=self.user, title='Kheer')
+        tag = sample_tag(user=self.user, name='Dessert')
+        recipe.tags.add(tag)
+
+        tag.name = 'Pudding'
+        tag.save()
+
+        self.assertEqual(len(self._search('dessert').data['results']), 0)
+        self.assertEqual(len(self._search('pudding').data['results']), 1)
+
+    def test_search_ranks_title_first(self):
+        """Test title matches rank above ingredient matches"""
+        in_ingredient = sample_recipe(user=self.user, title='Pie')
+        in_ingredient.ingredients.add(
+            sample_ingredient(self.user, name='Mango'),
+        )
+        in_title = sample_recipe(user=self.user, title='Mango lassi')
+
+        res = self._search('mango')
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [in_title.id, in_ingredient.id],
+        )
+
+    def test_search_paginated(self):
+        """Test search results can be paged through without repeats"""
+        recipes = [
+            sample_recipe(user=self.user, title='Mango shake')
+            for i in range(3)
+        ]
+
+        res = self._search('mango', page_size=2)
+        ids = [r['id'] for r in res.data['results']]
+        res = self.client.get(res.data['next'])
+        ids += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(ids, [recipe.id for recipe in recipes])
+        self.assertIsNone(res.data['next'])
+
+
+class RecipeRangeOrderingTests(TestCase):
+    """Test price and time range filters and ordering of recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(
+            email='shubham.ranges@gmail.com',
+            password='shubham123',
+        )
+        self.client.force_authenticate(self.user)
+        self.lassi = sample_recipe(
+            user=self.user, title='Lassi', time_minutes=5, price='3.00',
+        )
+        self.biryani = sample_recipe(
+            user=self.user, title='Biryani', time_minutes=90, price='12.50',
+        )
+        self.dal = sample_recipe(
+            user=self.user, title='Dal', time_minutes=30, price='3.00',
+        )
+        self.curry = sample_recipe(
+            user=self.user, title='Curry', time_minutes=45, price='8.25',
+        )
+
+    def _titles(self, params):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['title'] for item in res.data['results']]
+
+    def test_range_filters(self):
+        """Test bounds are inclusive and can be combined"""
+        self.assertEqual(
+            self._titles({'max_time': 30, 'max_price': 10}),
+            ['Lassi', 'Dal'],
+        )
+        self.assertEqual(
+            self._titles({'min_price': '8.25', 'min_time': 60}),
+            ['Biryani'],
+        )
+        self.assertEqual(
+            self._titles({'min_time': 30, 'max_time': 45}),
+            ['Dal', 'Curry'],
+        )
+
+    def test_invalid_range(self):
+        """Test non numeric and negative bounds are rejected"""
+        for params in ({'max_price': 'cheap'}, {'min_time': -1}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(next(iter(params)), res.data)
+
+    def test_ordering(self):
+        """Test ordering on price and time, ties broken by id"""
+        self.assertEqual(
+            self._titles({'ordering': 'price'}),
+            ['Lassi', 'Dal', 'Curry', 'Biryani'],
+        )
+        self.assertEqual(
+            self._titles({'ordering': '-price'}),
+            ['Biryani', 'Curry', 'Dal', 'Lassi'],
+        )
+        self.assertEqual(
+            self._titles({'ordering': '-time_minutes', 'max_price': 10}),
+            ['Curry', 'Dal', 'Lassi'],
+        )
+
+    def test_invalid_ordering(self):
+        """Test unknown orderings are rejected"""
+        res = self.client.get(RECIPES_URL, {'ordering': 'title'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', res.data)
+
+    def test_ordering_paginated(self):
+        """Test pages of a price ordering continue after equal prices"""
+        for ordering in ('price', '-price'):
+            res = self.client.get(
+                RECIPES_URL, {'ordering': ordering, 'page_size': 1},
+            )
+            titles = [item['title'] for item in res.data['results']]
+            while res.data['next']:
+                res = self.client.get(res.data['next'])
+                titles += [item['title'] for item in res.data['results']]
+
+            self.assertEqual(titles, self._titles({'ordering': ordering}))
+
+    def test_ordering_overrides_search_rank(self):
+        """Test searches can be sorted cheapest first"""
+        sample_recipe(user=self.user, title='Mango dal', price='1.00')
+
+        titles = self._titles({'search': 'dal', 'ordering': 'price'})
+
+        self.assertEqual(titles, ['Mango dal', 'Dal'])
+
+
+class RecipeQueryCountTests(QueryCountMixin, TestCase):
+    """Test recipe endpoints run a bounded number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create(
+            email='shubham.queries@gmail.com',
+            password='shubham123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        """Create recipes each with a couple of tags and ingredients"""
+        recipes = []
+        for i in range(count):
+            recipe = sample_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                sample_tag(user=self.user, name=f'Tag {i}'),
+                sample_tag(user=self.user, name=f'Other tag {i}'),
+            )
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'Ingredient {i}'),
+            )
+            recipes.append(recipe)
+
+        return recipes
+
+    def test_list_recipes_constant_queries(self):
+        """Test listing recipes does not query per recipe"""
+        self._create_recipes(20)
+
+        with self.assertMaxQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 20)
+        self.assertEqual(len(res.data['results'][0]['tags']), 2)
+
+    def test_filtered_list_constant_queries(self):
+        """Test filtering recipes does not query per recipe"""
+        recipes = self._create_recipes(10)
+        tag_ids = ','.join(str(r.tags.first().id) for r in recipes)
+
+        with self.assertMaxQueries(3):
+            res = self.client.get(RECIPES_URL, {'tags': tag_ids})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_recipe_queries(self):
+        """Test recipe detail loads nested tags and ingredients at once"""
+        recipe = self._create_recipes(1)[0]
+
+        with self.assertMaxQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 2)
+        self.assertEqual(len(res.data['ingredients']), 1)
+
+
 class RecipeImageUploadTests(TestCase):
 
     def setUp(self):
@@ -272,9 +582,9 @@ class RecipeImageUploadTests(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
 
     def test_filter_recipe_by_ingredients(self):
         """Test returning recipes with  specific ingredients"""
@@ -295,6 +605,6 @@ class RecipeImageUploadTests(TestCase):
         serializer2 = RecipeSerializer(recipe2)
         serializer3 = RecipeSerializer(recipe3)
 
-        self.assertIn(serializer1.data, res.data)
-        self.assertIn(serializer2.data, res.data)
-        self.assertNotIn(serializer3.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertIn(serializer2.data, res.data['results'])
+        self.assertNotIn(serializer3.data, res.data['results'])
@@ -0,0 +1,246 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.similarity import RecipeSets, similarity_index
+
+
+class HeldLock:
+    """Lock telling whether it is held"""
+
+    def __init__(self):
+        self.held = False
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        self.held = True
+
+    def __exit__(self, *exc_info):
+        self.held = False
+        self._lock.release()
+
+
+def similar_url(recipe_id):
+    """Return similar recipes url of a recipe"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+class RecipeSetsTests(TestCase):
+    """Test Jaccard similarity of tag and ingredient sets"""
+
+    def setUp(self):
+        self.sets = RecipeSets([
+            (1, [1, 2], [1]),
+            (2, [1, 2], [1]),
+            (3, [1], []),
+            (4, [], [2]),
+            (5, [], [1, 2]),
+            (6, [], []),
+        ])
+
+    def test_ranked_by_jaccard(self):
+        """Test recipes sharing nothing are left out"""
+        self.assertEqual(
+            self.sets.similar(1, 10), [(2, 1.0), (3, 1 / 3), (5, 0.25)],
+        )
+        # Tag 2 and ingredient 2 are different features
+        self.assertEqual(self.sets.similar(4, 10), [(5, 0.5)])
+        self.assertEqual(self.sets.similar(6, 10), [])
+        self.assertIsNone(self.sets.similar(7, 10))
+
+    def test_limit_ties_by_id(self):
+        """Test the lowest ids win among equal scores"""
+        sets = RecipeSets([(i, [1], []) for i in range(10, 0, -1)])
+
+        self.assertEqual(sets.similar(5, 3), [(1, 1.0), (2, 1.0), (3, 1.0)])
+
+    def test_set_and_remove(self):
+        """Test recipes are updated, added and removed in place"""
+        self.sets.set(3, [1, 2], [1])
+        self.sets.set(7, [2], [])
+        self.sets.remove(2)
+
+        self.assertEqual(
+            self.sets.similar(1, 10), [(3, 1.0), (7, 1 / 3), (5, 0.25)],
+        )
+        self.assertIsNone(self.sets.similar(2, 10))
+
+
+class SimilarRecipesApiTests(TestCase):
+    """Test the similar recipes endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.similar@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        spicy = Tag.objects.create(user=self.user, name='Spicy')
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        dal = Ingredient.objects.create(user=self.user, name='Dal')
+        self.khichdi = self._recipe('Khichdi', [spicy], [rice, dal])
+        self.biryani = self._recipe('Biryani', [spicy], [rice])
+        self.dal_fry = self._recipe('Dal fry', [], [dal])
+        self._recipe('Lassi', [], [])
+
+    def _recipe(self, title, tags, ingredients):
+        recipe = Recipe.objects.create(
+            user=self.user, title=title, time_minutes=20, price=3.00,
+        )
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def test_similar_recipes(self):
+        """Test recipes sharing tags or ingredients, most similar first"""
+        res = self.client.get(similar_url(self.khichdi.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['title'], item['similarity']) for item in res.data],
+            [('Biryani', 0.6667), ('Dal fry', 0.3333)],
+        )
+        self.assertEqual(
+            res.data[0]['ingredients'],
+            list(self.biryani.ingredients.values_list('id', flat=True)),
+        )
+
+    def test_limit(self):
+        """Test limit bounds the number of recipes"""
+        res = self.client.get(similar_url(self.khichdi.id), {'limit': 1})
+        self.assertEqual([item['id'] for item in res.data], [self.biryani.id])
+
+        res = self.client.get(similar_url(self.khichdi.id), {'limit': 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('limit', res.data)
+
+    def test_same_response_without_values(self):
+        """Test the serializer fallback renders the same recipes"""
+        expected = self.client.get(similar_url(self.khichdi.id))
+        with override_settings(RECIPE_API_VALUES_SERIALIZERS=False):
+            res = self.client.get(similar_url(self.khichdi.id))
+
+        self.assertEqual(res.content, expected.content)
+
+    def test_other_users_recipe_not_found(self):
+        """Test recipes of other users and unknown ids are not found"""
+        other = get_user_model().objects.create_user(
+            email='other.similar@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(other)
+
+        for recipe_id in (self.khichdi.id, 0):
+            res = self.client.get(similar_url(recipe_id))
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SimilarityIndexTests(TransactionTestCase):
+    """Test the in-memory sets follow committed changes"""
+
+    def setUp(self):
+        similarity_index._sets.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.similarity@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+        self.pulao = Recipe.objects.create(
+            user=self.user, title='Pulao', time_minutes=30, price=4.00,
+        )
+        self.pulao.ingredients.add(self.rice)
+
+    def _similar_ids(self, recipe):
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in res.data]
+
+    def test_changes_applied_in_place(self):
+        """Test own changes update the loaded sets without reloading"""
+        self.assertEqual(self._similar_ids(self.pulao), [])
+        sets = similarity_index._sets[self.user.pk]
+
+        kheer = Recipe.objects.create(
+            user=self.user, title='Kheer', time_minutes=60, price=2.00,
+        )
+        kheer.ingredients.add(self.rice)
+        self.assertEqual(self._similar_ids(self.pulao), [kheer.id])
+
+        kheer.ingredients.clear()
+        self.assertEqual(self._similar_ids(self.pulao), [])
+        kheer.ingredients.add(self.rice)
+        kheer.delete()
+        self.assertEqual(self._similar_ids(self.pulao), [])
+        self.assertIs(similarity_index._sets[self.user.pk], sets)
+
+    def test_no_queries_under_lock(self):
+        """Test SQL runs before taking the lock every query needs"""
+        lock = HeldLock()
+
+        def refuse_held(execute, sql, params, many, context):
+            self.assertFalse(lock.held, sql)
+            return execute(sql, params, many, context)
+
+        with patch.object(similarity_index, '_lock', lock), \
+                connection.execute_wrapper(refuse_held):
+            self.assertEqual(self._similar_ids(self.pulao), [])
+            kheer = Recipe.objects.create(
+                user=self.user, title='Kheer', time_minutes=60, price=2.00,
+            )
+            kheer.ingredients.add(self.rice)
+            self.assertEqual(self._similar_ids(self.pulao), [kheer.id])
+
+    def test_reload_after_other_changes(self):
+        """Test sets are reloaded when another process changed recipes"""
+        self.assertEqual(self._similar_ids(self.pulao), [])
+        sets = similarity_index._sets[self.user.pk]
+
+        tea = Recipe.objects.create(
+            user=self.user, title='Rice tea', time_minutes=5, price=1.00,
+        )
+        # As done by a process without these sets, bumping the version
+        similarity_index._sets.clear()
+        tea.ingredients.add(self.rice)
+        similarity_index._sets[self.user.pk] = sets
+
+        self.assertEqual(self._similar_ids(self.pulao), [tea.id])
+        self.assertIsNot(similarity_index._sets[self.user.pk], sets)
+
+    def test_deleted_ingredient(self):
+        """Test recipes losing a deleted ingredient are no longer similar"""
+        kheer = Recipe.objects.create(
+            user=self.user, title='Kheer', time_minutes=60, price=2.00,
+        )
+        kheer.ingredients.add(self.rice)
+        self.assertEqual(self._similar_ids(self.pulao), [kheer.id])
+
+        self.rice.delete()
+
+        self.assertEqual(self._similar_ids(self.pulao), [])
+
+    def test_bulk_writes(self):
+        """Test recipes written by the bulk endpoint are indexed"""
+        self.assertEqual(self._similar_ids(self.pulao), [])
+
+        res = self.client.post(
+            reverse('recipe:recipe-bulk'),
+            [{'title': 'Idli', 'time_minutes': 40, 'price': '3.00',
+              'ingredients': [self.rice.id]}],
+            format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self._similar_ids(self.pulao), [res.data[0]['id']])
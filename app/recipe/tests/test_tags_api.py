@@ -6,9 +6,11 @@ from rest_framework.test import APIClient
 from rest_framework import status
 
 from core.models import Tag, Recipe
+from core.tests.utils import QueryCountMixin
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
+TAGS_BULK_URL = reverse('recipe:tag-bulk')
 
 
 class PublicTagApiTests(TestCase):
@@ -45,7 +47,7 @@ class PrivateTagApiTest(TestCase):
         tags = Tag.objects.all().order_by('-name')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_limited_to_user(self):
         """Test retrieve tag data only for authenticated user"""
@@ -59,8 +61,8 @@ class PrivateTagApiTest(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successfully(self):
         """Test creating a tag"""
@@ -96,8 +98,8 @@ class PrivateTagApiTest(TestCase):
 
         serializer1 = TagSerializer(tag1)
         serializer2 = TagSerializer(tag2)
-        self.assertIn(serializer1.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertIn(serializer1.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_tags_assigned_unique(self):
         """Test filtering tags by assigned returns unique items"""
@@ -120,4 +122,167 @@ class PrivateTagApiTest(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+
+class TagBulkApiTests(QueryCountMixin, TestCase):
+    """Test getting or creating tags by name in one request"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='shubham.bulk@gmail.com',
+            password='shubham',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_creates_only_missing_names(self):
+        """Test existing tags are returned and missing ones created"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(
+            TAGS_BULK_URL,
+            {'names': ['Vegan', 'Thai', 'Vegan']},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        thai = Tag.objects.get(user=self.user, name='Thai')
+        self.assertEqual(res.data, [
+            {'id': vegan.id, 'name': 'Vegan', 'created': False},
+            {'id': thai.id, 'name': 'Thai', 'created': True},
+        ])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_names_scoped_to_user(self):
+        """Test tags of other users are not reused"""
+        other = get_user_model().objects.create_user(
+            email='shubham.other@gmail.com',
+            password='shubham',
+        )
+        Tag.objects.create(user=other, name='Vegan')
+
+        res = self.client.post(
+            TAGS_BULK_URL, {'names': ['Vegan']}, format='json',
+        )
+
+        self.assertTrue(res.data[0]['created'])
+        self.assertEqual(
+            Tag.objects.get(pk=res.data[0]['id']).user, self.user,
+        )
+
+    def test_single_upsert_query(self):
+        """Test the names are resolved with a single statement"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        names = ['Vegan'] + [f'Tag {i}' for i in range(50)]
+
+        with self.assertMaxQueries(1):
+            Tag.objects.get_or_create_names(self.user, names)
+
+    def test_invalid_names(self):
+        """Test names must be a non empty list of short strings"""
+        for payload in ({}, {'names': []}, {'names': ['x' * 256]}):
+            res = self.client.post(TAGS_BULK_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_duplicate_tag(self):
+        """Test creating a tag with an existing name is rejected"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
+
+class TagRecipeCountTests(QueryCountMixin, TestCase):
+    """Test listing tags with the number of recipes using them"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='shubham.counts@gmail.com',
+            password='shubham',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _recipe(self, *tags):
+        recipe = Recipe.objects.create(
+            title='Curry', time_minutes=10, price=5.00, user=self.user,
+        )
+        recipe.tags.add(*tags)
+        return recipe
+
+    def test_list_with_counts(self):
+        """Test each tag carries its recipe count"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        thai = Tag.objects.create(user=self.user, name='Thai')
+        Tag.objects.create(user=self.user, name='Dessert')
+        self._recipe(vegan, thai)
+        self._recipe(vegan)
+
+        res = self.client.get(TAGS_URL, {'with_counts': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count'])
+             for tag in res.data['results']],
+            [('Vegan', 2), ('Thai', 1), ('Dessert', 0)],
+        )
+
+    def test_counts_not_listed_by_default(self):
+        """Test recipe counts are only added on request"""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertNotIn('recipe_count', res.data['results'][0])
+
+    def test_assigned_with_counts_queries(self):
+        """Test assigned filter and counts do not join and deduplicate"""
+        for i in range(5):
+            tag = Tag.objects.create(user=self.user, name=f'Tag {i}')
+            self._recipe(tag)
+            self._recipe(tag)
+        Tag.objects.create(user=self.user, name='Unused')
+
+        with self.assertMaxQueries(1) as context:
+            res = self.client.get(
+                TAGS_URL, {'assigned_only': 1, 'with_counts': 1},
+            )
+
+        self.assertEqual(len(res.data['results']), 5)
+        self.assertTrue(
+            all(tag['recipe_count'] == 2 for tag in res.data['results'])
+        )
+        sql = context.captured_queries[0]['sql']
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_ordered_by_recipe_count(self):
+        """Test tags are paged most used first without counting links"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        thai = Tag.objects.create(user=self.user, name='Thai')
+        dessert = Tag.objects.create(user=self.user, name='Dessert')
+        self._recipe(thai, dessert)
+        self._recipe(thai)
+
+        with self.assertMaxQueries(1) as context:
+            res = self.client.get(
+                TAGS_URL, {'ordering': '-recipe_count', 'page_size': 2},
+            )
+        self.assertNotIn('COUNT', context.captured_queries[0]['sql'])
+        res2 = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [tag['id'] for tag in res.data['results'] + res2.data['results']],
+            [thai.id, dessert.id, vegan.id],
+        )
+
+    def test_invalid_ordering(self):
+        """Test unknown orderings are rejected"""
+        res = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ordering', res.data)
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from core.tests.utils import QueryCountMixin
+from recipe.cache import response_cache
+from recipe.serializers import RecipeDetailSerializer
+from recipe.values import ValuesSerializer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+class ValuesListTests(QueryCountMixin, TestCase):
+    """Test lists built from values() rows match the serializers"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='shubham.values@gmail.com',
+            password='shubham',
+        )
+        self.client.force_authenticate(self.user)
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Quick', 'Spicy')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Dal')
+        ]
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Curry {i}', time_minutes=10 + i,
+                price='7.5', link='' if i % 2 else f'https://x.com/{i}',
+            )
+            # Linked in reverse so link order differs from id order
+            recipe.tags.add(*reversed(tags[:i % 3 + 1]))
+            recipe.ingredients.add(*ingredients[:i % 2 + 1])
+        Recipe.objects.filter(title='Curry 1').update(
+            image_status=Recipe.IMAGE_READY,
+            image_variants={'thumbnail': 'uploads/recipe/a_thumbnail.jpg'},
+        )
+        ingredients[0].recipe_set.clear()
+
+    def assertSameResponses(self, url, params=None):
+        """Assert both paths render the same bytes, return the fast one"""
+        response_cache.backend.clear()
+        with override_settings(RECIPE_API_VALUES_SERIALIZERS=False):
+            expected = self.client.get(url, params)
+        response_cache.backend.clear()
+        res = self.client.get(url, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, expected.content)
+        return res
+
+    def test_recipes_identical(self):
+        """Test recipe lists match, including filters and pages"""
+        self.assertSameResponses(RECIPES_URL)
+        res = self.assertSameResponses(RECIPES_URL, {'page_size': 2})
+        self.assertSameResponses(res.data['next'])
+        self.assertSameResponses(RECIPES_URL, {'search': 'curry'})
+        self.assertSameResponses(
+            RECIPES_URL, {'tags': Tag.objects.first().id},
+        )
+        self.assertSameResponses(
+            RECIPES_URL, {'fields': 'id,price,image_variants'},
+        )
+
+    def test_tags_and_ingredients_identical(self):
+        """Test tag and ingredient lists match with their options"""
+        for url in (TAGS_URL, INGREDIENTS_URL):
+            self.assertSameResponses(url)
+            res = self.assertSameResponses(url, {'page_size': 1})
+            self.assertSameResponses(res.data['next'])
+            self.assertSameResponses(url, {'assigned_only': 1})
+            self.assertSameResponses(url, {'with_counts': 1})
+
+    def test_recipes_without_prefetch_queries(self):
+        """Test related ids come from the id arrays in the same query"""
+        response_cache.backend.clear()
+
+        with self.assertMaxQueries(1):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 5)
+
+    def test_nested_serializer_not_compiled(self):
+        """Test serializers with nested objects keep the slow path"""
+        compiled = ValuesSerializer.compile(
+            RecipeDetailSerializer(), Recipe.objects.all(),
+        )
+
+        self.assertIsNone(compiled)
@@ -12,5 +12,6 @@ router.register('recipes', views.RecipeViewset)
 app_name = 'recipe'
 
 urlpatterns = [
-    path('', include(router.urls))
+    path('', include(router.urls)),
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache-stats'),
 ]
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.metrics import serializing
+
+# Serializer fields whose representation of a database value is the
+# value itself, the others are converted with their to_representation
+IDENTITY_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.ReadOnlyField,
+)
+
+
+class ValuesSerializer:
+    """Read only serializer of values() rows compiled from a serializer
+
+    Each field of the bound serializer becomes a (name, column,
+    converter) step, so rows are turned into the same OrderedDicts
+    the serializer would build without per object field machinery.
+    array_sources maps fields listing related ids to the denormalized
+    id array column holding them. compile() returns None when a field
+    can not be read from a column, callers then use the serializer.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    @classmethod
+    def compile(cls, serializer, queryset, array_sources=None):
+        array_sources = array_sources or {}
+        model = queryset.model
+        steps = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in array_sources:
+                steps.append((name, array_sources[name], None))
+                continue
+
+            source = field.source
+            if source not in queryset.query.annotations:
+                try:
+                    model_field = model._meta.get_field(source)
+                except FieldDoesNotExist:
+                    return None
+                if not model_field.concrete or model_field.is_relation:
+                    return None
+            convert = None if type(field) in IDENTITY_FIELDS else \
+                field.to_representation
+            steps.append((name, source, convert))
+
+        return cls(steps)
+
+    @property
+    def columns(self):
+        return [column for name, column, convert in self.steps]
+
+    def serialize(self, rows):
+        """Return representations of values() rows"""
+        steps = self.steps
+        data = []
+        for row in rows:
+            item = OrderedDict()
+            for name, column, convert in steps:
+                value = row[column]
+                if convert is not None and value is not None:
+                    value = convert(value)
+                item[name] = value
+            data.append(item)
+
+        return data
+
+
+class ValuesListMixin:
+    """Serve list requests from values() rows instead of instances
+
+    Enabled by RECIPE_API_VALUES_SERIALIZERS. The output is the same as
+    the serializer's, paginated on the same ordering columns.
+    """
+    array_sources = {}
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        compiled = None
+        if settings.RECIPE_API_VALUES_SERIALIZERS:
+            compiled = ValuesSerializer.compile(
+                self.get_serializer(), queryset, self.array_sources,
+            )
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+
+        columns = compiled.columns
+        paginator = self.paginator
+        if paginator is not None and hasattr(paginator, 'get_ordering'):
+            columns += [
+                field.lstrip('-') for field in
+                paginator.get_ordering(request, queryset, self)
+            ]
+        queryset = queryset.prefetch_related(None).values(
+            *dict.fromkeys(columns)
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with serializing(request):
+                data = compiled.serialize(page)
+            return self.get_paginated_response(data)
+
+        with serializing(request):
+            data = compiled.serialize(queryset)
+        return Response(data)
@@ -1,19 +1,53 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.views import APIView
 
+from core.metrics import SerializationMetricsMixin, serializing
 from core.models import Tag, Ingredient, Recipe
 from recipe import serializers
+from recipe.bulk import BulkRecipeWriter
+from recipe.cache import CachedListMixin, ConditionalListMixin, \
+    ConditionalRetrieveMixin, response_cache
+from recipe.export import RecipeExporter
+from recipe.fieldsets import SparseFieldsetMixin
+from recipe.images import schedule_variants
+from recipe.pagination import RecipeAttrPagination, RecipePagination, \
+    positive_int
+from recipe.similarity import similarity_index
+from recipe.values import ValuesListMixin, ValuesSerializer
+from user.authentication import CachedTokenAuthentication
 
 
-class BaseRecipeAttrViewset(viewsets.GenericViewSet,
+class BaseRecipeAttrViewset(SerializationMetricsMixin,
+                            SparseFieldsetMixin,
+                            ConditionalListMixin,
+                            CachedListMixin,
+                            ValuesListMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
     """Base viewsets for user owned recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeAttrPagination
+    read_from_replica = True
+    # ?ordering= values -> keyset ordering of the list, descending ones
+    # end with -id so the (user, name/recipe_count, id) indexes are
+    # scanned backwards
+    orderings = {
+        'name': ('name', 'id'),
+        '-name': ('-name', '-id'),
+        'recipe_count': ('recipe_count', 'id'),
+        '-recipe_count': ('-recipe_count', '-id'),
+    }
 
     def get_queryset(self):
         """Return objects of current authenticated user"""
@@ -22,53 +56,212 @@ class BaseRecipeAttrViewset(viewsets.GenericViewSet,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.assigned()
 
-        return queryset.filter(
+        return self.trim_queryset(queryset.filter(
             user=self.request.user
-            ).order_by('-name').distinct()
+            ).order_by(*self.get_keyset_ordering()))
+
+    def get_keyset_ordering(self):
+        """Return ordering of the list requested with ?ordering="""
+        ordering = self.request.query_params.get('ordering', '-name')
+        if ordering not in self.orderings:
+            raise ValidationError(
+                {'ordering': f'Must be one of: {", ".join(self.orderings)}'}
+            )
+
+        return self.orderings[ordering]
+
+    def _with_counts(self):
+        """Return if recipe counts of each object were requested"""
+        return self.action == 'list' and bool(
+            int(self.request.query_params.get('with_counts', 0))
+        )
+
+    def get_serializer_class(self):
+        """Return appropriate serializer class"""
+        if self.action == 'bulk':
+            return serializers.NamesSerializer
+
+        elif self._with_counts():
+            return self.counted_serializer_class
+
+        return self.serializer_class
 
     def perform_create(self, serializer):
         """Creates a object"""
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Return ids of a list of names creating the missing ones"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        names = list(dict.fromkeys(serializer.validated_data['names']))
+
+        found = self.queryset.model.objects.get_or_create_names(
+            request.user, names,
+        )
+        results = [
+            {'id': found[name][0], 'name': name, 'created': found[name][1]}
+            for name in names
+        ]
+        if any(result['created'] for result in results):
+            response_cache.invalidate(request.user.pk, (self.cache_scope,))
+
+        return Response(results, status=status.HTTP_200_OK)
+
 
 class TagViewSet(BaseRecipeAttrViewset):
     """Manage tags in the database"""
     queryset = Tag.objects.all()
     serializer_class = serializers.TagSerializer
+    counted_serializer_class = serializers.CountedTagSerializer
+    cache_scope = 'tags'
 
 
 class IngredientViewset(BaseRecipeAttrViewset):
     """Manage ingredients in database"""
     queryset = Ingredient.objects.all()
     serializer_class = serializers.IngredientSerializer
+    counted_serializer_class = serializers.CountedIngredientSerializer
+    cache_scope = 'ingredients'
 
 
-class RecipeViewset(viewsets.ModelViewSet):
+class RecipeViewset(SerializationMetricsMixin,
+                    SparseFieldsetMixin,
+                    ConditionalListMixin,
+                    ConditionalRetrieveMixin,
+                    CachedListMixin,
+                    ValuesListMixin,
+                    viewsets.ModelViewSet):
     """manage recipes in database"""
     serializer_class = serializers.RecipeSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    cache_scope = 'recipes'
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipePagination
+    read_from_replica = True
+    # Array lookups answering ?match= against the GIN indexed id arrays
+    match_lookups = {'any': 'overlap', 'all': 'contains'}
+    # The same arrays hold the ids listed by the list serializer
+    array_sources = {'tags': 'tag_ids', 'ingredients': 'ingredient_ids'}
+    # ?ordering= values -> keyset ordering, descending ones end with -id
+    # so the (user, price/time_minutes, id) indexes are scanned backwards
+    orderings = {
+        'id': ('id',),
+        '-id': ('-id',),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'time_minutes': ('time_minutes', 'id'),
+        '-time_minutes': ('-time_minutes', '-id'),
+    }
+    # Range parameters -> lookups filtering the same indexed columns
+    range_lookups = {
+        'min_price': 'price__gte',
+        'max_price': 'price__lte',
+        'min_time': 'time_minutes__gte',
+        'max_time': 'time_minutes__lte',
+    }
 
     def _params_to_int(self, qs):
         """Convert list of string Id's to list of integers"""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _get_match_lookup(self):
+        """Return array lookup for the requested match mode"""
+        match = self.request.query_params.get('match', 'any')
+        if match not in self.match_lookups:
+            raise ValidationError(
+                {'match': f'Must be one of: {", ".join(self.match_lookups)}'}
+            )
+
+        return self.match_lookups[match]
+
     def get_queryset(self):
         """Return objects of current authenticated user"""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
         queryset = self.queryset
+        if tags or ingredients:
+            lookup = self._get_match_lookup()
         if tags:
             tag_ids = self._params_to_int(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = queryset.filter(**{f'tag_ids__{lookup}': tag_ids})
         if ingredients:
             ingredient_ids = self._params_to_int(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = queryset.filter(
+                **{f'ingredient_ids__{lookup}': ingredient_ids}
+            )
+
+        if any(param in self.request.query_params
+               for param in self.range_lookups):
+            ranges = serializers.RecipeFilterSerializer(
+                data=self.request.query_params,
+            )
+            ranges.is_valid(raise_exception=True)
+            queryset = queryset.filter(**{
+                self.range_lookups[param]: value
+                for param, value in ranges.validated_data.items()
+            })
+
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.search(search)
+
+        queryset = self.trim_queryset(
+            queryset.filter(user=self.request.user)
+        )
+        return queryset.prefetch_related(*self._get_prefetches())
 
-        return queryset.filter(user=self.request.user)
+    def get_keyset_ordering(self):
+        """Return ordering of paginated list, best search match first
+
+        An explicit ?ordering= takes precedence over the search rank.
+        """
+        ordering = self.request.query_params.get('ordering')
+        if ordering is None:
+            if self.request.query_params.get('search'):
+                return ('-rank', 'id')
+            return ('id',)
+
+        if ordering not in self.orderings:
+            raise ValidationError(
+                {'ordering': f'Must be one of: {", ".join(self.orderings)}'}
+            )
+
+        return self.orderings[ordering]
+
+    def _get_prefetches(self):
+        """Return related lookups the serializer of the action reads"""
+        if self.action in ('list', 'similar'):
+            # Ids ascending, the order of the denormalized id arrays
+            prefetches = (
+                Prefetch(
+                    'tags',
+                    queryset=Tag.objects.only('id').order_by('id'),
+                ),
+                Prefetch(
+                    'ingredients',
+                    queryset=Ingredient.objects.only('id').order_by('id'),
+                ),
+            )
+        elif self.action == 'retrieve':
+            prefetches = (
+                Prefetch('tags', queryset=Tag.objects.only('id', 'name')),
+                Prefetch(
+                    'ingredients',
+                    queryset=Ingredient.objects.only('id', 'name'),
+                ),
+            )
+        else:
+            return ()
+
+        return tuple(
+            prefetch for prefetch in prefetches
+            if self.wants_field(prefetch.prefetch_to)
+        )
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
@@ -78,6 +271,9 @@ class RecipeViewset(viewsets.ModelViewSet):
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
 
+        elif self.action == 'bulk':
+            return serializers.RecipeBulkItemSerializer
+
         return self.serializer_class
 
     def perform_create(self, serializer):
@@ -94,7 +290,17 @@ class RecipeViewset(viewsets.ModelViewSet):
         )
 
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                # Concurrent uploads swap blob references one at a time,
+                # each releasing the name the previous one committed
+                stored = Recipe.objects.select_for_update().filter(
+                    pk=recipe.pk,
+                ).values_list('image', flat=True).first()
+                if stored is None:
+                    raise NotFound()
+                recipe._stored_image = stored
+                recipe = serializer.save()
+            schedule_variants(recipe)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
@@ -104,3 +310,107 @@ class RecipeViewset(viewsets.ModelViewSet):
             serializer.data,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """Create or update a list of recipes in one transaction"""
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError(
+                {'non_field_errors': ['Expected a list of recipes.']}
+            )
+        if len(items) > settings.RECIPE_API_MAX_BULK_SIZE:
+            raise ValidationError({'non_field_errors': [
+                f'At most {settings.RECIPE_API_MAX_BULK_SIZE} recipes '
+                f'can be written at once.'
+            ]})
+
+        results = BulkRecipeWriter(request.user, items).save()
+        if results and all(r['status'] == 'error' for r in results):
+            return Response(results, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(results, status=status.HTTP_200_OK)
+
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """Return the recipes sharing the most tags and ingredients
+
+        Ranked by the Jaccard similarity of their tag and ingredient sets
+        from the in-memory similarity index, not by joining the links.
+        """
+        try:
+            limit = positive_int(
+                request.query_params.get(
+                    'limit', settings.RECIPE_SIMILARITY['LIMIT'],
+                ),
+                cutoff=settings.RECIPE_API_MAX_PAGE_SIZE,
+            )
+        except ValueError:
+            raise ValidationError(
+                {'limit': 'Must be a positive integer.'}
+            )
+
+        found = None
+        if pk.isdigit():
+            found = similarity_index.similar(request.user.pk, int(pk), limit)
+        if found is None:
+            raise NotFound()
+
+        ranks = {recipe_id: rank for rank, (recipe_id, _) in enumerate(found)}
+        queryset = self.get_queryset().filter(pk__in=ranks)
+        compiled = None
+        if settings.RECIPE_API_VALUES_SERIALIZERS:
+            compiled = ValuesSerializer.compile(
+                self.get_serializer(), queryset, self.array_sources,
+            )
+        if compiled is None:
+            recipes = sorted(queryset, key=lambda recipe: ranks[recipe.id])
+            data = self.get_serializer(recipes, many=True).data
+            ids = [recipe.id for recipe in recipes]
+        else:
+            rows = sorted(
+                queryset.prefetch_related(None).values(
+                    *dict.fromkeys(compiled.columns + ['id'])
+                ),
+                key=lambda row: ranks[row['id']],
+            )
+            with serializing(request):
+                data = compiled.serialize(rows)
+            ids = [row['id'] for row in rows]
+
+        scores = dict(found)
+        for item, recipe_id in zip(data, ids):
+            item['similarity'] = round(scores[recipe_id], 4)
+        return Response(data)
+
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """Stream the user's recipes as NDJSON or CSV"""
+        # Not ?format=, DRF picks the renderer from that parameter
+        export_format = request.query_params.get('export_format', 'ndjson')
+        content_types = RecipeExporter.content_types
+        if export_format not in content_types:
+            raise ValidationError({'export_format': [
+                f'Must be one of: {", ".join(content_types)}'
+            ]})
+
+        queryset = self.get_queryset()
+        # The stream is read after the request, keep its routed database
+        exporter = RecipeExporter(queryset.using(queryset.db))
+        response = StreamingHttpResponse(
+            exporter.stream(export_format),
+            content_type=content_types[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{export_format}"'
+        )
+        return response
+
+
+class CacheStatsView(APIView):
+    """Report hit/miss counters of the list response cache"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(response_cache.stats())
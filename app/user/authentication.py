@@ -0,0 +1,74 @@
+import copy
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import build_cache
+
+
+class TokenCache:
+    """Cache of authenticated tokens, keyed by a hash of the token key"""
+
+    def __init__(self, backend, enabled=True):
+        self.backend = backend
+        self.enabled = enabled
+
+    def _key(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return f'auth-token:{digest}'
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        return self.backend.get(self._key(key))
+
+    def set(self, key, token):
+        if self.enabled:
+            self.backend.set(self._key(key), token)
+
+    def delete(self, key):
+        self.backend.delete(self._key(key))
+
+    def forget(self, key):
+        """Delete the token now and again once the transaction commits
+
+        Until the commit other requests still read the old row and may
+        cache it again, the second delete drops what they stored.
+        """
+        self.delete(key)
+        transaction.on_commit(lambda: self.delete(key))
+
+
+def _build_token_cache():
+    config = settings.TOKEN_AUTH_CACHE
+    return TokenCache(
+        build_cache(config),
+        enabled=config.get('BACKEND', 'local') != 'none',
+    )
+
+
+token_cache = _build_token_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication remembering token -> user lookups
+
+    Entries are dropped by user.signals when the token is deleted or
+    its user is saved, so deactivated users are rejected as soon as the
+    change commits. Other processes only see that with a 'shared' cache,
+    build_cache refuses 'local' ones when there are several.
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+
+        # Callers may modify the user, never hand out the cached instance
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return (token.user, token)
@@ -0,0 +1,115 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.tests.utils import QueryCountMixin
+from user.authentication import token_cache
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(QueryCountMixin, TestCase):
+    """Test cached token authentication"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='shubham.token@gmail.com',
+            password='shubham123',
+            name='Shubham',
+        )
+        self.token = Token.objects.create(user=self.user)
+        token_cache.delete(self.token.key)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Test repeated requests do not query the token again"""
+        self.client.get(ME_URL)
+
+        with self.assertMaxQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        """Test unknown tokens are still rejected"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops working immediately"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user is rejected immediately"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_updated_user_not_stale(self):
+        """Test updates through the me endpoint are seen on next request"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'New name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New name')
+
+
+class TokenRevocationTests(TransactionTestCase):
+    """Test tokens cached while being revoked are dropped on commit"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='shubham.revoke@gmail.com',
+            password='shubham123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _cached_before_commit(self, revoke):
+        """Revoke, cache the token as a concurrent request would, commit"""
+        key = self.token.key
+        committed = Token.objects.select_related('user').get(key=key)
+        self.client.get(ME_URL)
+        with transaction.atomic():
+            revoke()
+            self.assertIsNone(token_cache.get(key))
+            token_cache.set(key, committed)
+
+        return self.client.get(ME_URL)
+
+    def test_deleted_token(self):
+        """Test a deleted token is rejected once the delete commits"""
+        res = self._cached_before_commit(self.token.delete)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user(self):
+        """Test a deactivated user is rejected once the change commits"""
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        res = self._cached_before_commit(deactivate)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
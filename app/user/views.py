@@ -1,10 +1,13 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+
+from core.metrics import SerializationMetricsMixin
+from user.authentication import CachedTokenAuthentication
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(SerializationMetricsMixin, generics.CreateAPIView):
     """Create new user in the system"""
     serializer_class = UserSerializer
 
@@ -15,11 +18,13 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserAPIView(generics.RetrieveUpdateAPIView):
+class ManageUserAPIView(SerializationMetricsMixin,
+                        generics.RetrieveUpdateAPIView):
     """Manage authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    read_from_replica = True
 
     def get_object(self):
         return self.request.user